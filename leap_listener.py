@@ -1,57 +1,174 @@
 from os import path, makedirs, listdir
 from utils.landmark_utils import save_array
-import ctypes
+from utils.sync_utils import resample_hands
+from utils.leap_sources import create_leap_source, N_LANDMARKS
+import threading
+import time
+import numpy as np
 
-lib = ctypes.CDLL("PollingSample.dll")
-
-def get_new_landmarks():
-    get_landmarks = lib.getLandmarks
-    get_landmarks.restype = ctypes.POINTER(ctypes.c_float)
-    return get_landmarks()
+# Samples kept by the polling thread, 10 seconds at the 120 Hz of the Leap
+BUFFER_SIZE = 1200
+# Seconds between two checks for a new Leap frame
+POLL_INTERVAL = 0.001
 
 class LeapListener():
-    def __init__(self):
+    """
+    Params
+        source: source of the Leap samples, see utils.leap_sources.create_leap_source. By default the
+                Ultraleap through PollingSample.dll
+    """
+    def __init__(self, buffer_size=BUFFER_SIZE, source=None):
         self.frame = -1
-        self.lh_landmarks = []
-        self.rh_landmarks = []
-        lib.loadLandmarks()
+        self.source = source if source is not None else create_leap_source("dll")
+
+        # Recorded sequence, grown when full: see lh_landmarks & rh_landmarks
+        self.recorded = np.zeros((buffer_size, N_LANDMARKS), dtype=np.float32)
+        self.n_recorded = 0
+
+        # Ring buffer of the polling thread (or of read_until): time of each sample & the 126 floats of both hands
+        self.timestamps = np.full(buffer_size, -np.inf)
+        self.samples = np.zeros((buffer_size, N_LANDMARKS), dtype=np.float32)
+        self.n_samples = 0
+        self.lock = threading.Lock()
+        self.poller = None
+        self.is_polling = False
+
+    def start_polling(self, poll_interval=POLL_INTERVAL):
+        """
+        Reads the Leap frames in a background thread at the rate of the Leap instead of the rate of the
+        main loop, the samples are read with sample_at
+        """
+        if self.poller is not None:
+            return
+        self.is_polling = True
+        self.poller = threading.Thread(target=self._poll, args=(poll_interval,), daemon=True)
+        self.poller.start()
+
+    @property
+    def lh_landmarks(self):
+        """
+        :return: the left hand of the recorded sequence, array of shape (n_frames, 63)
+        """
+        return self.recorded[:self.n_recorded, :63]
+
+    @property
+    def rh_landmarks(self):
+        """
+        :return: the right hand of the recorded sequence, array of shape (n_frames, 63)
+        """
+        return self.recorded[:self.n_recorded, 63:]
+
+    def stop_polling(self):
+        if self.poller is None:
+            return
+        self.is_polling = False
+        self.poller.join()
+        self.poller = None
+
+    def read_until(self, timestamp):
+        """
+        Reads the samples of the source up to a timestamp of its own timeline instead of polling it, sample i
+        is at i / rate seconds: the samples matched with the frames of a recording are the same whatever the
+        speed of the pipeline. For the replay & synthetic sources created with paced=False, without start_polling
+        """
+        landmarks = np.zeros(N_LANDMARKS, dtype=np.float32)
+        while (self.frame + 1) / self.source.rate <= timestamp:
+            frame = self.get_frame()
+            self.source.get_landmarks(landmarks)
+            self._add_sample(frame / self.source.rate, landmarks)
+
+    def sample_at(self, timestamp, interpolate=True):
+        """
+        Landmarks of the Leap at a timestamp, e.g. the time of a camera frame: time.perf_counter() when polling,
+        the timeline of the source with read_until. See utils.sync_utils.resample_hands
+
+        :param interpolate: False to return the nearest sample
+        :return: the left & right hand landmarks as lists of 63 floats, zeros if there's no sample yet
+        """
+        lh_landmarks, rh_landmarks = self.resample([timestamp], interpolate)
+        return lh_landmarks[0].tolist(), rh_landmarks[0].tolist()
+
+    def resample(self, timestamps, interpolate=True):
+        """
+        Resamples the buffered Leap samples on a timeline, e.g. the frames of a recording
+        :return: the left & right hand landmarks at each timestamp, arrays of shape (n_timestamps, 63)
+        """
+        buffered_timestamps, samples = self.get_samples()
+        resampled = resample_hands(buffered_timestamps, samples, timestamps, interpolate)
+        return resampled[:, :63], resampled[:, 63:]
+
+    def record_at(self, timestamps, interpolate=True):
+        """
+        Replaces the recorded sequence by the buffered Leap samples resampled at the timestamps,
+        e.g. one sample per frame of a video
+        """
+        buffered_timestamps, samples = self.get_samples()
+        self.recorded = resample_hands(buffered_timestamps, samples, timestamps, interpolate)
+        self.n_recorded = len(self.recorded)
+
+    def get_samples(self):
+        """
+        :return: the buffered timestamps & samples of the polling thread, in chronological order
+        """
+        with self.lock:
+            n_buffered = min(self.n_samples, len(self.timestamps))
+            indices = (self.n_samples - n_buffered + np.arange(n_buffered)) % len(self.timestamps)
+            return self.timestamps[indices], self.samples[indices]
+
+    def _poll(self, poll_interval):
+        landmarks = np.zeros(N_LANDMARKS, dtype=np.float32)
+        last_frame = -1
+        while self.is_polling:
+            frame = self.source.get_frame()
+            if frame == last_frame:
+                time.sleep(poll_interval)
+                continue
+            last_frame = frame
+            self.source.get_landmarks(landmarks)
+            self._add_sample(time.perf_counter(), landmarks)
+
+    def _add_sample(self, timestamp, landmarks):
+        with self.lock:
+            idx = self.n_samples % len(self.timestamps)
+            self.timestamps[idx] = timestamp
+            self.samples[idx] = landmarks
+            self.n_samples += 1
     
     def retrieve_landmarks(self):
         return self.lh_landmarks, self.rh_landmarks
 
-    def pickle_landmarks(self, category, sign_type, video_number):
+    def pickle_landmarks(self, category, sign_type, video_number, writer=None):
         """
-        Iterates through all the fingers in a hand and returns their landmarks in a list.
-        Also adds a keymark from the wrist.
+        Saves the recorded sequence in data/ultraleapdataset
 
-        :param hand: hand object from Leap's Hand Tracking.
-        :return: a list containing 63 3D points as tuples.
+        :param writer: utils.async_writer.AsyncWriter saving the landmarks in the background,
+                       they're saved right away by default
         """
         new_dataset = "%s-%d" % (sign_type, video_number)
         makedirs(path.join("data/ultraleapdataset", category, sign_type, new_dataset), exist_ok=True)
-        save_array(self.lh_landmarks, path.join("data/ultraleapdataset", category, sign_type, new_dataset,
-                                        "lh_%s-%d.pickle" % (sign_type, video_number)))
-        save_array(self.rh_landmarks, path.join("data/ultraleapdataset", category, sign_type, new_dataset,
-                                        "rh_%s-%d.pickle" % (sign_type, video_number)))
+        for hand, landmarks in (("lh", self.lh_landmarks), ("rh", self.rh_landmarks)):
+            landmarks_path = path.join("data/ultraleapdataset", category, sign_type, new_dataset,
+                                       "%s_%s-%d.pickle" % (hand, sign_type, video_number))
+            if writer is None:
+                save_array(landmarks, landmarks_path)
+            else:
+                # Copied, the recorded sequence gets overwritten by the next recording
+                writer.submit(save_array, landmarks.copy(), landmarks_path)
 
     def reset_landmarks(self):
-        self.lh_landmarks = []
-        self.rh_landmarks = []
+        self.n_recorded = 0
 
     def get_frame(self):
-        getFrame = lib.getFrame
-        getFrame.restype = ctypes.c_int64
-        self.frame = getFrame()
-        return getFrame()
+        self.frame = self.source.get_frame()
+        return self.frame
 
     def get_landmarks(self):
-        landmarks = get_new_landmarks()[:126]
-        hand_len = len(landmarks) // 2
-        self.lh_landmarks.append(landmarks[:hand_len])
-        self.rh_landmarks.append(landmarks[hand_len:])
-
-    def _get_landmarks(self):
-        get_landmarks = lib.getLandmarks
-        get_landmarks.restype = ctypes.POINTER(ctypes.c_float)
-        return get_landmarks()
+        """
+        Appends the landmarks of the last Leap frame to the recorded sequence
+        """
+        if self.n_recorded == len(self.recorded):
+            grown = np.zeros((max(len(self.recorded), BUFFER_SIZE), N_LANDMARKS), dtype=np.float32)
+            self.recorded = np.concatenate([self.recorded, grown])
+        self.source.get_landmarks(self.recorded[self.n_recorded])
+        self.n_recorded += 1
     
\ No newline at end of file
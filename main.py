@@ -1,13 +1,18 @@
 import sys
+import threading
+import time
+from contextlib import nullcontext
+
 import cv2
-import mediapipe
-import pykinect_azure as pyk
 
 from utils.dataset_utils import load_dataset, load_reference_signs
-from utils.mediapipe_utils import mediapipe_detection
-from sign_recorder import SignRecorder
+from utils.mediapipe_utils import mediapipe_detection, create_detector, HandRoiDetector
+from utils.pipeline import Pipeline
+from utils.frame_sources import create_frame_source
+from sign_recorder import SignRecorder, load_continuous_thresholds
 from webcam_manager import WebcamManager
 from leap_listener import LeapListener
+from utils.leap_sources import create_leap_source
 
 # Structure and base logic taken from: https://github.com/gabguerin/Sign-Language-Recognition--MediaPipe-DTW.
 # Edited to enable Gemini input and it also includes its own recording program for the Azure Kinect and LM.
@@ -16,6 +21,22 @@ from leap_listener import LeapListener
 is_recording = False
 LMB_pressed = False
 MMB_pressed = False
+embedding_mode = "full" # all 441 angles, opt in to "triu" for the 210 non-redundant ones (rebuilds the store)
+extraction_workers = 4 # processes extracting the landmarks of new videos
+detector_backend = "holistic" # "holistic_lite" or "hands" for lighter MediaPipe models, new videos are extracted with it
+hand_roi = False # run MediaPipe on a crop around the hands of the previous frame, for the "hands" backend
+continuous_recognition = False # recognize signs on every frame instead of recording after a MMB click
+continuous_thresholds = None # (MediaPipe, Ultraleap) match costs of the continuous mode, None to calibrate them
+early_decision = False # stop recording as soon as a sign clearly leads the others
+pre_roll = 0 # frames before the MMB click that start the recording, e.g. 10 for the signs started a bit early
+frame_source = "kinect" # "playback" (k4a .mkv), "video" (mp4) or "webcam", see utils.frame_sources
+frame_source_path = None # file of the "playback" & "video" sources, camera index of the "webcam" source
+decode_workers = 2 # threads decoding the MJPG frames of the Kinect
+decode_scale = 1 # 2 or 4 decodes the frames at 1/2 or 1/4 of the 720p resolution, enough for MediaPipe
+pipeline_queue_size = 2 # frames waiting between two threads of the main loop before the oldest is dropped
+pipeline_stats_interval = 5 # seconds between two printouts of the latencies & queue depths, 0 to disable
+leap_source = "dll" # "replay" streams data/ultraleapdataset & "synthetic" generates hands, both without a Leap
+leap_rate = 120 # samples per second of the "replay" & "synthetic" sources, higher to run faster than a live camera
 
 def on_click(event, x, y, flags, *userdata):
     global LMB_pressed
@@ -30,56 +51,133 @@ def on_click(event, x, y, flags, *userdata):
 if __name__ == "__main__":
     category = sys.argv[1]
     # Create dataset of the videos where landmarks have not been extracted yet
-    videos = load_dataset(category)
+    videos = load_dataset(category, extraction_workers, detector_backend)
 
     # Create a DataFrame of reference signs (name: str, model: SignModel, distance: int)
-    video_reference_signs, ul_reference_signs = load_reference_signs(category, videos)
+    video_reference_signs, ul_reference_signs = load_reference_signs(category, videos, embedding_mode)
+
+    if continuous_recognition and continuous_thresholds is None:
+        continuous_thresholds = load_continuous_thresholds(category, video_reference_signs, ul_reference_signs,
+                                                           embedding_mode)
+        print(f"Continuous thresholds of {category}: "
+              f"MediaPipe {continuous_thresholds[0]:.1f}, Ultraleap {continuous_thresholds[1]:.1f}")
 
     # Object that stores MediaPipe results and computes sign similarities
-    sign_recorder_cam = SignRecorder(video_reference_signs, ul_reference_signs)
+    sign_recorder_cam = SignRecorder(video_reference_signs, ul_reference_signs, embedding_mode=embedding_mode,
+                                     continuous=continuous_recognition, continuous_thresholds=continuous_thresholds,
+                                     early_decision=early_decision, pre_roll=pre_roll)
 
     # Object that draws keypoints & displays results
     webcam_manager = WebcamManager(on_click)
-    listener = LeapListener()
 
-    # Initialize Azure Kinect.
-    pyk.initialize_libraries()
-    ak_config = pyk.default_configuration
-    ak_config.color_resolution = pyk.K4A_COLOR_RESOLUTION_720P
-    ak_config.depth_mode = pyk.K4A_DEPTH_MODE_OFF
-    ak_config.camera_fps = pyk.K4A_FRAMES_PER_SECOND_30
+    # Live Kinect by default, the recordings are replayed as fast as the pipeline can process them
+    camera = create_frame_source(frame_source, frame_source_path, decode_workers, decode_scale)
+
+    # The frames of a recording are stamped on its own timeline, the live Leap samples can't be matched with them
+    if not camera.is_live and leap_source == "dll":
+        camera.close()
+        raise ValueError(f"The {frame_source} frame source can't be synchronized with the live Leap, "
+                         "use the \"replay\" or \"synthetic\" leap_source")
+
+    # The replayed & synthetic Leap samples follow the time of a recording instead of the clock, see read_until
+    leap_on_frame_time = not camera.is_live
+    listener = LeapListener(source=create_leap_source(leap_source, leap_rate, category, paced=not leap_on_frame_time))
+    if not leap_on_frame_time:
+        listener.start_polling()
+
+    # The recording is started by the recognizer thread, which owns the SignRecorder
+    record_requested = threading.Event()
+    # Held to switch the dropping of the frames, see recognize_sign
+    drop_lock = threading.Lock()
+
+    def capture_frame():
+        item = camera.read()
+        if item is not None:
+            item["capture_time"] = time.perf_counter()
+        return item
+
+    def detect_landmarks(item):
+        if "decoding" in item:
+            # The MJPG frames are decoded by a pool while the capture & MediaPipe threads go on
+            ret, item["frame"] = item.pop("decoding").result()
+            if not ret:
+                return None
+
+        # Make detections
+        image, item["result"] = mediapipe_detection(item["frame"], detector)
+        return item
+
+    def recognize_sign(item):
+        global is_recording
+
+        # Leap landmarks at the time the Kinect frame was taken, polled in the background at the rate of the Leap
+        if leap_on_frame_time:
+            listener.read_until(item["frame_time"])
+        lh_landmarks, rh_landmarks = listener.sample_at(item["frame_time"])
+
+        if record_requested.is_set() and not is_recording:
+            sign_recorder_cam.record()
+            record_requested.clear()
+
+        item["sign_detected"], is_recording = sign_recorder_cam.process_mp_results(item["result"],
+                                                                                   lh_landmarks, rh_landmarks)
+        item["is_recording"] = is_recording
+
+        # A live camera drops frames while idle, the frames from the record request to the end of the recording
+        # are all processed: meanwhile the capture waits for the slower stages
+        with drop_lock:
+            pipeline.set_drop_frames(camera.is_live and not is_recording and not record_requested.is_set())
+        return item
 
-    azure_kinect = pyk.start_device(config=ak_config)
     # Set up the Mediapipe environment
-    with mediapipe.solutions.holistic.Holistic(
-        min_detection_confidence=0.8, min_tracking_confidence=0.8
-    ) as holistic:
-        while True:
-            # Read feed
-            capture = azure_kinect.update()
-            ret, frame = capture.get_color_image()
-
-            # Make detections
-            image, result = mediapipe_detection(frame, holistic)
-
-            if listener.frame < listener.get_frame():
-                listener.get_landmarks()
-
-            sign_detected, is_recording = sign_recorder_cam.process_mp_results(result, 
-                                                                               listener.lh_landmarks[-1],
-                                                                               listener.rh_landmarks[-1])
-
-            # If the Azure Kinect isn't recording, then neither will the 3Di.
-            if not is_recording:
-                listener.reset_landmarks()
-
-            # Update the frame (draw landmarks & display result)
-            webcam_manager.update(frame, result, sign_detected, is_recording)
-
-            pressedKey = cv2.waitKey(1) & 0xFF
-            if MMB_pressed and not is_recording:  # Record pressing middle mouse button
-                sign_recorder_cam.record()
-                MMB_pressed = False
-            elif pressedKey == ord("q"):  # Break pressing q
-                break
+    # The crops of HandRoiDetector get their own model, in static image mode
+    with create_detector(detector_backend) as detector, \
+            (create_detector(detector_backend, static_image_mode=True) if hand_roi else nullcontext()) as crop_detector:
+        if hand_roi:
+            detector = HandRoiDetector(detector, crop_detector)
+
+        # Capture, detection & recognition run on their own threads, connected by queues which drop the oldest
+        # frames when a stage falls behind (the frames of a recording are all processed instead, see
+        # recognize_sign). The display stays on the main thread with the OpenCV window.
+        pipeline = Pipeline([
+            ("capture", capture_frame),
+            ("mediapipe", detect_landmarks),
+            ("recognizer", recognize_sign),
+        ], queue_size=pipeline_queue_size, drop_frames=camera.is_live)
+        pipeline.start()
+
+        start_time = last_stats_time = time.perf_counter()
+        n_frames = 0
+        try:
+            while True:
+                item = pipeline.get(timeout=0.1)
+                if item is not None:
+                    start = time.perf_counter()
+                    # Update the frame (draw landmarks & display result)
+                    webcam_manager.update(item["frame"], item["result"], item["sign_detected"], item["is_recording"])
+                    pipeline.sink_stats.add(time.perf_counter() - start)
+                    n_frames += 1
+                elif pipeline.is_finished():  # End of a recording
+                    break
+
+                pressedKey = cv2.waitKey(1) & 0xFF
+                if MMB_pressed:  # Record pressing middle mouse button
+                    with drop_lock:
+                        record_requested.set()
+                        pipeline.set_drop_frames(False)
+                    MMB_pressed = False
+                elif pressedKey == ord("q"):  # Break pressing q
+                    break
+
+                if pipeline_stats_interval and time.perf_counter() - last_stats_time > pipeline_stats_interval:
+                    if item is not None:
+                        print(f"Latency {(time.perf_counter() - item['capture_time']) * 1000:.1f} ms | "
+                              f"{pipeline.format_stats()} | Source {camera.get_stats()}")
+                    last_stats_time = time.perf_counter()
+        finally:
+            pipeline.stop()
+            listener.stop_polling()
+            camera.close()
+        duration = time.perf_counter() - start_time
+        print(f"{n_frames} frames in {duration:.1f} s ({n_frames / max(duration, 1e-9):.1f} fps)")
         cv2.destroyAllWindows()
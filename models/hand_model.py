@@ -14,6 +14,11 @@ class HandModel(object):
         feature_vector: List of length 21 * 21 = 441 containing the angles between all connections
     """
 
+    # The angle matrix is symmetric with a diagonal of zeros, "triu" only keeps its strict upper triangle
+    # (21 * 20 / 2 = 210 angles). Each kept angle stands for two angles of the "full" matrix, the weight
+    # scales the distances so both modes give the same result.
+    EMBEDDING_WEIGHTS = {"full": 1, "triu": 2}
+
     def __init__(self, landmarks: List[float]):
 
         # Define the connections
@@ -31,46 +36,44 @@ class HandModel(object):
             List of length nb_connections * nb_connections containing
             all the angles between the connections
         """
-        connections = self._get_connections_from_landmarks(landmarks)
-
-        angles_list = []
+        return self.get_feature_vectors(landmarks[np.newaxis])[0].tolist()
 
-        for connection_from in connections:
-            for connection_to in connections:
-                angle = self._get_angle_between_vectors(connection_from, connection_to)
-                # If the angle is not NaN we store it else we store 0
-                if angle == angle:
-                    angles_list.append(angle)
-                else:
-                    angles_list.append(0)
-        return angles_list
-
-    def _get_connections_from_landmarks(
-        self, landmarks: np.ndarray
-    ) -> List[np.ndarray]:
+    @classmethod
+    def get_feature_vectors(cls, landmarks: np.ndarray, embedding_mode: str = "full") -> np.ndarray:
         """
+        Batched version of the feature vector, computed for all the frames of a sequence at once
         Params
-            landmarks: numpy array of shape (21, 3)
+            landmarks: numpy array of shape (n_frames, 21, 3)
+            embedding_mode: "full" or "triu", see EMBEDDING_WEIGHTS
         Return
-            List of vectors representing hand connections
+            Array of shape (n_frames, nb_connections * nb_connections) containing
+            all the angles between the connections of each frame,
+            or (n_frames, nb_connections * (nb_connections - 1) / 2) in "triu" mode
         """
-        return list(
-            map(
-                lambda t: landmarks[t[1]] - landmarks[t[0]],
-                self.connections,
-            )
-        )
+        landmarks = np.asarray(landmarks, dtype=float)
+        connections = cls._get_connections_from_landmarks(landmarks)
+
+        dot_products = np.einsum("fik,fjk->fij", connections, connections)
+        norms = np.linalg.norm(connections, axis=2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            angles = np.arccos(dot_products / (norms[:, :, np.newaxis] * norms[:, np.newaxis, :]))
+
+        # Identical connections have an angle of 0 & if the angle is NaN we store 0
+        identical = (connections[:, :, np.newaxis, :] == connections[:, np.newaxis, :, :]).all(axis=3)
+        angles[identical | np.isnan(angles)] = 0
+
+        if embedding_mode == "triu":
+            rows, columns = np.triu_indices(angles.shape[1], k=1)
+            return angles[:, rows, columns]
+        return angles.reshape((len(landmarks), angles.shape[1] * angles.shape[2]))
 
     @staticmethod
-    def _get_angle_between_vectors(u: np.ndarray, v: np.ndarray) -> float:
+    def _get_connections_from_landmarks(landmarks: np.ndarray) -> np.ndarray:
         """
-        Args
-            u, v: 3D vectors representing two connections
+        Params
+            landmarks: numpy array of shape (..., 21, 3)
         Return
-            Angle between the two vectors
+            Array of shape (..., nb_connections, 3) of vectors representing hand connections
         """
-        if np.array_equal(u, v):
-            return 0
-        dot_product = np.dot(u, v)
-        norm = np.linalg.norm(u) * np.linalg.norm(v)
-        return np.arccos(dot_product / norm)
+        connections = np.array(list(mp.solutions.holistic.HAND_CONNECTIONS))
+        return landmarks[..., connections[:, 1], :] - landmarks[..., connections[:, 0], :]
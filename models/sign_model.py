@@ -8,38 +8,94 @@ from models.hand_model import HandModel
 
 class SignModel(object):
     def __init__(
-        self, left_hand_list: List[List[float]], right_hand_list: List[List[float]]
+        self, left_hand_list: List[List[float]], right_hand_list: List[List[float]], embedding_mode: str = "full"
     ):
         """
         Params
             x_hand_list: List of all landmarks for each frame of a video
+            embedding_mode: "full" (441 angles) or "triu" (210 angles), see HandModel.EMBEDDING_WEIGHTS
         Args
+            embedding_weight: int; weight of the embedding features in the DTW distances
             has_x_hand: bool; True if x hand is detected in the video, otherwise False
             xh_embedding: ndarray; Array of shape (n_frame, nb_connections * nb_connections)
+            xh_envelope: ndarray; Array of shape (2, nb_connections * nb_connections) containing the minimum
+                         & maximum of the embedding over all frames, used to lower bound DTW distances
         """
         self.has_left_hand = np.sum(left_hand_list) != 0
         self.has_right_hand = np.sum(right_hand_list) != 0
 
-        self.lh_embedding = self._get_embedding_from_landmark_list(left_hand_list)
-        self.rh_embedding = self._get_embedding_from_landmark_list(right_hand_list)
+        self.embedding_mode = embedding_mode
+        self.embedding_weight = HandModel.EMBEDDING_WEIGHTS[embedding_mode]
+
+        self.lh_embedding = self._get_embedding_from_landmark_list(left_hand_list, embedding_mode)
+        self.rh_embedding = self._get_embedding_from_landmark_list(right_hand_list, embedding_mode)
+
+        self.lh_envelope = self._get_envelope(self.lh_embedding)
+        self.rh_envelope = self._get_envelope(self.rh_embedding)
+
+        self.lh_stack = None
+        self.rh_stack = None
+
+    @classmethod
+    def from_embeddings(
+        cls, lh_embedding: np.ndarray, rh_embedding: np.ndarray,
+        has_left_hand: bool, has_right_hand: bool, embedding_mode: str = "full",
+        lh_envelope: np.ndarray = None, rh_envelope: np.ndarray = None,
+        lh_stack: tuple = None, rh_stack: tuple = None
+    ):
+        """
+        Builds a SignModel from already computed embeddings (e.g. from the reference store)
+        instead of the landmarks of each frame, the envelopes are computed if not given
+
+        Params
+            xh_stack: (stack, row) if the embedding is also stored padded in row of a stack of shape
+                      (n_signs, max_n_frames, n_features) shared with other signs, see utils.dtw.stack_hand
+        """
+        sign_model = cls.__new__(cls)
+        sign_model.has_left_hand = bool(has_left_hand)
+        sign_model.has_right_hand = bool(has_right_hand)
+
+        sign_model.embedding_mode = embedding_mode
+        sign_model.embedding_weight = HandModel.EMBEDDING_WEIGHTS[embedding_mode]
+
+        sign_model.lh_embedding = lh_embedding
+        sign_model.rh_embedding = rh_embedding
+
+        sign_model.lh_envelope = cls._get_envelope(lh_embedding) if lh_envelope is None else lh_envelope
+        sign_model.rh_envelope = cls._get_envelope(rh_embedding) if rh_envelope is None else rh_envelope
+
+        sign_model.lh_stack = lh_stack
+        sign_model.rh_stack = rh_stack
+        return sign_model
 
     @staticmethod
     def _get_embedding_from_landmark_list(
-        hand_list: List[List[float]],
-    ) -> List[List[float]]:
+        hand_list: List[List[float]], embedding_mode: str = "full"
+    ) -> np.ndarray:
         """
         Params
             hand_list: List of all landmarks for each frame of a video
+            embedding_mode: "full" or "triu"
         Return
             Array of shape (n_frame, nb_connections * nb_connections) containing
-            the feature_vectors of the hand for each frame
+            the feature_vectors of the hand for each frame (only the upper triangle in "triu" mode)
         """
-        embedding = []
+        landmarks = np.asarray(hand_list, dtype=float).reshape((-1, 21, 3))
 
-        for frame_idx in range(len(hand_list)):
-            if np.sum(hand_list[frame_idx]) == 0:
-                continue
+        # Frames without the hand are skipped
+        landmarks = landmarks[landmarks.sum(axis=(1, 2)) != 0]
+        return HandModel.get_feature_vectors(landmarks, embedding_mode)
 
-            hand_gesture = HandModel(hand_list[frame_idx])
-            embedding.append(hand_gesture.feature_vector)
-        return embedding
+    @staticmethod
+    def _get_envelope(embedding: np.ndarray) -> np.ndarray:
+        """
+        Params
+            embedding: Array of shape (n_frame, nb_connections * nb_connections)
+        Return
+            Array of shape (2, nb_connections * nb_connections) containing the minimum & maximum
+            of each feature over all frames, None if the embedding is empty
+        """
+        if len(embedding) == 0:
+            return None
+        embedding = np.asarray(embedding)
+        return np.stack([embedding.min(axis=0), embedding.max(axis=0)])
@@ -1,5 +1,5 @@
 from .pykinect import *
-from .k4a import Calibration, Capture, Configuration, default_configuration, Device, Image, ImuSample, Transformation
+from .k4a import Calibration, Capture, Configuration, default_configuration, Device, Image, ImageDecoder, ImuSample, Transformation
 from .k4abt import Body, Body2d, Frame, Joint, Joint2d, Tracker
 from .k4arecord import Datablock, Record, Playback
 
@@ -3,5 +3,6 @@ from .capture import Capture
 from .configuration import Configuration, default_configuration
 from .device import Device
 from .image import Image
+from .image_decoder import ImageDecoder
 from .imu_sample import ImuSample
 from .transformation import Transformation
\ No newline at end of file
@@ -7,11 +7,15 @@ from pykinect_azure.utils.postProcessing import smooth_depth_image
 
 class Capture:
 
-	def __init__(self, capture_handle, calibration_handle):
+	def __init__(self, capture_handle, calibration_handle, camera_transform=None):
 
 		self._handle = capture_handle
 		self.calibration_handle = calibration_handle
-		self.camera_transform = Transformation(calibration_handle)
+
+		# Creating a transformation is expensive, the captures of a capture thread share one
+		if camera_transform is None:
+			camera_transform = Transformation(calibration_handle)
+		self.camera_transform = camera_transform
 
 	def __del__(self):
 		self.reset()
@@ -51,6 +55,15 @@ class Capture:
 
 		return Image(_k4a.k4a_capture_get_ir_image(self._handle))
 
+	def get_device_timestamp_usec(self):
+		"""
+		Device timestamp of the color image, of the depth or IR image if the capture has no color image
+		"""
+		for image in (self.get_color_image_object(), self.get_depth_image_object(), self.get_ir_image_object()):
+			if image.is_valid():
+				return image.get_device_timestamp_usec()
+		return None
+
 	def get_transformed_depth_object(self):
 		return self.camera_transform.depth_image_to_color_camera(self.get_depth_image_object())
 
@@ -60,12 +73,12 @@ class Capture:
 	def get_pointcloud_object(self, calibration_type = _k4a.K4A_CALIBRATION_TYPE_DEPTH):
 		return self.camera_transform.depth_image_to_point_cloud(self.get_depth_image_object(), calibration_type)
 
-	def get_color_image(self):
-		return self.get_color_image_object().to_numpy()
+	def get_color_image(self, copy=True, scale=1):
+		return self.get_color_image_object().to_numpy(copy, scale)
 
-	def get_depth_image(self):
+	def get_depth_image(self, copy=True):
 
-		return self.get_depth_image_object().to_numpy()
+		return self.get_depth_image_object().to_numpy(copy)
 
 	def get_colored_depth_image(self):
 		ret, depth_image = self.get_depth_image()
@@ -74,19 +87,19 @@ class Capture:
 
 		return ret, self.color_depth_image(depth_image)
 
-	def get_ir_image(self):
-		return self.get_ir_image_object().to_numpy()
+	def get_ir_image(self, copy=True):
+		return self.get_ir_image_object().to_numpy(copy)
 
-	def get_transformed_depth_image(self):
-		return self.get_transformed_depth_object().to_numpy()
+	def get_transformed_depth_image(self, copy=True):
+		return self.get_transformed_depth_object().to_numpy(copy)
 
 	def get_transformed_colored_depth_image(self):
 		ret, transformed_depth_image  = self.get_transformed_depth_image()
 
 		return ret, self.color_depth_image(transformed_depth_image)
 
-	def get_transformed_color_image(self):
-		return self.get_transformed_color_object().to_numpy()
+	def get_transformed_color_image(self, copy=True):
+		return self.get_transformed_color_object().to_numpy(copy)
 
 	def get_smooth_depth_image(self, maximum_hole_size=10):
 		ret, depth_image = self.get_depth_image()
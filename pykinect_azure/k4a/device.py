@@ -1,13 +1,24 @@
 import ctypes
+import collections
+import threading
+import time
 
 from pykinect_azure.k4a import _k4a
 from pykinect_azure.k4a.capture import Capture
+from pykinect_azure.k4a.transformation import Transformation
 from pykinect_azure.k4a.imu_sample import ImuSample
 from pykinect_azure.k4a.calibration import Calibration
 from pykinect_azure.k4a.configuration import Configuration
 from pykinect_azure.k4arecord.record import Record
 from pykinect_azure.k4a._k4atypes import K4A_WAIT_INFINITE
 
+# Frame period of each camera_fps setting, used to count the frames dropped by the SDK
+FRAME_PERIODS_USEC = {
+	_k4a.K4A_FRAMES_PER_SECOND_5: 200000,
+	_k4a.K4A_FRAMES_PER_SECOND_15: 66667,
+	_k4a.K4A_FRAMES_PER_SECOND_30: 33333,
+}
+
 class Device:
 	calibration = None
 	capture = None
@@ -17,6 +28,7 @@ class Device:
 		self._handle = None
 		self._handle = self.open(index)
 		self.recording = False
+		self.capture_thread = None
 
 	def __del__(self):
 		self.close()
@@ -44,6 +56,7 @@ class Device:
 
 	def close(self):
 		if self.is_valid():
+			self.stop_capture_thread()
 			self.stop_imu()
 			self.stop_cameras()
 			_k4a.k4a_device_close(self._handle)
@@ -54,6 +67,10 @@ class Device:
 			self.recording = False
 
 	def update(self, timeout_in_ms=K4A_WAIT_INFINITE):
+		# With a capture thread, the next capture of its buffer
+		if self.capture_thread is not None:
+			return self.get_next_capture(None if timeout_in_ms == K4A_WAIT_INFINITE else timeout_in_ms / 1000)
+
 		# Get cameras capture
 		capture_handle = self.get_capture(timeout_in_ms)
 
@@ -68,6 +85,124 @@ class Device:
 			
 		return Device.capture
 
+	def start_capture_thread(self, buffer_size=4, timeout_in_ms=1000):
+		"""
+		Pulls the captures in a background thread into a ring buffer of buffer_size captures, which are read with
+		get_latest_capture, get_next_capture or update. The thread keeps emptying the SDK queue even when the
+		consumers are slow: the oldest captures of the buffer are dropped instead of the SDK dropping frames.
+		Each capture has its own handle, a consumer can keep it as long as it needs.
+		"""
+		if self.capture_thread is not None:
+			return
+
+		self.capture_buffer = collections.deque(maxlen=buffer_size)
+		self.capture_condition = threading.Condition()
+		self.capture_error = None
+		self.capture_stats = {
+			"captured": 0, # captures pulled from the SDK
+			"read": 0, # captures returned to the consumers
+			"dropped": 0, # captures overwritten in the buffer before being read
+			"skipped": 0, # captures passed over by get_latest_capture
+			"sdk_dropped": 0, # frames missing between the device timestamps of two captures
+			"timeouts": 0,
+		}
+		self.last_read_index = 0
+		self.camera_transform = Transformation(Device.calibration.handle())
+
+		self.capture_running = True
+		self.capture_thread = threading.Thread(target=self._capture_loop, args=(timeout_in_ms,), daemon=True)
+		self.capture_thread.start()
+
+	def stop_capture_thread(self):
+		if self.capture_thread is None:
+			return
+
+		self.capture_running = False
+		self.capture_thread.join()
+		self.capture_thread = None
+		self.capture_buffer.clear()
+
+	def get_latest_capture(self, timeout=None):
+		"""
+		Waits for a capture newer than the last one read and returns the newest capture of the buffer,
+		the older ones are skipped
+		:param timeout: in seconds, None to wait indefinitely
+		:return: Capture with its index, device_timestamp_usec & reception_time (time.perf_counter()), None on timeout
+		"""
+		return self._read_capture(lambda: self.capture_buffer[-1], timeout)
+
+	def get_next_capture(self, timeout=None):
+		"""
+		Waits for a capture newer than the last one read and returns the oldest one, so no capture is
+		skipped as long as the consumer keeps up with the buffer
+		:param timeout: in seconds, None to wait indefinitely
+		:return: Capture with its index, device_timestamp_usec & reception_time (time.perf_counter()), None on timeout
+		"""
+		return self._read_capture(lambda: next(capture for capture in self.capture_buffer
+											   if capture.index > self.last_read_index), timeout)
+
+	def get_capture_stats(self):
+		with self.capture_condition:
+			return dict(self.capture_stats, buffered=len(self.capture_buffer))
+
+	def _read_capture(self, select_capture, timeout):
+		with self.capture_condition:
+			self.capture_condition.wait_for(lambda: self.capture_error is not None or (
+				self.capture_buffer and self.capture_buffer[-1].index > self.last_read_index), timeout)
+			if self.capture_error is not None:
+				raise RuntimeError(self.capture_error)
+			if not self.capture_buffer or self.capture_buffer[-1].index <= self.last_read_index:
+				return None
+
+			capture = select_capture()
+			self.capture_stats["skipped"] += capture.index - self.last_read_index - 1 - \
+				max(self.capture_buffer[0].index - self.last_read_index - 1, 0)
+			self.capture_stats["read"] += 1
+			self.last_read_index = capture.index
+			return capture
+
+	def _capture_loop(self, timeout_in_ms):
+		frame_period = FRAME_PERIODS_USEC.get(self.configuration.camera_fps)
+		last_timestamp = None
+		index = 0
+
+		while self.capture_running:
+			capture_handle = _k4a.k4a_capture_t()
+			result = _k4a.k4a_device_get_capture(self._handle, capture_handle, timeout_in_ms)
+			reception_time = time.perf_counter()
+			if result == _k4a.K4A_WAIT_RESULT_TIMEOUT:
+				with self.capture_condition:
+					self.capture_stats["timeouts"] += 1
+				continue
+			if result != _k4a.K4A_WAIT_RESULT_SUCCEEDED:
+				with self.capture_condition:
+					self.capture_error = "Get capture failed!"
+					self.capture_condition.notify_all()
+				return
+
+			capture = Capture(capture_handle, Device.calibration.handle(), self.camera_transform)
+			if self.recording:
+				self.record.write_capture(capture.handle())
+
+			index += 1
+			capture.index = index
+			capture.device_timestamp_usec = capture.get_device_timestamp_usec()
+			capture.reception_time = reception_time
+
+			with self.capture_condition:
+				# A gap of more than one frame period between two device timestamps means the SDK dropped frames
+				if last_timestamp is not None and capture.device_timestamp_usec is not None and frame_period:
+					gap = capture.device_timestamp_usec - last_timestamp
+					self.capture_stats["sdk_dropped"] += max(round(gap / frame_period) - 1, 0)
+				last_timestamp = capture.device_timestamp_usec
+
+				if len(self.capture_buffer) == self.capture_buffer.maxlen and \
+						self.capture_buffer[0].index > self.last_read_index:
+					self.capture_stats["dropped"] += 1
+				self.capture_buffer.append(capture)
+				self.capture_stats["captured"] += 1
+				self.capture_condition.notify_all()
+
 	def update_imu(self, timeout_in_ms=K4A_WAIT_INFINITE):
 		
 		# Get imu sample
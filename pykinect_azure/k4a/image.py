@@ -1,8 +1,12 @@
+import ctypes
 import numpy as np
 import cv2
 
 from pykinect_azure.k4a import _k4a
 
+# cv2.imdecode flags of the MJPG decoding scales
+DECODE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
 class Image:
 
 	def __init__(self, image_handle):
@@ -85,7 +89,20 @@ class Image:
 	def get_stride_bytes(self):
 		return int(_k4a.k4a_image_get_stride_bytes(self._handle))
 
-	def to_numpy(self):
+	def get_device_timestamp_usec(self):
+		if not self.is_valid():
+			return None
+
+		return int(_k4a.k4a_image_get_device_timestamp_usec(self._handle))
+
+	def to_numpy(self, copy=True, scale=1):
+		"""
+		:param copy: False to skip the copy of the buffer: the uncompressed formats (BGRA32, DEPTH16, IR16 & custom)
+		             are returned as read-only views on the k4a buffer, to be copied before drawing on them, and the
+		             compressed ones are decoded directly from it. A view keeps this image alive, its handle is
+		             released once the last view is deleted.
+		:param scale: 2, 4 or 8 to decode MJPG images at 1/scale of their resolution, which is faster
+		"""
 		# Get the pointer to the buffer containing the image data
 		buffer_pointer = self.get_buffer()
 		
@@ -101,26 +118,49 @@ class Image:
 		image_format = self.get_format()
 
 		# Read the data in the buffer
-		buffer_array = np.ctypeslib.as_array(buffer_pointer,shape=(image_size,))
+		if copy:
+			buffer_array = np.ctypeslib.as_array(buffer_pointer,shape=(image_size,))
+		else:
+			buffer_array = np.asarray(_ImageBuffer(self, buffer_pointer, image_size))
+
+		def read_buffer(dtype):
+			buffer = np.frombuffer(buffer_array, dtype=dtype)
+			return buffer.copy() if copy else buffer
 
 		# Parse buffer based on image formats
 		if image_format == _k4a.K4A_IMAGE_FORMAT_COLOR_MJPG:
-			return True, cv2.imdecode(np.frombuffer(buffer_array, dtype=np.uint8).copy(), -1)
+			return True, cv2.imdecode(read_buffer(np.uint8), -1 if scale == 1 else DECODE_FLAGS[scale])
 		elif image_format == _k4a.K4A_IMAGE_FORMAT_COLOR_NV12:
-			yuv_image = np.frombuffer(buffer_array, dtype=np.uint8).copy().reshape(int(image_height*1.5),image_width)
+			yuv_image = read_buffer(np.uint8).reshape(int(image_height*1.5),image_width)
 			return True, cv2.cvtColor(yuv_image, cv2.COLOR_YUV2BGR_NV12)
 		elif image_format == _k4a.K4A_IMAGE_FORMAT_COLOR_YUY2:
-			yuv_image = np.frombuffer(buffer_array, dtype=np.uint8).copy().reshape(image_height,image_width,2)
+			yuv_image = read_buffer(np.uint8).reshape(image_height,image_width,2)
 			return True, cv2.cvtColor(yuv_image, cv2.COLOR_YUV2BGR_YUY2)
 		elif image_format == _k4a.K4A_IMAGE_FORMAT_COLOR_BGRA32:
-			return True, np.frombuffer(buffer_array, dtype=np.uint8).copy().reshape(image_height,image_width,4)
+			return True, read_buffer(np.uint8).reshape(image_height,image_width,4)
 		elif image_format == _k4a.K4A_IMAGE_FORMAT_DEPTH16:
-			return True, np.frombuffer(buffer_array, dtype="<u2").copy().reshape(image_height,image_width)#little-endian 16 bits unsigned Depth data
+			return True, read_buffer("<u2").reshape(image_height,image_width)#little-endian 16 bits unsigned Depth data
 		elif image_format == _k4a.K4A_IMAGE_FORMAT_IR16:
-			return True, np.frombuffer(buffer_array, dtype="<u2").copy().reshape(image_height,image_width)#little-endian 16 bits unsigned IR data. For more details see: https://microsoft.github.io/Azure-Kinect-Sensor-SDK/release/1.2.x/namespace_microsoft_1_1_azure_1_1_kinect_1_1_sensor_a7a3cb7a0a3073650bf17c2fef2bfbd1b.html
+			return True, read_buffer("<u2").reshape(image_height,image_width)#little-endian 16 bits unsigned IR data. For more details see: https://microsoft.github.io/Azure-Kinect-Sensor-SDK/release/1.2.x/namespace_microsoft_1_1_azure_1_1_kinect_1_1_sensor_a7a3cb7a0a3073650bf17c2fef2bfbd1b.html
 		elif image_format == _k4a.K4A_IMAGE_FORMAT_CUSTOM8:
-			return True, np.frombuffer(buffer_array, dtype="<u1").copy().reshape(image_height,image_width)
+			return True, read_buffer("<u1").reshape(image_height,image_width)
 		elif image_format == _k4a.K4A_IMAGE_FORMAT_CUSTOM16:
-			return True, np.frombuffer(buffer_array, dtype="<u2").copy().reshape(image_height,image_width)
+			return True, read_buffer("<u2").reshape(image_height,image_width)
 		elif image_format == _k4a.K4A_IMAGE_FORMAT_CUSTOM:
-			return True, np.frombuffer(buffer_array, dtype="<i2").copy()
\ No newline at end of file
+			return True, read_buffer("<i2")
+
+class _ImageBuffer:
+	"""
+	Read-only buffer of a k4a image for NumPy, which references the Image: the arrays built from it
+	keep the image handle alive until the last one is deleted
+	"""
+
+	def __init__(self, image, buffer_pointer, image_size):
+
+		self.image = image
+		self.__array_interface__ = {
+			"shape": (image_size,),
+			"typestr": "|u1",
+			"data": (ctypes.cast(buffer_pointer, ctypes.c_void_p).value, True),
+			"version": 3,
+		}
@@ -0,0 +1,49 @@
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+class ImageDecoder:
+	"""
+	Pool of threads decoding the color images of the captures, cv2.imdecode releases the GIL so the MJPG
+	decoding runs in parallel with the capture & the rest of the frame processing.
+	The images are decoded from the k4a buffer without copying it, each Image stays alive until it is decoded.
+
+	Params
+		n_workers: number of decoding threads
+		scale: 1, 2, 4 or 8 to decode the MJPG images at 1/scale of their resolution
+	"""
+
+	def __init__(self, n_workers=2, scale=1):
+
+		self.executor = ThreadPoolExecutor(n_workers, thread_name_prefix="k4a_decoder")
+		self.n_workers = n_workers
+		self.scale = scale
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.shutdown()
+
+	def submit(self, image):
+		"""
+		:param image: Image, e.g. Capture.get_color_image_object()
+		:return: Future of the (ret, frame) of Image.to_numpy
+		"""
+		return self.executor.submit(image.to_numpy, False, self.scale)
+
+	def map(self, images, max_pending=None):
+		"""
+		Decodes the images in parallel and yields the (ret, frame) in the order of the images,
+		with at most max_pending images (2 per worker by default) waiting to be decoded
+		"""
+		max_pending = max_pending or 2 * self.n_workers
+		pending = collections.deque()
+		for image in images:
+			pending.append(self.submit(image))
+			if len(pending) >= max_pending:
+				yield pending.popleft().result()
+		while pending:
+			yield pending.popleft().result()
+
+	def shutdown(self):
+		self.executor.shutdown(wait=True)
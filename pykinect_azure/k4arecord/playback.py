@@ -1,3 +1,7 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from pykinect_azure.k4arecord import _k4arecord
 from pykinect_azure.k4arecord.datablock import Datablock
 from pykinect_azure.k4arecord.record_configuration import RecordConfiguration
@@ -5,6 +9,7 @@ from pykinect_azure.k4arecord.record_configuration import RecordConfiguration
 from pykinect_azure.k4a import _k4a
 from pykinect_azure.k4a.capture import Capture
 from pykinect_azure.k4a.calibration import Calibration
+from pykinect_azure.k4a.transformation import Transformation
 from pykinect_azure.k4a.imu_sample import ImuSample
 
 class Playback:
@@ -17,15 +22,23 @@ class Playback:
 
 		self.open(filepath)
 		self.calibration = self.get_calibration()	
+		self.camera_transform = None
 
 	def __del__(self):
 		self.close()
 
+	def __iter__(self):
+		return self.iter_captures()
+
 	def open(self, filepath):
 
 		_k4arecord.VERIFY(_k4arecord.k4a_playback_open(filepath.encode('utf-8'),self._handle),"Failed to open recording!")
 
 	def isOpened(self):
+		"""
+		Seeks one capture forward & back: to read the recording, iter_captures and get_next_capture (None at the
+		end) detect the end without seeking
+		"""
 		ret = _k4arecord.k4a_playback_get_next_capture(self._handle, _k4a.k4a_capture_t()) != _k4arecord.K4A_STREAM_RESULT_EOF
 		_k4arecord.k4a_playback_get_previous_capture(self._handle, _k4a.k4a_capture_t())
 
@@ -64,27 +77,110 @@ class Playback:
 		return RecordConfiguration(config)
 
 	def get_next_capture(self):
-		capture_handle = _k4a.k4a_capture_t()
-		_k4a.VERIFY(_k4arecord.k4a_playback_get_next_capture(self._handle, capture_handle),"Get next capture failed!")
-			
-		if self.is_capture_initialized():
-			self._capture._handle = capture_handle
-		else :
-			self._capture = Capture(capture_handle, self.calibration.handle())
-
-		return self._capture
+		"""
+		:return: the next Capture, with its own handle, None at the end of the recording
+		"""
+		return self._read_capture(_k4arecord.k4a_playback_get_next_capture, "Get next capture failed!")
 
 	def get_previous_capture(self):
-		capture_handle = _k4a.k4a_capture_t()
-		_k4a.VERIFY(_k4arecord.k4a_playback_get_previous_capture(self._handle, capture_handle),"Get previous capture failed!")
-			
-		if self.is_capture_initialized():
-			self._capture._handle = capture_handle
-		else :
-			self._capture = Capture(capture_handle, self.calibration.handle())
+		"""
+		:return: the previous Capture, with its own handle, None at the beginning of the recording
+		"""
+		return self._read_capture(_k4arecord.k4a_playback_get_previous_capture, "Get previous capture failed!")
 
+	def _read_capture(self, read_function, error):
+		capture_handle = _k4a.k4a_capture_t()
+		result = read_function(self._handle, capture_handle)
+		if result == _k4arecord.K4A_STREAM_RESULT_EOF:
+			return None
+		_k4a.VERIFY(result, error)
+
+		# Creating a transformation is expensive, all the captures of the recording share one
+		if self.camera_transform is None:
+			self.camera_transform = Transformation(self.calibration.handle())
+		self._capture = Capture(capture_handle, self.calibration.handle(), self.camera_transform)
 		return self._capture
 
+	def iter_captures(self, prefetch=8, decode_workers=2, color=True, depth=False, scale=1, stop_event=None):
+		"""
+		Iterates over the captures from the current position to the end of the recording. A background thread
+		reads up to prefetch captures ahead and a pool of decode_workers threads converts their images to numpy
+		in parallel, while the consumer processes the previous captures.
+		Each capture has its own handle, it can be kept as long as needed. The playback mustn't be read or seeked
+		during the iteration.
+
+		:param color: decode the color images, see Capture.get_color_image
+		:param depth: decode the depth images, see Capture.get_depth_image
+		:param scale: 2, 4 or 8 to decode the MJPG color images at 1/scale of their resolution
+		:param stop_event: threading.Event ending the iteration when set, e.g. from another thread than the
+		                   consumer which can't close the generator while it's waiting for a capture
+		:return: generator of the Captures with their index, device_timestamp_usec, and the (ret, image) of
+		         to_numpy in color_image & depth_image (None if not decoded)
+		"""
+		captures = queue.Queue(prefetch)
+		stop_event = stop_event if stop_event is not None else threading.Event()
+		executor = ThreadPoolExecutor(decode_workers, thread_name_prefix="k4a_playback_decoder")
+
+		def put(item):
+			# Waits for room in the queue until the consumer stops iterating
+			while not stop_event.is_set():
+				try:
+					captures.put(item, timeout=0.1)
+					return True
+				except queue.Full:
+					pass
+			return False
+
+		def read_captures():
+			index = 0
+			try:
+				while not stop_event.is_set():
+					capture_handle = _k4a.k4a_capture_t()
+					result = _k4arecord.k4a_playback_get_next_capture(self._handle, capture_handle)
+					# The end of the recording is given by the result, without seeking back & forth
+					if result == _k4arecord.K4A_STREAM_RESULT_EOF:
+						break
+					if result != _k4arecord.K4A_STREAM_RESULT_SUCCEEDED:
+						raise RuntimeError("Get next capture failed!")
+
+					if self.camera_transform is None:
+						self.camera_transform = Transformation(self.calibration.handle())
+					capture = Capture(capture_handle, self.calibration.handle(), self.camera_transform)
+					index += 1
+					capture.index = index
+					capture.device_timestamp_usec = capture.get_device_timestamp_usec()
+
+					# The images are decoded from the k4a buffers without copying them first
+					color_image = executor.submit(capture.get_color_image, False, scale) if color else None
+					depth_image = executor.submit(capture.get_depth_image, False) if depth else None
+					if not put((capture, color_image, depth_image)):
+						return
+				put(None)
+			except Exception as e:
+				put(e)
+
+		reader = threading.Thread(target=read_captures, name="k4a_playback_reader", daemon=True)
+		reader.start()
+		try:
+			while not stop_event.is_set():
+				try:
+					item = captures.get(timeout=0.1)
+				except queue.Empty:
+					continue
+				if item is None:
+					return
+				if isinstance(item, Exception):
+					raise item
+
+				capture, color_image, depth_image = item
+				capture.color_image = color_image.result() if color_image is not None else None
+				capture.depth_image = depth_image.result() if depth_image is not None else None
+				yield capture
+		finally:
+			stop_event.set()
+			reader.join()
+			executor.shutdown(wait=True)
+
 	def get_next_imu_sample(self):
 		imu_sample_struct = _k4a.k4a_imu_sample_t()
 		_k4a.VERIFY(_k4arecord.k4a_playback_get_next_imu_sample(self._handle, imu_sample_struct),"Get next imu sample failed!")
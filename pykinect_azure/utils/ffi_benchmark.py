@@ -0,0 +1,77 @@
+import ctypes
+import sys
+import timeit
+
+from pykinect_azure.k4a import _k4a
+from pykinect_azure.k4a.image import Image
+from pykinect_azure.utils.utils import get_k4a_module_path
+
+# Micro-benchmark of the ctypes overhead of reading the color image of a capture, with the real k4a wrappers.
+# Before: every wrapper looked up its function & set restype & argtypes on each call.
+# After: setup_library binds & types every function once and the wrappers only call them.
+# The capture is created on the host with a 720p BGRA image, so no device is needed: the calls after
+# k4a_device_get_capture are the same as for a camera capture.
+#
+# Usage: py -3.7 -m pykinect_azure.utils.ffi_benchmark [n_captures]
+
+# k4a functions called for each color capture after k4a_device_get_capture, in the order of the wrappers
+CAPTURE_FUNCTIONS = [
+	"k4a_capture_get_color_image",
+	"k4a_image_get_buffer",
+	"k4a_image_get_size",
+	"k4a_image_get_width_pixels",
+	"k4a_image_get_height_pixels",
+	"k4a_image_get_format",
+	"k4a_image_release",
+]
+
+def create_capture(width=1280, height=720):
+	capture_handle = _k4a.k4a_capture_t()
+	_k4a.VERIFY(_k4a.k4a_capture_create(capture_handle), "Create capture failed!")
+	image_handle = _k4a.k4a_image_t()
+	_k4a.VERIFY(_k4a.k4a_image_create(_k4a.K4A_IMAGE_FORMAT_COLOR_BGRA32, width, height, width * 4, image_handle),
+				"Create image failed!")
+	_k4a.k4a_capture_set_color_image(capture_handle, image_handle)
+	# The capture holds its own reference on the image
+	_k4a.k4a_image_release(image_handle)
+	return capture_handle
+
+def main(n_captures=100000):
+	module_k4a_path = get_k4a_module_path()
+	try:
+		# Another handle on the library for the per call typing, so it doesn't change the bound functions
+		k4a_dll = ctypes.CDLL(module_k4a_path)
+	except OSError:
+		print(f"k4a library not found at {module_k4a_path}, install the Azure Kinect SDK to run the benchmark")
+		sys.exit(1)
+	_k4a.setup_library(module_k4a_path)
+	capture_handle = create_capture()
+
+	def capture_before():
+		def call(function_name, *args):
+			restype, argtypes = _k4a._prototypes[function_name]
+			function = getattr(k4a_dll, function_name)
+			function.restype = restype
+			function.argtypes = argtypes
+			return function(*args)
+
+		image_handle = call("k4a_capture_get_color_image", capture_handle)
+		for function_name in CAPTURE_FUNCTIONS[1:]:
+			call(function_name, image_handle)
+
+	def capture_after():
+		# Same as Capture.get_color_image_object
+		image = Image(_k4a.k4a_capture_get_color_image(capture_handle))
+		image.get_buffer()
+		image.get_size()
+		image.get_width_pixels()
+		image.get_height_pixels()
+		image.get_format()
+		image.reset()
+
+	for label, read_capture in (("before (typed per call)", capture_before), ("after (bound once)", capture_after)):
+		seconds = min(timeit.repeat(read_capture, number=n_captures, repeat=5)) / n_captures
+		print(f"{label}: {seconds * 1e6:.2f} us per capture ({len(CAPTURE_FUNCTIONS)} calls)")
+
+if __name__ == "__main__":
+	main(*map(int, sys.argv[1:]))
@@ -2,13 +2,23 @@ import pykinect_azure as pyk
 import time
 import cv2
 import sys
-from os import path, makedirs, listdir
+from os import path, makedirs
 from leap_listener import LeapListener
+from utils.leap_sources import create_leap_source
+from utils.sync_utils import ClockSync
+from utils.async_writer import AsyncWriter, get_last_video_index
+from utils.ring_buffer import RingBuffer
+from utils.landmark_utils import LiveLandmarkExtractor
 
 
 LMB_pressed = False
 MMB_pressed = False
 recording_time = 3 # seconds
+pre_roll = 0.5 # seconds before the MMB click that start the recording, for the signs started a bit early
+writer_queue_size = 90 # frames & landmarks waiting to be written before the capture loop waits for the disk
+inline_extraction = False # extract the MediaPipe landmarks while recording, instead of from the mp4 in main.py
+detector_backend = "holistic" # MediaPipe backend of the inline extraction, should be the one of main.py
+leap_source = "dll" # "synthetic" to try the recorder without a Leap, see utils.leap_sources
 
 def on_click(event, x, y, flags, *userdata):
     global LMB_pressed
@@ -30,7 +40,8 @@ if __name__ == "__main__":
         makedirs(video_folder_path, exist_ok=True)
         makedirs(UL_folder_path, exist_ok=True)
 
-    listener = LeapListener()
+    listener = LeapListener(source=create_leap_source(leap_source))
+    listener.start_polling()
     # Initialize and start the Azure Kinect.
     pyk.initialize_libraries()
     ak_config = pyk.default_configuration
@@ -38,20 +49,34 @@ if __name__ == "__main__":
     ak_config.depth_mode = pyk.K4A_DEPTH_MODE_OFF
     ak_config.camera_fps = pyk.K4A_FRAMES_PER_SECOND_30
     azure_kinect = pyk.start_device(config=ak_config)
+    # Every capture is kept with its device timestamp, mapped to the clock of the Leap samples
+    azure_kinect.start_capture_thread()
+    clock_sync = ClockSync()
 
     cv2.namedWindow("Recorder")
     cv2.setMouseCallback("Recorder", on_click)
-    vid_cod = cv2.VideoWriter_fourcc(*'mp4v')
+    # Videos & landmarks are encoded and saved on the writer thread, the loop only captures & enqueues
+    writer = AsyncWriter(writer_queue_size)
+    # The MediaPipe landmarks are extracted on a worker thread too, with one landmark row per video frame
+    extractor = LiveLandmarkExtractor(detector_backend, writer_queue_size) if inline_extraction else None
     font = cv2.FONT_HERSHEY_SIMPLEX
-    output = None
     start_time = time.time()
-    video_i = len(listdir(video_folder_path))
+    # The next video follows the last finished one, whatever the other files of the folder
+    video_i = get_last_video_index(video_folder_path, sign_type)
     is_recording = False
+    frame_times = []
+    # Last frames & their times while not recording
+    pre_roll_frames = RingBuffer(int(pre_roll * 30))
+    pre_roll_times = RingBuffer(int(pre_roll * 30), dtype=float)
 
     while True:
         # Read feed
         capture = azure_kinect.update()
-        ret, frame = capture.get_color_image()
+        frame_time = capture.reception_time
+        if capture.device_timestamp_usec is not None:
+            frame_time = clock_sync.update(capture.device_timestamp_usec, capture.reception_time)
+        # MJPG frames are decoded straight from the k4a buffer, without copying it first
+        ret, frame = capture.get_color_image(copy=False)
 
         if not ret:
             continue
@@ -59,25 +84,52 @@ if __name__ == "__main__":
         pressedKey = cv2.waitKey(1) & 0xFF
         if MMB_pressed and not is_recording:  # Record pressing MMB
             video_i += 1
-            output = cv2.VideoWriter((video_folder_path + "/%s-%d.mp4" % (sign_type, video_i)), 
-                                     vid_cod, 30, (1280, 720))
-            start_time = time.time()
+            writer.open_video(video_folder_path + "/%s-%d.mp4" % (sign_type, video_i), 30, (1280, 720))
+            # The recording starts with the pre-roll frames & lasts recording_time from the first one
+            if extractor:
+                extractor.start()
+            for buffered_frame in pre_roll_frames.get():
+                writer.write_frame(buffered_frame)
+                if extractor:
+                    extractor.add_frame(buffered_frame)
+            frame_times = pre_roll_times.get().tolist()
+            start_time = time.time() - (frame_time - frame_times[0] if frame_times else 0)
+            pre_roll_frames.clear()
+            pre_roll_times.clear()
             is_recording = True
             MMB_pressed = False
         elif pressedKey == 32:  # Break pressing Space
             break
         if is_recording:
+            writer.write_frame(frame)
+            if extractor:
+                extractor.add_frame(frame)
+            frame_times.append(frame_time)
             if time.time() - start_time > recording_time:
                 is_recording = False
                 MMB_pressed = False
-                listener.pickle_landmarks(category, sign_type, video_i)
+                writer.close_video()
+                if extractor:
+                    extractor.save("%s-%d" % (sign_type, video_i), category)
+                # One Leap sample per video frame, resampled at the time each frame was taken
+                listener.record_at(frame_times)
+                listener.pickle_landmarks(category, sign_type, video_i, writer)
                 listener.reset_landmarks()
-            output.write(frame)
-            listener.get_landmarks()
-            image = cv2.putText(frame, 'Recording...', (50, 50), font,
+                if writer.n_stalls:
+                    print(f"The disk was too slow {writer.n_stalls} times, frames may have been skipped")
+                    writer.n_stalls = 0
+                if extractor and extractor.n_stalls:
+                    print(f"MediaPipe was too slow {extractor.n_stalls} times, frames may have been skipped")
+                    extractor.n_stalls = 0
+            # The written frame is left untouched
+            frame = cv2.putText(frame.copy(), 'Recording...', (50, 50), font,
                                 1, (255, 0, 0), 2, cv2.LINE_AA)
+        else:
+            pre_roll_frames.append(frame)
+            pre_roll_times.append(frame_time)
         cv2.imshow("Recorder", frame)
-    if output:
-        output.release()
+    writer.close()
+    if extractor:
+        extractor.close()
 
     cv2.destroyAllWindows()
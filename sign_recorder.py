@@ -1,19 +1,115 @@
+import os
+
 import pandas as pd
 import numpy as np
 from typing import Tuple
 
-from utils.dtw import dtw_distances
+from utils.dtw import dtw_distances, StreamingDTW
+from models.hand_model import HandModel
 from models.sign_model import SignModel
 from utils.landmark_utils import extract_landmarks
+from utils.ring_buffer import RingBuffer
+from utils.reference_store import get_store_path, open_reference_store
+
+# Early decision: relative margin between the two best signs at which the recording stops,
+# and number of frames recorded before the first decision
+EARLY_MARGIN = 0.3
+EARLY_MIN_FRAMES = 10
+# Signs whose best open-end cost is this many times the best one stop being updated
+EARLY_PRUNE_RATIO = 2
+
+def calibrate_continuous_thresholds(reference_signs: pd.DataFrame, ul_reference_signs: pd.DataFrame, window=90,
+                                    percentile=90) -> Tuple[float, float]:
+    """
+    Measures the thresholds of the continuous mode on the reference signs of a category: each reference is
+    streamed, leave-one-out, against the others. Its best cost against the references of its own sign is a
+    true match & its best cost against the other signs a false one. The threshold of each sensor is halfway
+    between the percentile of the true match costs & the (100 - percentile) of the false match costs.
+    It streams every reference against all the others, see load_continuous_thresholds to only do it once.
+
+    :return: the (MediaPipe, Ultraleap) thresholds of SignRecorder's continuous_thresholds
+    """
+    thresholds = []
+    for references in (reference_signs, ul_reference_signs):
+        names = references["name"].values
+        # A single stream of all the references, the streamed one is masked out of its own costs
+        stream = StreamingDTW(references, window)
+        true_costs, false_costs = [], []
+        for idx, sign_model in enumerate(references["sign_model"].values):
+            is_same_sign = names == names[idx]
+            is_same_sign[idx] = False
+            is_other_sign = names != names[idx]
+            if not is_same_sign.any() or not is_other_sign.any():
+                continue
+
+            # The frames without a hand are skipped by the embeddings, both hands are streamed side by side
+            lh_embedding = sign_model.lh_embedding if sign_model.has_left_hand else []
+            rh_embedding = sign_model.rh_embedding if sign_model.has_right_hand else []
+            stream.reset()
+            best_costs = np.full(len(references), np.inf)
+            for frame in range(max(len(lh_embedding), len(rh_embedding))):
+                costs = stream.update(lh_embedding[frame] if frame < len(lh_embedding) else None,
+                                      rh_embedding[frame] if frame < len(rh_embedding) else None)
+                np.minimum(best_costs, costs, out=best_costs)
+            true_costs.append(best_costs[is_same_sign].min())
+            false_costs.append(best_costs[is_other_sign].min())
+
+        true_costs = np.array(true_costs)[np.isfinite(true_costs)]
+        false_costs = np.array(false_costs)[np.isfinite(false_costs)]
+        if len(true_costs) == 0 or len(false_costs) == 0:
+            raise ValueError("Not enough reference signs to calibrate the continuous mode")
+        thresholds.append(float(np.percentile(true_costs, percentile) +
+                                np.percentile(false_costs, 100 - percentile)) / 2)
+    return tuple(thresholds)
+
+
+def load_continuous_thresholds(category, reference_signs: pd.DataFrame, ul_reference_signs: pd.DataFrame,
+                               embedding_mode="full", window=90, percentile=90) -> Tuple[float, float]:
+    """
+    Thresholds of calibrate_continuous_thresholds cached next to the index of the reference store of the category
+    (see utils/reference_store.py): they're only calibrated again once the store is rebuilt or with other parameters
+
+    :param reference_signs, ul_reference_signs: the reference signs loaded from the store, see load_reference_signs
+    """
+    store = open_reference_store(category, embedding_mode)
+    if store is None:
+        return calibrate_continuous_thresholds(reference_signs, ul_reference_signs, window, percentile)
+
+    # Each build of the store has a new id
+    key = np.array([str(store["build"]), str(window), str(percentile)])
+    path = os.path.join(get_store_path(category, embedding_mode), "continuous_thresholds.npz")
+    if os.path.isfile(path):
+        try:
+            with np.load(path) as cache:
+                if np.array_equal(cache["key"], key):
+                    return tuple(cache["thresholds"].tolist())
+        except (OSError, ValueError, KeyError):
+            pass
+
+    thresholds = calibrate_continuous_thresholds(reference_signs, ul_reference_signs, window, percentile)
+    with open(path + ".tmp", "wb") as file:
+        np.savez(file, key=key, thresholds=np.array(thresholds))
+    os.replace(path + ".tmp", path)
+    return thresholds
 
 
 class SignRecorder(object):
-    def __init__(self, reference_signs: pd.DataFrame, ul_reference_signs: pd.DataFrame, seq_len=40):
+    def __init__(self, reference_signs: pd.DataFrame, ul_reference_signs: pd.DataFrame, seq_len=40,
+                 embedding_mode="full", continuous=False, continuous_thresholds=None, window=90,
+                 early_decision=False, early_margin=EARLY_MARGIN, early_min_frames=EARLY_MIN_FRAMES,
+                 pre_roll=0):
         # Variables for recording
         self.is_recording = False
         self.seq_len = seq_len
         self.predicted_sign = ""
 
+        # Pre-roll: the last pre_roll frames (MP & UL hands) before record() are kept and start the recording,
+        # which then covers the seq_len frames from pre_roll frames before the click
+        self.pre_roll = RingBuffer(min(pre_roll, seq_len), dtype=np.float32)
+
+        # Has to be the embedding mode of the reference signs
+        self.embedding_mode = embedding_mode
+
         # List of results stored each frame
         self.recorded_mp_lh = []
         self.recorded_mp_rh = []
@@ -24,27 +120,71 @@ class SignRecorder(object):
         self.reference_signs = reference_signs
         self.ul_reference_signs = ul_reference_signs
 
+        # Continuous mode: instead of recording seq_len frames after a click, every frame updates the
+        # subsequence DTW of all the reference signs and a sign is emitted as soon as one matches well enough
+        # continuous_thresholds: (MediaPipe, Ultraleap) average cost per frame & hand under which a reference
+        # matches, they depend on the signer & the category, see calibrate_continuous_thresholds
+        self.continuous = continuous
+        if continuous:
+            if continuous_thresholds is None:
+                raise ValueError("The continuous mode needs continuous_thresholds, see calibrate_continuous_thresholds")
+            self.continuous_thresholds = continuous_thresholds
+            self.mp_stream = StreamingDTW(reference_signs, window)
+            self.ul_stream = StreamingDTW(ul_reference_signs, window)
+
+        # Early decision: each recorded frame extends the DTW of all the reference signs and the recording
+        # stops as soon as one sign leads the others by early_margin, instead of always waiting seq_len frames
+        self.early_decision = early_decision
+        if early_decision:
+            self.early_margin = early_margin
+            self.early_min_frames = early_min_frames
+            self.mp_progress = StreamingDTW(reference_signs, window=None, subsequence=False)
+            self.ul_progress = StreamingDTW(ul_reference_signs, window=None, subsequence=False)
+
 
     def record(self):
         """
         Initialize sign_distances & start recording
+        In continuous mode, forget the frames seen so far
         """
-        self.reference_signs["distance"].values[:] = 0
-        self.ul_reference_signs["distance"].values[:] = 0
+        if self.continuous:
+            self.mp_stream.reset()
+            self.ul_stream.reset()
+            self.predicted_sign = ""
+            return
+
+        self.reference_signs["distance"] = 0
+        self.ul_reference_signs["distance"] = 0
         self.predicted_sign = ""
         self.is_recording = True
 
+        if self.early_decision:
+            self.mp_progress.reset()
+            self.ul_progress.reset()
+
+        for left_mp_hand, right_mp_hand, lh_landmarks, rh_landmarks in self.pre_roll.get().tolist():
+            self.recorded_mp_lh.append(left_mp_hand)
+            self.recorded_mp_rh.append(right_mp_hand)
+            self.recorded_ul_lh.append(lh_landmarks)
+            self.recorded_ul_rh.append(rh_landmarks)
+            if self.early_decision:
+                self._update_progress(left_mp_hand, right_mp_hand, lh_landmarks, rh_landmarks)
+        self.pre_roll.clear()
+
 
     def process_mp_results(self, results, lh_landmarks, rh_landmarks) -> Tuple[str, bool]:
         """
         If the SignRecorder is in the recording state:
             it stores the landmarks during seq_len frames and then computes the sign distances
         :param results: mediapipe output
-               lh_landmarks: leap motion left output
-               rh_landmarks: leap motion right output
+               lh_landmarks: leap motion left output at the time of the frame (see LeapListener.sample_at)
+               rh_landmarks: leap motion right output at the time of the frame
         :return: Return the word predicted (blank text if there is no distances)
                 & the recording state
         """
+        if self.continuous:
+            return self._process_continuous(results, lh_landmarks, rh_landmarks), self.is_recording
+
         if self.is_recording:
             if len(self.recorded_mp_lh) < self.seq_len:
                 left_mp_hand, right_mp_hand = extract_landmarks(results)
@@ -52,34 +192,127 @@ class SignRecorder(object):
                 self.recorded_mp_rh.append(right_mp_hand)
                 self.recorded_ul_lh.append(lh_landmarks)
                 self.recorded_ul_rh.append(rh_landmarks)
+
+                if self.early_decision and self._decide_early(left_mp_hand, right_mp_hand, lh_landmarks, rh_landmarks):
+                    return self.predicted_sign, self.is_recording
             else:
                 self.compute_distances()
                 print(self.reference_signs)
                 print(self.ul_reference_signs)
+        elif self.pre_roll.capacity:
+            self.pre_roll.append([*extract_landmarks(results), lh_landmarks, rh_landmarks])
 
-        if np.sum(self.reference_signs["distance"].values) == 0:
-            return "", self.is_recording
-        if self.predicted_sign == "":
+        if self.predicted_sign == "" and np.sum(self.reference_signs["distance"].values) != 0:
             self._get_sign_predicted()
         return self.predicted_sign, self.is_recording
 
 
-    def compute_distances(self):
+    def _process_continuous(self, results, lh_landmarks, rh_landmarks) -> str:
+        """
+        Feeds the frame to the subsequence DTW of both sensors
+        :return: the last sign emitted
+        """
+        left_mp_hand, right_mp_hand = extract_landmarks(results)
+        mp_costs = self.mp_stream.update(self._get_feature_vector(left_mp_hand),
+                                         self._get_feature_vector(right_mp_hand))
+        ul_costs = self.ul_stream.update(self._get_feature_vector(lh_landmarks),
+                                         self._get_feature_vector(rh_landmarks))
+
+        # The MP and UL costs work over different measurements, they're compared relative to their threshold
+        # and a reference matches if the mean of its finite ratios is below 1.
+        ratios = np.stack([mp_costs / self.continuous_thresholds[0], ul_costs / self.continuous_thresholds[1]])
+        is_finite = np.isfinite(ratios)
+        n_finite = is_finite.sum(axis=0)
+        scores = np.where(is_finite, ratios, 0).sum(axis=0) / np.maximum(n_finite, 1)
+        scores[n_finite == 0] = np.inf
+
+        if len(scores) > 0 and scores.min() < 1:
+            self.predicted_sign = self.mp_stream.names[np.argmin(scores)]
+            print(f"Continuous match: {self.predicted_sign} ({scores.min():.2f})")
+
+            # The next sign has to start after this one
+            self.mp_stream.reset()
+            self.ul_stream.reset()
+        return self.predicted_sign
+
+
+    def _decide_early(self, left_mp_hand, right_mp_hand, lh_landmarks, rh_landmarks, batch_size=30) -> bool:
+        """
+        Extends the partial DTW of both sensors with the recorded frame, prunes the unlikely references
+        and stops the recording if a sign leads the second best one by early_margin
+        :return: True if the sign has been decided
+        """
+        self._update_progress(left_mp_hand, right_mp_hand, lh_landmarks, rh_landmarks)
+        if len(self.recorded_mp_lh) < self.early_min_frames:
+            return False
+
+        # Open-end costs: the best partial DTW of the recording so far against any prefix of each reference,
+        # the end of the reference can't be reached before the sign is finished.
+        # The MP and UL costs work over different measurements, the best cost of each sign is normalized by
+        # the best cost of the sensor and the finite values of both sensors are averaged
+        scores, candidates = [], []
+        for progress in (self.mp_progress, self.ul_progress):
+            costs = progress.get_lower_bounds()
+            best_cost = costs.min(initial=np.inf)
+            if np.isfinite(best_cost) and best_cost > 0:
+                sign_scores = pd.Series(costs / best_cost).groupby(progress.names)
+                scores.append(sign_scores.min())
+
+                # Heuristic pruning: the open-end cost of a reference never decreases with the next frames,
+                # but the best one may grow past it, so a sign far above the best cost is only very unlikely
+                # to catch up. The references of a sign are pruned together: early on, the noise between the
+                # references of the right sign is as large as their costs. They stay in the final DTW if the
+                # recording goes on to seq_len frames.
+                progress.prune(sign_scores.transform("min").values > EARLY_PRUNE_RATIO)
+
+            # The sign is chosen on the open-end costs, the distance columns only hold full DTW distances
+            candidates.append(pd.DataFrame({"name": progress.names, "distance": costs})
+                              .replace(np.inf, np.nan).dropna().sort_values(by=["distance"]))
+        if len(scores) == 0:
+            return False
+
+        scores = pd.concat(scores, axis=1).replace(np.inf, np.nan).mean(axis=1).dropna().sort_values()
+        if len(scores) < 2 or scores.iloc[1] / scores.iloc[0] - 1 < self.early_margin:
+            return False
+
+        print(f"Early decision after {len(self.recorded_mp_lh)} frames: {scores.index[0]} "
+              f"(margin {scores.iloc[1] / scores.iloc[0] - 1:.2f})")
+        self._get_sign_predicted(batch_size, *candidates)
+        return True
+
+
+    def _update_progress(self, left_mp_hand, right_mp_hand, lh_landmarks, rh_landmarks):
+        """
+        Extends the partial DTW of both sensors with a recorded frame
+        """
+        self.mp_progress.update(self._get_feature_vector(left_mp_hand), self._get_feature_vector(right_mp_hand))
+        self.ul_progress.update(self._get_feature_vector(lh_landmarks), self._get_feature_vector(rh_landmarks))
+
+
+    def _get_feature_vector(self, landmarks):
+        if np.sum(landmarks) == 0:
+            return None
+        landmarks = np.asarray(landmarks, dtype=float).reshape((1, 21, 3))
+        return HandModel.get_feature_vectors(landmarks, self.embedding_mode)[0]
+
+
+    def compute_distances(self, batch_size=30):
         """
         Updates the distance column of the reference_signs
-        and resets recording variables
+        and resets recording variables.
+        Only the top batch_size distances are used to choose the sign, the other references get pruned.
         """
         # Create a SignModel object with the landmarks gathered during recording
-        recorded_sign = SignModel(self.recorded_mp_lh, self.recorded_mp_rh)
-        ul_recorded_sign = SignModel(self.recorded_ul_lh, self.recorded_ul_rh)
+        recorded_sign = SignModel(self.recorded_mp_lh, self.recorded_mp_rh, self.embedding_mode)
+        ul_recorded_sign = SignModel(self.recorded_ul_lh, self.recorded_ul_rh, self.embedding_mode)
 
         # Compute sign similarity with DTW (ascending order)
-        self.reference_signs = dtw_distances(recorded_sign, self.reference_signs)
-        self.ul_reference_signs = dtw_distances(ul_recorded_sign, self.ul_reference_signs)
+        self.reference_signs = dtw_distances(recorded_sign, self.reference_signs, batch_size)
+        self.ul_reference_signs = dtw_distances(ul_recorded_sign, self.ul_reference_signs, batch_size)
 
 
-    def _get_sign_predicted(self, batch_size=30):
-        self.predicted_sign = self._choose_sign(batch_size)
+    def _get_sign_predicted(self, batch_size=30, reference_signs=None, ul_reference_signs=None):
+        self.predicted_sign = self._choose_sign(batch_size, reference_signs, ul_reference_signs)
 
         # Reset variables
         self.recorded_mp_lh = []
@@ -89,8 +322,14 @@ class SignRecorder(object):
         self.is_recording = False
         
 
-    def _choose_sign(self, batch_size):
-        n_frames = self.seq_len
+    def _choose_sign(self, batch_size, reference_signs=None, ul_reference_signs=None):
+        """
+        :param reference_signs, ul_reference_signs: names & distances of the references sorted by distance,
+                                                    None for the distance columns of the recorded sign
+        """
+        if reference_signs is None:
+            reference_signs, ul_reference_signs = self.reference_signs, self.ul_reference_signs
+        n_frames = len(self.recorded_mp_lh)
         outlier = [0] * 63
 
         # Checks if the left hand has been fully absent through the entire recording.
@@ -105,12 +344,14 @@ class SignRecorder(object):
 
         # Takes the top $batch_size and then calculates the mean of the likely gestures.
         # The four lowest average distances then get taken for further comparison.
-        highest_two = self.reference_signs.iloc[:batch_size]['name'].value_counts()[:2]
-        if highest_two[0] > highest_two[1] * 1.5 and ul_outlier_score < 0.2:
+        highest_two = reference_signs.iloc[:batch_size]['name'].value_counts()[:2]
+        if len(highest_two) == 1:
+            return highest_two.idxmax()
+        if len(highest_two) == 2 and highest_two.iloc[0] > highest_two.iloc[1] * 1.5 and ul_outlier_score < 0.2:
             return highest_two.idxmax()
 
-        MP_means = self.reference_signs.iloc[:batch_size].groupby(['name'])['distance'].mean().sort_values().head(4)
-        UL_means = self.ul_reference_signs.iloc[:batch_size].groupby(['name'])['distance'].mean().sort_values().head(4)
+        MP_means = reference_signs.iloc[:batch_size].groupby(['name'])['distance'].mean().sort_values().head(4)
+        UL_means = ul_reference_signs.iloc[:batch_size].groupby(['name'])['distance'].mean().sort_values().head(4)
 
         # (Reversed) normalization is done as the Ultraleap and MP distances work over different measurements.
         # The normalization is reversed as it seems more intuitive that a higher score indicates a likelier gesture.
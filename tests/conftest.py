@@ -0,0 +1,5 @@
+import sys
+from os import path
+
+# The modules of the repository are imported from its root, as main.py does
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from utils.async_writer import AsyncWriter, get_last_video_index
+
+
+def create_files(folder, file_names):
+    os.makedirs(folder, exist_ok=True)
+    for file_name in file_names:
+        open(os.path.join(folder, file_name), "wb").close()
+
+
+@pytest.mark.parametrize("file_names, expected", [
+    ([], 0),
+    (["hello-1.mp4", "hello-2.mp4"], 2),
+    # A removed video doesn't give its index to the next one
+    (["hello-1.mp4", "hello-3.mp4"], 3),
+    (["hello-2.mp4", "hello-10.mp4", "hello-9.mp4"], 10),
+    # Unfinished & unrelated files
+    (["hello-1.mp4", "hello-2.tmp.mp4", "hello-4.mp4.tmp", "notes.txt", "hello_world-7.mp4"], 1),
+])
+def test_the_videos_follow_the_last_one(tmp_path, file_names, expected):
+    create_files(tmp_path, file_names)
+
+    assert get_last_video_index(tmp_path, "hello") == expected
+
+
+def test_the_unfinished_videos_are_removed(tmp_path):
+    create_files(tmp_path, ["hello-1.mp4", "hello-2.tmp.mp4"])
+
+    get_last_video_index(tmp_path, "hello")
+
+    assert os.listdir(tmp_path) == ["hello-1.mp4"]
+
+
+def test_the_tasks_run_in_order():
+    results = []
+    with AsyncWriter(max_pending=2) as writer:
+        for idx in range(10):
+            writer.submit(results.append, idx)
+
+    assert results == list(range(10))
+
+
+def test_a_failed_task_is_reported_on_the_next_submit():
+    def fail():
+        raise OSError("Disk full")
+
+    writer = AsyncWriter()
+    writer.submit(fail)
+    writer.close()
+
+    with pytest.raises(RuntimeError):
+        writer.submit(print)
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+
+import pytest
+
+from utils import dataset_utils
+from utils.dataset_utils import load_dataset
+
+
+def create_videos(category, video_names):
+    for video_name in video_names:
+        folder = os.path.join("data", "videos", category, video_name.split("-")[0])
+        os.makedirs(folder, exist_ok=True)
+        open(os.path.join(folder, video_name + ".mp4"), "wb").close()
+
+
+def fake_extraction(video_name, category, detector=None, detector_backend="holistic"):
+    """
+    Records the backend in place of the landmarks, fails on the "broken" videos & kills the worker on the "crash" ones
+    """
+    if video_name.startswith("broken"):
+        raise ValueError("Can't decode the video")
+    if video_name.startswith("crash"):
+        os._exit(1)
+    folder = os.path.join("data", "dataset", category, video_name.split("-")[0], video_name)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, f"lh_{video_name}.pickle"), "w") as file:
+        file.write(detector_backend)
+
+
+def extracted_backend(category, video_name):
+    folder = os.path.join("data", "dataset", category, video_name.split("-")[0], video_name)
+    with open(os.path.join(folder, f"lh_{video_name}.pickle")) as file:
+        return file.read()
+
+
+# The workers only see the fake extraction if they're forked from the test process
+needs_fork = pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="the workers aren't forked")
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dataset_utils, "save_landmarks_from_video", fake_extraction)
+
+
+def test_only_the_new_videos_are_extracted(dataset):
+    create_videos("A", ["hello-1", "hello-2"])
+    fake_extraction("hello-1", "A", detector_backend="previous")
+    # Being written by the recorder
+    open(os.path.join("data", "videos", "A", "hello", "hello-3.tmp.mp4"), "wb").close()
+
+    videos = load_dataset("A", detector_backend="hands")
+
+    assert sorted(videos) == ["hello-1", "hello-2"]
+    assert extracted_backend("A", "hello-1") == "previous"
+    assert extracted_backend("A", "hello-2") == "hands"
+
+
+@pytest.mark.parametrize("n_workers", [1, pytest.param(2, marks=needs_fork)])
+def test_the_failed_videos_are_skipped(dataset, n_workers):
+    create_videos("A", ["hello-1", "broken-1", "thanks-1"])
+
+    videos = load_dataset("A", n_workers, detector_backend="hands")
+
+    assert sorted(videos) == ["hello-1", "thanks-1"]
+    assert extracted_backend("A", "thanks-1") == "hands"
+
+
+@needs_fork
+def test_a_dying_worker_only_loses_its_video(dataset):
+    create_videos("A", ["hello-1", "crash-1", "thanks-1", "yes-1"])
+
+    videos = load_dataset("A", n_workers=2, detector_backend="hands")
+
+    assert sorted(videos) == ["hello-1", "thanks-1", "yes-1"]
+    for video_name in videos:
+        assert extracted_backend("A", video_name) == "hands"
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from models.sign_model import SignModel
+from utils.dtw import batch_dtw, stack_embeddings, lb_kim, lb_keogh, dtw_lower_bound, _hands_dtw, _cascading_dtw
+
+
+def naive_dtw(query, reference):
+    """
+    O(n * m) DTW with the L1 distance between frames
+    """
+    n, m = len(query), len(reference)
+    cumulative_cost = np.full((n + 1, m + 1), np.inf)
+    cumulative_cost[0, 0] = 0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            cost = np.abs(query[i - 1] - reference[j - 1]).sum()
+            cumulative_cost[i, j] = cost + min(cumulative_cost[i - 1, j - 1], cumulative_cost[i - 1, j],
+                                               cumulative_cost[i, j - 1])
+    return cumulative_cost[n, m]
+
+
+def random_sequences(rng, lengths, n_features=6):
+    return [rng.normal(size=(length, n_features)) for length in lengths]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_dtw_matches_naive_dtw(seed):
+    rng = np.random.default_rng(seed)
+    query = rng.normal(size=(rng.integers(1, 15), 6))
+    references = random_sequences(rng, rng.integers(1, 20, size=8))
+    stack, lengths = stack_embeddings(references)
+
+    expected = [naive_dtw(query, reference) for reference in references]
+    np.testing.assert_allclose(batch_dtw(query, stack, lengths), expected)
+
+
+def test_batch_dtw_abandons_above_max_distance():
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=(10, 6))
+    references = random_sequences(rng, [5, 12, 17])
+    stack, lengths = stack_embeddings(references)
+    expected = np.array([naive_dtw(query, reference) for reference in references])
+
+    # Within its max_distance a reference gets its exact distance, above it is either exact or abandoned
+    max_distances = expected + np.array([1e-6, -1e-6, -expected[2]])
+    distances = batch_dtw(query, stack, lengths, max_distances)
+    np.testing.assert_allclose(distances[0], expected[0])
+    assert distances[1] == np.inf or np.isclose(distances[1], expected[1])
+    assert distances[2] == np.inf
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_lower_bounds_never_exceed_dtw(seed):
+    rng = np.random.default_rng(seed)
+    query, reference = random_sequences(rng, rng.integers(1, 20, size=2))
+    query_envelope = SignModel._get_envelope(query)
+    reference_envelope = SignModel._get_envelope(reference)
+    distance = naive_dtw(query, reference)
+
+    assert lb_kim(query, reference) <= distance + 1e-9
+    assert lb_keogh(query, reference_envelope) <= distance + 1e-9
+    assert lb_keogh(reference, query_envelope) <= distance + 1e-9
+    assert dtw_lower_bound(query, query_envelope, reference, reference_envelope) <= distance + 1e-9
+
+
+def random_sign(rng, n_frames, n_features=6):
+    lh_embedding, rh_embedding = random_sequences(rng, [n_frames, n_frames], n_features)
+    return SignModel.from_embeddings(lh_embedding, rh_embedding, True, True, "full")
+
+
+@pytest.mark.parametrize("k", [1, 3, 10])
+def test_cascading_dtw_finds_the_brute_force_neighbours(k):
+    rng = np.random.default_rng(k)
+    recorded_sign = random_sign(rng, 12)
+    ref_sign_models = np.array([random_sign(rng, n_frames) for n_frames in rng.integers(5, 25, size=40)])
+
+    brute_force = _hands_dtw(recorded_sign, ref_sign_models)
+    distances = _cascading_dtw(recorded_sign, ref_sign_models, k)
+
+    nearest = np.argsort(brute_force)[:k]
+    assert set(np.argsort(distances)[:k]) == set(nearest)
+    np.testing.assert_allclose(distances[nearest], brute_force[nearest])
@@ -0,0 +1,93 @@
+import mediapipe as mp
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.hand_model import HandModel
+from models.sign_model import SignModel
+from utils.dtw import dtw_distances
+
+
+def loop_feature_vector(landmarks):
+    """
+    Angles between all the connections of one frame, one pair at a time
+    """
+    connections = [landmarks[end] - landmarks[start] for start, end in mp.solutions.holistic.HAND_CONNECTIONS]
+    angles = []
+    for connection_from in connections:
+        for connection_to in connections:
+            if np.array_equal(connection_from, connection_to):
+                angles.append(0)
+                continue
+            with np.errstate(divide="ignore", invalid="ignore"):
+                angle = np.arccos(np.dot(connection_from, connection_to)
+                                  / (np.linalg.norm(connection_from) * np.linalg.norm(connection_to)))
+            angles.append(angle if angle == angle else 0)
+    return angles
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_feature_vectors_match_the_loop(seed):
+    landmarks = np.random.default_rng(seed).normal(size=(8, 21, 3))
+
+    feature_vectors = HandModel.get_feature_vectors(landmarks)
+
+    assert feature_vectors.shape == (8, 441)
+    for frame, feature_vector in zip(landmarks, feature_vectors):
+        np.testing.assert_allclose(feature_vector, loop_feature_vector(frame), atol=1e-12)
+
+
+def test_degenerate_connections_get_an_angle_of_zero():
+    landmarks = np.random.default_rng(0).normal(size=(21, 3))
+    # A zero-length connection gives NaN angles, two equal connections an angle of 0
+    landmarks[1] = landmarks[0]
+    landmarks[6] = landmarks[5] + (landmarks[2] - landmarks[1])
+
+    feature_vector = HandModel(landmarks.ravel().tolist()).feature_vector
+
+    assert len(feature_vector) == 441
+    assert not np.isnan(feature_vector).any()
+    np.testing.assert_allclose(feature_vector, loop_feature_vector(landmarks), atol=1e-12)
+
+
+def test_sign_model_skips_the_frames_without_the_hand():
+    rng = np.random.default_rng(1)
+    left_hand = rng.normal(size=(6, 63))
+    left_hand[[1, 4]] = 0
+
+    sign_model = SignModel(left_hand.tolist(), np.zeros((6, 63)).tolist())
+
+    assert sign_model.has_left_hand and not sign_model.has_right_hand
+    expected = [loop_feature_vector(frame.reshape(21, 3)) for frame in left_hand[[0, 2, 3, 5]]]
+    np.testing.assert_allclose(sign_model.lh_embedding, expected, atol=1e-12)
+    assert sign_model.rh_embedding.shape == (0, 441)
+
+
+def test_triu_mode_keeps_the_upper_triangle():
+    landmarks = np.random.default_rng(2).normal(size=(5, 21, 3))
+
+    full = HandModel.get_feature_vectors(landmarks).reshape(5, 21, 21)
+    triu = HandModel.get_feature_vectors(landmarks, "triu")
+
+    rows, columns = np.triu_indices(21, k=1)
+    assert triu.shape == (5, 210)
+    np.testing.assert_array_equal(triu, full[:, rows, columns])
+    np.testing.assert_allclose(full, full.transpose(0, 2, 1), atol=1e-12)
+
+
+def test_triu_mode_gives_the_full_distances():
+    rng = np.random.default_rng(3)
+    recorded, *references = [rng.normal(size=(rng.integers(5, 12), 63)).tolist() for _ in range(5)]
+    no_hand = lambda hand: np.zeros((len(hand), 63)).tolist()
+
+    distances = {}
+    for embedding_mode in ("full", "triu"):
+        reference_signs = pd.DataFrame({
+            "name": [f"sign-{idx}" for idx in range(len(references))],
+            "sign_model": [SignModel(hand, no_hand(hand), embedding_mode) for hand in references],
+            "distance": 0.0,
+        })
+        recorded_sign = SignModel(recorded, no_hand(recorded), embedding_mode)
+        distances[embedding_mode] = dtw_distances(recorded_sign, reference_signs).sort_index()["distance"].values
+
+    np.testing.assert_allclose(distances["triu"], distances["full"], rtol=1e-9)
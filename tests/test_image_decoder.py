@@ -0,0 +1,80 @@
+import threading
+import time
+
+import numpy as np
+
+from pykinect_azure.k4a.image_decoder import ImageDecoder
+
+
+class SlowImage(object):
+    """
+    Image whose decoding takes delay seconds, the decoded frame is filled with its value
+    """
+    n_decoding = 0
+    max_decoding = 0
+    lock = threading.Lock()
+
+    def __init__(self, value, delay=0.0):
+        self.value = value
+        self.delay = delay
+        self.calls = []
+
+    def to_numpy(self, copy=True, scale=1):
+        with SlowImage.lock:
+            SlowImage.n_decoding += 1
+            SlowImage.max_decoding = max(SlowImage.max_decoding, SlowImage.n_decoding)
+        self.calls.append((copy, scale, threading.current_thread().name))
+        time.sleep(self.delay)
+        with SlowImage.lock:
+            SlowImage.n_decoding -= 1
+        return True, np.full((2, 2, 3), self.value, dtype=np.uint8)
+
+
+def test_the_images_are_decoded_without_copy_on_the_pool():
+    image = SlowImage(3)
+
+    with ImageDecoder(n_workers=2, scale=4) as decoder:
+        ret, frame = decoder.submit(image).result()
+
+    assert ret and (frame == 3).all()
+    copy, scale, thread_name = image.calls[0]
+    assert (copy, scale) == (False, 4)
+    assert thread_name.startswith("k4a_decoder")
+
+
+def test_map_keeps_the_order_of_the_images():
+    rng = np.random.default_rng(0)
+    images = [SlowImage(value, rng.uniform(0, 0.005)) for value in range(20)]
+
+    with ImageDecoder(n_workers=4) as decoder:
+        frames = [frame for ret, frame in decoder.map(images)]
+
+    assert [frame[0, 0, 0] for frame in frames] == list(range(20))
+
+
+def test_map_runs_the_decodings_in_parallel():
+    SlowImage.max_decoding = 0
+
+    with ImageDecoder(n_workers=3) as decoder:
+        start = time.perf_counter()
+        list(decoder.map(SlowImage(value, 0.02) for value in range(6)))
+        duration = time.perf_counter() - start
+
+    assert SlowImage.max_decoding == 3
+    assert duration < 6 * 0.02
+
+
+def test_map_only_reads_ahead_max_pending_images():
+    read = []
+
+    def images():
+        for value in range(10):
+            read.append(value)
+            yield SlowImage(value)
+
+    with ImageDecoder(n_workers=2) as decoder:
+        frames = decoder.map(images(), max_pending=3)
+        next(frames)
+        assert len(read) == 3
+        next(frames)
+        assert len(read) == 4
@@ -0,0 +1,129 @@
+import queue
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from pykinect_azure.k4a import _k4a, device
+from pykinect_azure.k4a.device import Device
+
+# Device timestamps of the 30 fps frames
+FRAME_PERIOD_USEC = 33333
+
+
+class FakeCapture(object):
+    def __init__(self, capture_handle, calibration_handle, transformation=None):
+        self.timestamp = capture_handle.timestamp
+
+    def handle(self):
+        return None
+
+    def get_device_timestamp_usec(self):
+        return self.timestamp
+
+
+class FakeCameras(object):
+    """
+    k4a_device_get_capture of a device whose frames are sent by the test, with their device timestamp
+    (None for a failed capture)
+    """
+
+    def __init__(self):
+        self.frames = queue.Queue()
+
+    def get_capture(self, device_handle, capture_handle, timeout_in_ms):
+        try:
+            timestamp = self.frames.get(timeout=timeout_in_ms / 1000)
+        except queue.Empty:
+            return _k4a.K4A_WAIT_RESULT_TIMEOUT
+        if timestamp is None:
+            return _k4a.K4A_WAIT_RESULT_FAILED
+        capture_handle.timestamp = timestamp
+        return _k4a.K4A_WAIT_RESULT_SUCCEEDED
+
+
+@pytest.fixture
+def cameras(monkeypatch):
+    cameras = FakeCameras()
+    monkeypatch.setattr(device, "_k4a", SimpleNamespace(
+        k4a_capture_t=lambda: SimpleNamespace(timestamp=None),
+        k4a_device_get_capture=cameras.get_capture,
+        K4A_WAIT_RESULT_SUCCEEDED=_k4a.K4A_WAIT_RESULT_SUCCEEDED,
+        K4A_WAIT_RESULT_TIMEOUT=_k4a.K4A_WAIT_RESULT_TIMEOUT,
+    ))
+    monkeypatch.setattr(device, "Capture", FakeCapture)
+    monkeypatch.setattr(device, "Transformation", lambda calibration_handle: None)
+    monkeypatch.setattr(Device, "calibration", SimpleNamespace(handle=lambda: None))
+    return cameras
+
+
+@pytest.fixture
+def kinect(cameras):
+    # Without opening a device
+    kinect = Device.__new__(Device)
+    kinect._handle = None
+    kinect.recording = False
+    kinect.capture_thread = None
+    kinect.configuration = SimpleNamespace(camera_fps=_k4a.K4A_FRAMES_PER_SECOND_30)
+    kinect.start_capture_thread(buffer_size=3, timeout_in_ms=10)
+    yield kinect
+    kinect.stop_capture_thread()
+
+
+def send_frames(kinect, cameras, frame_indices):
+    """
+    Sends the frames & waits for the capture thread to buffer them
+    """
+    n_captured = kinect.get_capture_stats()["captured"] + len(frame_indices)
+    for frame_idx in frame_indices:
+        cameras.frames.put(frame_idx * FRAME_PERIOD_USEC)
+    while kinect.get_capture_stats()["captured"] < n_captured:
+        time.sleep(0.001)
+
+
+def test_the_next_capture_is_never_skipped(kinect, cameras):
+    send_frames(kinect, cameras, [0, 1])
+    assert kinect.get_next_capture(timeout=1).index == 1
+    send_frames(kinect, cameras, [2])
+
+    captures = [kinect.get_next_capture(timeout=1) for _ in range(2)]
+
+    assert [capture.index for capture in captures] == [2, 3]
+    assert captures[1].device_timestamp_usec == 2 * FRAME_PERIOD_USEC
+    assert captures[0].reception_time <= captures[1].reception_time
+    assert kinect.get_next_capture(timeout=0.01) is None
+    stats = kinect.get_capture_stats()
+    assert (stats["read"], stats["skipped"], stats["dropped"]) == (3, 0, 0)
+
+
+def test_the_latest_capture_skips_the_older_ones(kinect, cameras):
+    send_frames(kinect, cameras, [0, 1, 2])
+
+    assert kinect.get_latest_capture(timeout=1).index == 3
+    assert kinect.get_latest_capture(timeout=0.01) is None
+    stats = kinect.get_capture_stats()
+    assert (stats["read"], stats["skipped"], stats["dropped"]) == (1, 2, 0)
+
+
+def test_a_full_buffer_drops_the_oldest_captures(kinect, cameras):
+    # The device itself missed the frames 3 & 4
+    send_frames(kinect, cameras, [0, 1, 2, 5, 6])
+
+    assert [kinect.get_next_capture(timeout=1).index for _ in range(3)] == [3, 4, 5]
+    stats = kinect.get_capture_stats()
+    assert (stats["captured"], stats["dropped"], stats["sdk_dropped"], stats["buffered"]) == (5, 2, 2, 3)
+
+
+def test_the_consumer_keeps_going_during_timeouts(kinect, cameras):
+    time.sleep(0.05)
+    send_frames(kinect, cameras, [0])
+
+    assert kinect.get_latest_capture(timeout=1).index == 1
+    assert kinect.get_capture_stats()["timeouts"] > 0
+
+
+def test_a_failed_capture_is_raised_to_the_consumer(kinect, cameras):
+    cameras.frames.put(None)
+
+    with pytest.raises(RuntimeError):
+        kinect.get_latest_capture(timeout=1)
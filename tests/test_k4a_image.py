@@ -0,0 +1,81 @@
+import ctypes
+import gc
+
+import numpy as np
+import pytest
+
+from pykinect_azure.k4a import _k4a
+from pykinect_azure.k4a.image import Image
+
+
+class FakeImage(Image):
+    """
+    BGRA32 image on a ctypes buffer instead of a k4a handle
+    """
+    n_released = 0
+
+    def __init__(self, pixels):
+        super().__init__(image_handle=True)
+        self.pixels = pixels
+        self.buffer = (ctypes.c_uint8 * pixels.size).from_buffer_copy(pixels.tobytes())
+
+    def reset(self):
+        if self._handle:
+            FakeImage.n_released += 1
+            self._handle = None
+
+    def get_buffer(self):
+        return ctypes.cast(self.buffer, ctypes.POINTER(ctypes.c_uint8))
+
+    def get_size(self):
+        return self.pixels.size
+
+    def get_format(self):
+        return _k4a.K4A_IMAGE_FORMAT_COLOR_BGRA32
+
+    def get_width_pixels(self):
+        return self.pixels.shape[1]
+
+    def get_height_pixels(self):
+        return self.pixels.shape[0]
+
+
+@pytest.fixture
+def pixels():
+    return np.random.default_rng(0).integers(0, 256, size=(4, 6, 4), dtype=np.uint8)
+
+
+def test_a_copied_frame_can_be_drawn_on(pixels):
+    image = FakeImage(pixels)
+
+    ret, frame = image.to_numpy()
+
+    assert ret and frame.flags.writeable
+    np.testing.assert_array_equal(frame, pixels)
+    frame[:] = 0
+    np.testing.assert_array_equal(image.to_numpy()[1], pixels)
+
+
+def test_a_frame_without_copy_is_a_read_only_view(pixels):
+    image = FakeImage(pixels)
+
+    ret, frame = image.to_numpy(copy=False)
+
+    assert ret and not frame.flags.writeable
+    np.testing.assert_array_equal(frame, pixels)
+    with pytest.raises(ValueError):
+        frame[0, 0, 0] = 0
+    assert ctypes.addressof(image.buffer) == frame.__array_interface__["data"][0]
+
+
+def test_a_view_keeps_its_image_alive(pixels):
+    FakeImage.n_released = 0
+    ret, frame = FakeImage(pixels).to_numpy(copy=False)
+    gc.collect()
+
+    assert FakeImage.n_released == 0
+    np.testing.assert_array_equal(frame, pixels)
+
+    del frame
+    gc.collect()
+    assert FakeImage.n_released == 1
@@ -0,0 +1,144 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from pykinect_azure.k4arecord import _k4arecord, playback
+from pykinect_azure.k4arecord.playback import Playback
+from utils.frame_sources import PlaybackFrameSource
+
+FRAME_PERIOD_USEC = 33333
+
+
+class FakeCapture(object):
+    def __init__(self, capture_handle, calibration_handle, transformation=None):
+        self.frame_idx = capture_handle.frame_idx
+
+    def get_device_timestamp_usec(self):
+        return self.frame_idx * FRAME_PERIOD_USEC
+
+    def get_color_image(self, copy=True, scale=1):
+        return True, np.full((720 // scale, 1280 // scale, 3), self.frame_idx % 256, dtype=np.uint8)
+
+    def get_depth_image(self, copy=True):
+        return True, np.full((2, 2), self.frame_idx, dtype=np.uint16)
+
+
+class FakeRecording(object):
+    """
+    k4a_playback_get_next_capture of a recording of n_frames, which fails at fail_at & waits for
+    the gate to be opened after wait_at captures
+    """
+
+    def __init__(self, n_frames, fail_at=None, wait_at=None):
+        self.n_frames = n_frames
+        self.fail_at = fail_at
+        self.wait_at = wait_at
+        self.n_read = 0
+        self.gate = threading.Event()
+
+    def get_next_capture(self, playback_handle, capture_handle):
+        if self.n_read == self.wait_at:
+            self.gate.wait()
+        if self.n_read == self.fail_at:
+            return _k4arecord.K4A_STREAM_RESULT_FAILED
+        if self.n_read == self.n_frames:
+            return _k4arecord.K4A_STREAM_RESULT_EOF
+        capture_handle.frame_idx = self.n_read
+        self.n_read += 1
+        return _k4arecord.K4A_STREAM_RESULT_SUCCEEDED
+
+
+class FakePlayback(Playback):
+    def __init__(self):
+        self._handle = None
+        self.calibration = SimpleNamespace(handle=lambda: None)
+        self.camera_transform = None
+        self.is_closed = False
+
+    def close(self):
+        self.is_closed = True
+
+
+def open_recording(monkeypatch, n_frames, fail_at=None, wait_at=None):
+    recording = FakeRecording(n_frames, fail_at, wait_at)
+    monkeypatch.setattr(playback, "_k4arecord", SimpleNamespace(
+        k4a_playback_get_next_capture=recording.get_next_capture,
+        K4A_STREAM_RESULT_SUCCEEDED=_k4arecord.K4A_STREAM_RESULT_SUCCEEDED,
+        K4A_STREAM_RESULT_EOF=_k4arecord.K4A_STREAM_RESULT_EOF,
+    ))
+    monkeypatch.setattr(playback, "_k4a", SimpleNamespace(k4a_capture_t=lambda: SimpleNamespace(frame_idx=None)))
+    monkeypatch.setattr(playback, "Capture", FakeCapture)
+    monkeypatch.setattr(playback, "Transformation", lambda calibration_handle: None)
+    return recording, FakePlayback()
+
+
+def test_every_capture_is_decoded_in_order(monkeypatch):
+    recording, fake_playback = open_recording(monkeypatch, 20)
+
+    captures = list(fake_playback.iter_captures(prefetch=3, decode_workers=2, depth=True, scale=2))
+
+    assert [capture.index for capture in captures] == list(range(1, 21))
+    assert [capture.device_timestamp_usec for capture in captures] == [idx * FRAME_PERIOD_USEC for idx in range(20)]
+    for idx, capture in enumerate(captures):
+        ret, frame = capture.color_image
+        assert ret and frame.shape == (360, 640, 3) and (frame == idx).all()
+        assert capture.depth_image[1][0, 0] == idx
+
+
+def test_the_reader_only_prefetches_a_few_captures(monkeypatch):
+    recording, fake_playback = open_recording(monkeypatch, 100)
+
+    captures = fake_playback.iter_captures(prefetch=4, color=False)
+    capture = next(captures)
+    captures.close()
+
+    assert capture.color_image is None and capture.depth_image is None
+    # The one returned, the queue & the capture waiting to be put
+    assert recording.n_read <= 1 + 4 + 1
+
+
+def test_a_failed_read_is_raised_to_the_consumer(monkeypatch):
+    recording, fake_playback = open_recording(monkeypatch, 10, fail_at=3)
+
+    captures = fake_playback.iter_captures()
+
+    assert [next(captures).index for _ in range(3)] == [1, 2, 3]
+    with pytest.raises(RuntimeError):
+        next(captures)
+
+
+def test_closing_the_source_ends_a_waiting_read(monkeypatch):
+    # The second capture takes a while to come
+    recording, fake_playback = open_recording(monkeypatch, 10, wait_at=1)
+    source = PlaybackFrameSource.__new__(PlaybackFrameSource)
+    source.playback = fake_playback
+    source.stop_event = threading.Event()
+    source.captures = fake_playback.iter_captures(stop_event=source.stop_event)
+    source.n_frames = 0
+    source.start_timestamp_usec = None
+    assert source.read()["frame_time"] == 0
+
+    # On the capture thread of the pipeline
+    results = []
+
+    def read():
+        try:
+            results.append(source.read())
+        except StopIteration:
+            results.append(StopIteration)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    reader.join(timeout=0.2)
+    assert reader.is_alive()
+
+    threading.Timer(0.2, recording.gate.set).start()
+    source.close()
+    reader.join(timeout=1)
+
+    assert results == [StopIteration]
+    assert fake_playback.is_closed
+    # The playback isn't read anymore once closed
+    assert recording.n_read <= 2
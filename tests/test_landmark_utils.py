@@ -0,0 +1,77 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from utils import landmark_utils
+from utils.landmark_utils import LiveLandmarkExtractor, load_array
+
+
+class FakeDetector(object):
+    """
+    Tracking model which remembers the frames it has seen
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.frames = []
+        self.is_closed = False
+
+    def close(self):
+        self.is_closed = True
+
+
+def fake_detection(frame, detector):
+    """
+    Detects a right hand whose landmarks are the frame value & the number of frames seen before by the detector
+    """
+    assert not detector.is_closed
+    landmarks = [SimpleNamespace(x=frame, y=len(detector.frames), z=0)] * 21
+    detector.frames.append(frame)
+    return frame, SimpleNamespace(left_hand_landmarks=None, right_hand_landmarks=SimpleNamespace(landmark=landmarks))
+
+
+@pytest.fixture
+def detectors(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    detectors = []
+    monkeypatch.setattr(landmark_utils, "create_detector",
+                        lambda backend: detectors.append(FakeDetector(backend)) or detectors[-1])
+    monkeypatch.setattr(landmark_utils, "mediapipe_detection", fake_detection)
+    return detectors
+
+
+def saved_right_hand(category, video_name):
+    path = os.path.join("data", "dataset", category, video_name.split("-")[0], video_name)
+    return np.reshape(load_array(os.path.join(path, f"rh_{video_name}.pickle")), (-1, 21, 3))
+
+
+def test_each_video_gets_a_new_detector(detectors):
+    with LiveLandmarkExtractor("hands") as extractor:
+        for video_name, frames in (("hello-1", [1, 2, 3]), ("thanks-1", [4, 5])):
+            extractor.start()
+            for frame in frames:
+                extractor.add_frame(frame)
+            extractor.save(video_name, "A")
+
+    assert [detector.frames for detector in detectors] == [[1, 2, 3], [4, 5]]
+    assert all(detector.backend == "hands" and detector.is_closed for detector in detectors)
+    # Both videos are tracked from their first frame
+    np.testing.assert_array_equal(saved_right_hand("A", "hello-1")[:, 0, :2], [[1, 0], [2, 1], [3, 2]])
+    np.testing.assert_array_equal(saved_right_hand("A", "thanks-1")[:, 0, :2], [[4, 0], [5, 1]])
+
+
+def test_a_failed_extraction_is_reported_to_the_capture_loop(detectors, monkeypatch):
+    def failing_detection(frame, detector):
+        raise ValueError("No model")
+    monkeypatch.setattr(landmark_utils, "mediapipe_detection", failing_detection)
+
+    extractor = LiveLandmarkExtractor()
+    extractor.start()
+    extractor.add_frame(1)
+    extractor.thread.join()
+
+    with pytest.raises(RuntimeError):
+        extractor.add_frame(2)
+    assert detectors[0].is_closed
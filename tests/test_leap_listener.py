@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+import pytest
+
+from leap_listener import LeapListener
+from utils.leap_sources import ClockedLeapSource, N_LANDMARKS
+
+
+def ramp_source(n_samples=10, rate=10, paced=False):
+    """
+    Source whose sample i is filled with i
+    """
+    samples = np.repeat(np.arange(n_samples, dtype=float)[:, None], N_LANDMARKS, axis=1)
+    return ClockedLeapSource(samples, rate, paced=paced)
+
+
+def test_read_until_follows_the_timeline_of_the_source():
+    listener = LeapListener(source=ramp_source())
+
+    listener.read_until(0.35)
+
+    timestamps, samples = listener.get_samples()
+    np.testing.assert_allclose(timestamps, [0, 0.1, 0.2, 0.3])
+    np.testing.assert_array_equal(samples[:, 0], [0, 1, 2, 3])
+
+    # Already read
+    listener.read_until(0.3)
+    assert len(listener.get_samples()[0]) == 4
+
+
+# The next sample isn't read yet, as with a live Leap
+@pytest.mark.parametrize("frame_time, expected", [(0.25, 2), (0.3, 3), (0.05, 0)])
+def test_the_frames_get_the_last_sample_before_them(frame_time, expected):
+    listener = LeapListener(source=ramp_source())
+
+    listener.read_until(frame_time)
+    lh_landmarks, rh_landmarks = listener.sample_at(frame_time)
+
+    np.testing.assert_allclose(lh_landmarks, [expected] * 63)
+    np.testing.assert_allclose(rh_landmarks, [expected] * 63)
+
+
+def test_read_until_gives_the_same_samples_at_any_speed():
+    frame_times = np.arange(0, 1, 1 / 30)
+    samples = []
+    for n_reads in (1, len(frame_times)):
+        listener = LeapListener(source=ramp_source())
+        # All at once, or frame by frame
+        for frame_time in frame_times[-n_reads:]:
+            listener.read_until(frame_time)
+        samples.append(listener.resample(frame_times)[0])
+
+    np.testing.assert_array_equal(samples[0], samples[1])
+
+
+def test_the_polling_thread_timestamps_each_new_frame():
+    listener = LeapListener(source=ramp_source(rate=1000, paced=True))
+
+    before = time.perf_counter()
+    listener.start_polling()
+    time.sleep(0.05)
+    listener.stop_polling()
+    after = time.perf_counter()
+
+    timestamps, samples = listener.get_samples()
+    assert len(timestamps) > 5
+    assert before <= timestamps[0] and timestamps[-1] <= after
+    assert np.all(np.diff(timestamps) > 0)
+    # One sample per frame id of the source, in a loop of 10 samples
+    np.testing.assert_array_equal(np.diff(samples[:, 0]) % 10, 1)
+    assert listener.poller is None
+
+
+def test_the_buffer_keeps_the_last_samples():
+    listener = LeapListener(buffer_size=4, source=ramp_source(n_samples=100))
+
+    listener.read_until(0.95)
+
+    timestamps, samples = listener.get_samples()
+    np.testing.assert_allclose(timestamps, [0.6, 0.7, 0.8, 0.9])
+    np.testing.assert_array_equal(samples[:, 0], [6, 7, 8, 9])
+
+
+def test_the_recorded_sequence_grows():
+    listener = LeapListener(buffer_size=2, source=ramp_source())
+
+    for _ in range(5):
+        listener.get_frame()
+        listener.get_landmarks()
+
+    np.testing.assert_array_equal(listener.lh_landmarks[:, 0], range(5))
+    assert listener.rh_landmarks.shape == (5, 63)
+    listener.reset_landmarks()
+    assert len(listener.lh_landmarks) == 0
@@ -0,0 +1,115 @@
+import ctypes
+import os
+
+import numpy as np
+import pytest
+
+from utils.landmark_utils import save_array
+from utils.leap_sources import create_leap_source, DllLeapSource, ReplayLeapSource, SyntheticLeapSource, N_LANDMARKS
+
+
+class FakeFunction(object):
+    """
+    Function of PollingSample.dll, typed by the source
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.restype = None
+
+    def __call__(self):
+        return self.function()
+
+
+class FakeLibrary(object):
+    def __init__(self, frame, buffer):
+        self.getFrame = FakeFunction(lambda: frame)
+        self.getLandmarks = FakeFunction(lambda: ctypes.cast(buffer, ctypes.POINTER(ctypes.c_float)))
+        self.is_loaded = False
+
+    def loadLandmarks(self):
+        self.is_loaded = True
+
+
+def save_sequence(category, video_name, lh_landmarks, rh_landmarks):
+    path = os.path.join("data", "ultraleapdataset", category, video_name.split("-")[0], video_name)
+    os.makedirs(path, exist_ok=True)
+    save_array(np.asarray(lh_landmarks, dtype=float).tolist(), os.path.join(path, f"lh_{video_name}.pickle"))
+    save_array(np.asarray(rh_landmarks, dtype=float).tolist(), os.path.join(path, f"rh_{video_name}.pickle"))
+
+
+def read_samples(source, n_samples):
+    samples = np.zeros((n_samples, N_LANDMARKS), dtype=np.float32)
+    frames = []
+    for sample in samples:
+        frames.append(source.get_frame())
+        source.get_landmarks(sample)
+    return frames, samples
+
+
+def test_the_dll_landmarks_are_copied_from_its_buffer(monkeypatch):
+    buffer = (ctypes.c_float * N_LANDMARKS)(*range(N_LANDMARKS))
+    library = FakeLibrary(7, buffer)
+    monkeypatch.setattr(ctypes, "CDLL", lambda dll_path: library)
+
+    source = create_leap_source("dll")
+    landmarks = np.zeros(N_LANDMARKS, dtype=np.float32)
+    returned = source.get_landmarks(landmarks)
+
+    assert isinstance(source, DllLeapSource) and library.is_loaded
+    assert library.getFrame.restype is ctypes.c_int64
+    assert library.getLandmarks.restype is ctypes.POINTER(ctypes.c_float)
+    assert source.get_frame() == 7
+    assert returned is landmarks
+    np.testing.assert_array_equal(landmarks, range(N_LANDMARKS))
+    # A copy, the DLL overwrites its buffer with the next frame
+    buffer[0] = -1
+    assert landmarks[0] == 0
+
+
+def test_the_replay_streams_the_sequences_in_a_loop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_sequence("A", "hello-1", np.ones((2, 63)), np.full((2, 63), 2))
+    save_sequence("A", "thanks-1", np.full((1, 63), 3), np.zeros((1, 63)))
+    # Skipped: the hands don't have the same number of frames, or the sequence is empty
+    save_sequence("A", "yes-1", np.ones((2, 63)), np.ones((3, 63)))
+    save_sequence("A", "no-1", np.zeros((0, 63)), np.zeros((0, 63)))
+    save_sequence("B", "hello-1", np.full((1, 63), 4), np.full((1, 63), 4))
+
+    source = create_leap_source("replay", category="A", paced=False)
+    frames, samples = read_samples(source, 4)
+
+    assert isinstance(source, ReplayLeapSource)
+    assert source.sequence_names == ["hello-1", "thanks-1"]
+    assert frames == [0, 1, 2, 3]
+    np.testing.assert_array_equal(samples[:, [0, 63]], [[1, 2], [1, 2], [3, 0], [1, 2]])
+    assert len(ReplayLeapSource(paced=False).samples) == 4
+
+
+def test_the_replay_needs_sequences(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ReplayLeapSource("A", dataset_path=str(tmp_path))
+
+
+def test_the_synthetic_hands_are_the_same_for_a_seed():
+    samples = [read_samples(SyntheticLeapSource(rate=30, seed=seed, paced=False), 60)[1] for seed in (0, 0, 1)]
+
+    np.testing.assert_array_equal(samples[0], samples[1])
+    assert not np.array_equal(samples[0], samples[2])
+    # Both hands are always there, moving in a loop of period * rate samples
+    assert samples[0][:, :63].any(axis=1).all() and samples[0][:, 63:].any(axis=1).all()
+    np.testing.assert_array_equal(read_samples(SyntheticLeapSource(rate=30, paced=False), 120)[1][60:], samples[0])
+
+
+def test_a_paced_source_steps_at_its_rate():
+    source = SyntheticLeapSource(rate=10)
+
+    frames = [source.get_frame() for _ in range(10)]
+
+    # The first sample is due right away, the next one after 0.1 s
+    assert frames == [0] * 10
+
+
+def test_an_unknown_source_is_rejected():
+    with pytest.raises(ValueError):
+        create_leap_source("kinect")
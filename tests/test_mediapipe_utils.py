@@ -0,0 +1,190 @@
+from types import SimpleNamespace
+
+import mediapipe as mp
+import numpy as np
+import pytest
+
+from utils.mediapipe_utils import create_detector, mediapipe_detection, HandsDetector, HandRoiDetector
+
+WIDTH, HEIGHT = 1280, 720
+
+
+class FakeModel(object):
+    """
+    MediaPipe model returning the results of get_results(image), the images it processed are kept
+    """
+
+    def __init__(self, get_results=None, **kwargs):
+        self.get_results = get_results
+        self.kwargs = kwargs
+        self.images = []
+        self.is_closed = False
+
+    def process(self, image):
+        self.images.append(image)
+        return self.get_results(image)
+
+    def close(self):
+        self.is_closed = True
+
+
+def hand(x_min, y_min, x_max, y_max, z=0.1):
+    """
+    Landmarks spread over a box, in normalized coordinates
+    """
+    xs, ys = np.linspace(x_min, x_max, 21), np.linspace(y_min, y_max, 21)
+    return SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y in zip(xs, ys)])
+
+
+def holistic_results(left_hand=None, right_hand=None):
+    return SimpleNamespace(left_hand_landmarks=left_hand, right_hand_landmarks=right_hand)
+
+
+def hands_results(*hands):
+    """
+    Results of MediaPipe Hands, each hand is (landmarks, label, score)
+    """
+    return SimpleNamespace(
+        multi_hand_landmarks=[landmarks for landmarks, _, _ in hands] or None,
+        multi_handedness=[SimpleNamespace(classification=[SimpleNamespace(label=label, score=score)])
+                          for _, label, score in hands] or None,
+    )
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    monkeypatch.setattr(mp.solutions.holistic, "Holistic", FakeModel, raising=False)
+    monkeypatch.setattr(mp.solutions.hands, "Hands", FakeModel, raising=False)
+
+
+@pytest.mark.parametrize("backend, model_complexity", [("holistic", None), ("holistic_lite", 0)])
+def test_the_holistic_backends(fake_models, backend, model_complexity):
+    detector = create_detector(backend, static_image_mode=True)
+
+    assert isinstance(detector, FakeModel)
+    assert detector.kwargs.get("model_complexity") == model_complexity
+    assert detector.kwargs["static_image_mode"]
+
+
+def test_the_hands_backend(fake_models):
+    detector = create_detector("hands", min_detection_confidence=0.5)
+
+    assert isinstance(detector, HandsDetector)
+    assert detector.hands.kwargs["max_num_hands"] == 2
+    assert detector.hands.kwargs["min_detection_confidence"] == 0.5
+
+
+def test_an_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_detector("pose")
+
+
+@pytest.mark.parametrize("mirrored", [False, True])
+def test_the_hands_are_labelled_like_holistic(fake_models, mirrored):
+    detector = create_detector("hands", mirrored=mirrored)
+    signer_left, signer_right = hand(0, 0, 0.1, 0.1), hand(0.5, 0.5, 0.6, 0.6)
+    # Hands labels the hands as if the image was mirrored
+    labels = ("Left", "Right") if mirrored else ("Right", "Left")
+    detector.hands.get_results = lambda image: hands_results((signer_right, labels[1], 0.9),
+                                                             (signer_left, labels[0], 0.8))
+
+    results = detector.process(np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8))
+
+    assert results.left_hand_landmarks is signer_left
+    assert results.right_hand_landmarks is signer_right
+
+
+def test_the_most_confident_of_two_hands_with_the_same_label_is_kept(fake_models):
+    detector = create_detector("hands")
+    unsure, sure = hand(0, 0, 0.1, 0.1), hand(0.5, 0.5, 0.6, 0.6)
+    detector.hands.get_results = lambda image: hands_results((unsure, "Right", 0.6), (sure, "Right", 0.9))
+
+    results = detector.process(np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8))
+
+    assert results.left_hand_landmarks is sure
+    assert results.right_hand_landmarks is None
+    detector.hands.get_results = lambda image: hands_results()
+    assert detector.process(np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)) == (None, None)
+
+
+def test_the_detection_runs_on_a_read_only_rgb_image():
+    image = np.zeros((4, 6, 3), dtype=np.uint8)
+    image[..., 0] = 255
+    model = FakeModel(lambda rgb_image: holistic_results())
+
+    returned, results = mediapipe_detection(image, model)
+
+    assert returned is image and results == holistic_results()
+    assert not model.images[0].flags.writeable
+    assert (model.images[0][..., 2] == 255).all() and (model.images[0][..., 0] == 0).all()
+
+
+@pytest.fixture
+def roi_detector():
+    """
+    The right hand covers (512, 288) to (640, 432) on the full frames, the crops find it in their center
+    """
+    detector = FakeModel(lambda image: holistic_results(right_hand=hand(0.4, 0.4, 0.5, 0.6)))
+    crop_detector = FakeModel(lambda image: holistic_results(right_hand=hand(0.25, 0.25, 0.75, 0.75)))
+    return HandRoiDetector(detector, crop_detector, padding=0.5, min_size=192, full_frame_interval=3)
+
+
+def test_the_first_frame_is_processed_in_full(roi_detector):
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+    roi_detector.process(image)
+
+    assert roi_detector.detector.images == [image]
+    # The hand & half its size on each side, around its center
+    assert roi_detector.roi == (432, 216, 720, 504)
+
+
+def test_the_crop_landmarks_are_mapped_to_the_full_frame(roi_detector):
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    roi_detector.process(image)
+
+    results = roi_detector.process(image)
+
+    assert len(roi_detector.crop_detector.images) == 1
+    landmarks = results.right_hand_landmarks.landmark
+    np.testing.assert_allclose([landmarks[0].x * WIDTH, landmarks[0].y * HEIGHT], [432 + 72, 216 + 72])
+    np.testing.assert_allclose([landmarks[-1].x * WIDTH, landmarks[-1].y * HEIGHT], [720 - 72, 504 - 72])
+    assert landmarks[0].z == pytest.approx(0.1 * 288 / WIDTH)
+    # The crop follows the hand
+    assert roi_detector.roi == (432, 216, 720, 504)
+
+
+def test_the_full_frame_is_processed_regularly(roi_detector):
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+    for _ in range(9):
+        roi_detector.process(image)
+
+    # A full frame, then full_frame_interval crops
+    assert (len(roi_detector.detector.images), len(roi_detector.crop_detector.images)) == (3, 6)
+
+
+def test_the_full_frame_is_processed_once_a_hand_is_lost(roi_detector):
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    roi_detector.detector.get_results = lambda image: holistic_results(hand(0.4, 0.4, 0.45, 0.5),
+                                                                       hand(0.5, 0.4, 0.55, 0.5))
+    roi_detector.process(image)
+
+    # The crop only finds one of the two hands
+    results = roi_detector.process(image)
+
+    assert len(roi_detector.crop_detector.images) == 1 and len(roi_detector.detector.images) == 2
+    assert results.left_hand_landmarks is not None and results.right_hand_landmarks is not None
+
+
+def test_no_crop_without_hands(roi_detector):
+    image = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    roi_detector.detector.get_results = lambda image: holistic_results()
+
+    for _ in range(3):
+        roi_detector.process(image)
+
+    assert roi_detector.roi is None
+    assert (len(roi_detector.detector.images), len(roi_detector.crop_detector.images)) == (3, 0)
+    roi_detector.close()
+    assert roi_detector.detector.is_closed and roi_detector.crop_detector.is_closed
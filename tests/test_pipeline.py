@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from utils.pipeline import FrameQueue, Pipeline
+
+
+def put_in_background(frame_queue, items):
+    thread = threading.Thread(target=lambda: [frame_queue.put(item) for item in items], daemon=True)
+    thread.start()
+    return thread
+
+
+def test_a_full_queue_drops_the_oldest_items():
+    frame_queue = FrameQueue(maxsize=2)
+
+    for item in range(5):
+        frame_queue.put(item)
+
+    assert frame_queue.dropped == 3
+    assert [frame_queue.get(timeout=0), frame_queue.get(timeout=0), frame_queue.get(timeout=0)] == [3, 4, None]
+
+
+def test_a_full_queue_without_drop_blocks_the_producer():
+    frame_queue = FrameQueue(maxsize=2, drop=False)
+
+    producer = put_in_background(frame_queue, range(5))
+    time.sleep(0.05)
+    assert producer.is_alive() and frame_queue.depth() == 2
+
+    items = [frame_queue.get(timeout=1) for _ in range(5)]
+    producer.join(timeout=1)
+    assert items == list(range(5))
+    assert frame_queue.dropped == 0
+
+
+@pytest.mark.parametrize("unblock", ["set_drop", "close"])
+def test_a_blocked_producer_resumes(unblock):
+    frame_queue = FrameQueue(maxsize=1, drop=False)
+    frame_queue.put(0)
+    producer = put_in_background(frame_queue, [1])
+    time.sleep(0.05)
+    assert producer.is_alive()
+
+    if unblock == "set_drop":
+        frame_queue.set_drop(True)
+    else:
+        frame_queue.close()
+    producer.join(timeout=1)
+
+    assert not producer.is_alive()
+    if unblock == "set_drop":
+        assert frame_queue.dropped == 1 and frame_queue.get(timeout=0) == 1
+
+
+def test_a_pipeline_without_drop_processes_every_item():
+    items = iter(range(50))
+
+    def slow_stage(item):
+        time.sleep(0.001)
+        return item * 2
+
+    pipeline = Pipeline([("source", lambda: next(items)), ("slow", slow_stage)], queue_size=2,
+                        drop_frames=False).start()
+    outputs = []
+    while not pipeline.is_finished():
+        item = pipeline.get(timeout=0.1)
+        if item is not None:
+            outputs.append(item)
+    pipeline.stop()
+
+    assert outputs == [item * 2 for item in range(50)]
+    assert all(stats["dropped"] == 0 for stats in pipeline.get_stats().values())
+
+
+def test_the_pipeline_stops_dropping_while_recording():
+    """
+    Same switch as main.py: the frames are kept from the record request to the end of the recording
+    """
+    record_requested, is_recording = threading.Event(), threading.Event()
+    drop_lock = threading.Lock()
+    n_items = [0]
+
+    # The source is faster than the recognizer
+    def source():
+        time.sleep(0.0005)
+        n_items[0] += 1
+        if n_items[0] > 200:
+            raise StopIteration
+        return n_items[0]
+
+    def recognizer(item):
+        time.sleep(0.002)
+        if record_requested.is_set():
+            is_recording.set()
+            record_requested.clear()
+        with drop_lock:
+            pipeline.set_drop_frames(not is_recording.is_set() and not record_requested.is_set())
+        return item, is_recording.is_set()
+
+    pipeline = Pipeline([("source", source), ("recognizer", recognizer)], queue_size=2)
+    pipeline.start()
+    recorded = []
+    while not pipeline.is_finished():
+        output = pipeline.get(timeout=0.1)
+        if output is None:
+            continue
+        item, was_recording = output
+        if was_recording:
+            recorded.append(item)
+        elif item > 20 and not record_requested.is_set():
+            with drop_lock:
+                record_requested.set()
+                pipeline.set_drop_frames(False)
+    pipeline.stop()
+
+    # Frames were dropped before the recording, none once recording until the end of the source
+    assert pipeline.queues[0].dropped > 0
+    assert recorded == list(range(recorded[0], 201))
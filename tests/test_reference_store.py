@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.sign_model import SignModel
+from utils.dtw import dtw_distances, stack_hand
+from utils.landmark_utils import save_array, load_array
+from utils.reference_store import load_reference_store, get_sign_models, EMBEDDING_DTYPE
+
+SENSOR_FOLDERS = ("dataset", "ultraleapdataset")
+
+
+def save_video(category, video_name, rng, hands=("lh", "rh")):
+    """
+    Saves random landmarks for both sensors, the hands not in hands are all zeros
+    """
+    n_frames = rng.integers(4, 10)
+    for folder in SENSOR_FOLDERS:
+        path = os.path.join("data", folder, category, video_name.split("-")[0], video_name)
+        os.makedirs(path, exist_ok=True)
+        for hand in ("lh", "rh"):
+            landmarks = rng.normal(size=(n_frames, 63)) if hand in hands else np.zeros((n_frames, 63))
+            save_array(landmarks.tolist(), os.path.join(path, f"{hand}_{video_name}.pickle"))
+
+
+def load_sign_model(category, video_name, folder="dataset"):
+    path = os.path.join("data", folder, category, video_name.split("-")[0], video_name)
+    return SignModel(*[load_array(os.path.join(path, f"{hand}_{video_name}.pickle")) for hand in ("lh", "rh")])
+
+
+@pytest.fixture
+def videos(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    video_names = ["hello-1", "hello-2", "thanks-1", "yes-1"]
+    save_video("A", "hello-1", rng)
+    save_video("A", "hello-2", rng)
+    save_video("A", "thanks-1", rng, hands=("rh",))
+    save_video("A", "yes-1", rng, hands=("lh",))
+    return video_names
+
+
+def test_the_store_is_memory_mapped_float32(videos):
+    store = load_reference_store("A", videos)
+    sign_models = get_sign_models(store, "mp")
+
+    for hand in ("lh", "rh"):
+        assert isinstance(store[f"mp_{hand}_embeddings"], np.memmap)
+        assert store[f"mp_{hand}_embeddings"].dtype == EMBEDDING_DTYPE
+    for video_name, sign_model in zip(videos, sign_models):
+        for hand in ("lh", "rh"):
+            embedding = getattr(sign_model, f"{hand}_embedding")
+            assert len(embedding) == 0 or np.shares_memory(embedding, store[f"mp_{hand}_embeddings"])
+        expected = load_sign_model("A", video_name)
+        assert (sign_model.has_left_hand, sign_model.has_right_hand) == (expected.has_left_hand,
+                                                                          expected.has_right_hand)
+        np.testing.assert_allclose(sign_model.lh_embedding, expected.lh_embedding, atol=1e-6)
+        np.testing.assert_allclose(sign_model.rh_embedding, expected.rh_embedding, atol=1e-6)
+
+
+def test_the_dtw_reads_the_padded_store_without_copying(videos):
+    sign_models = np.array(get_sign_models(load_reference_store("A", videos), "mp"), dtype=object)
+
+    references, lengths = stack_hand(sign_models, "lh")
+    assert np.shares_memory(references, sign_models[0].lh_embedding)
+    assert references.dtype == EMBEDDING_DTYPE
+    np.testing.assert_array_equal(lengths, [len(model.lh_embedding) for model in sign_models])
+
+    # A subset is gathered from the stack, still padded & in float32
+    references, lengths = stack_hand(sign_models[[3, 0]], "lh")
+    assert references.dtype == EMBEDDING_DTYPE
+    np.testing.assert_array_equal(references[0, :lengths[0]], sign_models[3].lh_embedding)
+    np.testing.assert_array_equal(references[1, :lengths[1]], sign_models[0].lh_embedding)
+    assert not references[1, lengths[1]:].any()
+
+
+@pytest.mark.parametrize("k", [None, 1])
+def test_the_store_gives_the_distances_of_the_landmarks(videos, k):
+    sign_models = get_sign_models(load_reference_store("A", videos), "mp")
+    recorded_sign = load_sign_model("A", "hello-2")
+
+    distances = {}
+    for name, models in (("store", sign_models), ("landmarks", [load_sign_model("A", name) for name in videos])):
+        reference_signs = pd.DataFrame({"name": videos, "sign_model": models, "distance": 0.0})
+        distances[name] = dtw_distances(recorded_sign, reference_signs, k).sort_index()["distance"].values
+
+    np.testing.assert_allclose(distances["store"], distances["landmarks"], rtol=1e-5, atol=1e-4)
+    assert distances["store"][1] == pytest.approx(0, abs=1e-3)
+
+
+def test_the_store_is_only_rebuilt_when_the_landmarks_change(videos):
+    build = str(load_reference_store("A", videos)["build"])
+    assert str(load_reference_store("A", videos)["build"]) == build
+
+    # Rewritten with other landmarks
+    save_video("A", "thanks-1", np.random.default_rng(1))
+    store = load_reference_store("A", videos)
+    assert str(store["build"]) != build
+    sign_model = get_sign_models(store, "ul")[2]
+    expected = load_sign_model("A", "thanks-1", "ultraleapdataset")
+    assert sign_model.has_left_hand
+    np.testing.assert_allclose(sign_model.lh_embedding, expected.lh_embedding, atol=1e-6)
+
+    # The old embeddings are removed once the new ones are written
+    store_files = os.listdir(os.path.join("data", "reference_store", "A-full"))
+    assert len(store_files) == 5
+    assert all(file_name == "index.npz" or file_name.startswith(f"embeddings-{store['build']}-")
+               for file_name in store_files)
+
+
+def test_the_store_follows_the_videos(videos):
+    load_reference_store("A", videos)
+
+    store = load_reference_store("A", videos[1:])
+
+    assert store["videos"].tolist() == videos[1:]
+    assert store["names"].tolist() == ["hello", "thanks", "yes"]
+    assert len(get_sign_models(store, "mp")) == 3
+
+
+def test_an_unreadable_store_is_rebuilt(videos):
+    load_reference_store("A", videos)
+    with open(os.path.join("data", "reference_store", "A-full", "index.npz"), "wb") as file:
+        file.write(b"partial")
+
+    store = load_reference_store("A", videos)
+
+    assert store["videos"].tolist() == videos
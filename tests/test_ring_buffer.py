@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from utils.ring_buffer import RingBuffer
+
+
+@pytest.mark.parametrize("n_items", [0, 2, 3, 7])
+def test_the_last_items_are_kept_in_order(n_items):
+    ring_buffer = RingBuffer(3)
+
+    for item in range(n_items):
+        ring_buffer.append([item, -item])
+
+    expected = [[item, -item] for item in range(max(n_items - 3, 0), n_items)]
+    assert len(ring_buffer) == len(expected)
+    np.testing.assert_array_equal(ring_buffer.get().reshape((-1, 2)), np.reshape(expected, (-1, 2)))
+
+
+def test_the_items_are_copied():
+    ring_buffer = RingBuffer(2, dtype=np.float32)
+    item = np.ones(4)
+
+    ring_buffer.append(item)
+    item[:] = 2
+    items = ring_buffer.get()
+    items[:] = 3
+
+    assert items.dtype == np.float32
+    np.testing.assert_array_equal(ring_buffer.get(), [np.ones(4)])
+
+
+def test_a_cleared_buffer_is_empty():
+    ring_buffer = RingBuffer(2)
+    ring_buffer.append([1])
+
+    ring_buffer.clear()
+    assert len(ring_buffer) == 0 and len(ring_buffer.get()) == 0
+
+    ring_buffer.append([2])
+    np.testing.assert_array_equal(ring_buffer.get(), [[2]])
+
+
+def test_an_empty_buffer_keeps_nothing():
+    ring_buffer = RingBuffer(0)
+
+    ring_buffer.append([1])
+
+    assert len(ring_buffer) == 0 and len(ring_buffer.get()) == 0
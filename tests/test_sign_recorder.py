@@ -0,0 +1,191 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sign_recorder
+from models.sign_model import SignModel
+from sign_recorder import SignRecorder, calibrate_continuous_thresholds, load_continuous_thresholds
+from utils.dataset_utils import load_reference_signs
+from utils.dtw import StreamingDTW
+from utils.landmark_utils import save_array
+
+SIGNS = ("hello", "thanks", "yes")
+N_FRAMES = 12
+
+
+def sign_landmarks(sign, noise_seed=None, n_frames=N_FRAMES):
+    """
+    Right hand landmarks of a sign, (n_frames, 63): each sign is a different movement of a different hand pose,
+    its references are the same movement with a small noise
+    """
+    rng = np.random.default_rng(SIGNS.index(sign))
+    pose, movement = rng.normal(size=(21, 3)), rng.normal(size=(21, 3))
+    landmarks = pose + np.linspace(0, 1, n_frames)[:, None, None] * movement
+    if noise_seed is not None:
+        landmarks = landmarks + np.random.default_rng(noise_seed).normal(scale=0.01, size=landmarks.shape)
+    return landmarks.reshape((n_frames, 63))
+
+
+def reference_sign_models(n_references=2):
+    names = [sign for sign in SIGNS for _ in range(n_references)]
+    no_hand = np.zeros((N_FRAMES, 63)).tolist()
+    sign_models = [SignModel(no_hand, sign_landmarks(name, seed).tolist()) for seed, name in enumerate(names)]
+    return pd.DataFrame({"name": names, "sign_model": sign_models, "distance": 0.0})
+
+
+def stream_cost(sign_model, reference_signs):
+    """
+    Best cost of each reference while the sign is streamed
+    """
+    stream = StreamingDTW(reference_signs)
+    return np.min([stream.update(None, feature_vector) for feature_vector in sign_model.rh_embedding], axis=0)
+
+
+def mediapipe_results(right_hand):
+    landmarks = [SimpleNamespace(x=x, y=y, z=z) for x, y, z in np.reshape(right_hand, (21, 3))]
+    return SimpleNamespace(left_hand_landmarks=None, right_hand_landmarks=SimpleNamespace(landmark=landmarks))
+
+
+@pytest.fixture
+def videos(tmp_path, monkeypatch):
+    """
+    Landmarks of 2 videos of each sign, the same for both sensors
+    """
+    monkeypatch.chdir(tmp_path)
+    video_names = []
+    for name in SIGNS:
+        for idx in range(2):
+            video_name = f"{name}-{idx}"
+            for folder in ("dataset", "ultraleapdataset"):
+                path = os.path.join("data", folder, "A", name, video_name)
+                os.makedirs(path, exist_ok=True)
+                save_array(np.zeros((N_FRAMES, 63)).tolist(), os.path.join(path, f"lh_{video_name}.pickle"))
+                save_array(sign_landmarks(name, len(video_names)).tolist(),
+                           os.path.join(path, f"rh_{video_name}.pickle"))
+            video_names.append(video_name)
+    return video_names
+
+
+def test_the_thresholds_separate_the_true_matches_from_the_false_ones():
+    reference_signs = reference_sign_models()
+
+    thresholds = calibrate_continuous_thresholds(reference_signs, reference_signs)
+
+    costs = stream_cost(reference_signs["sign_model"][0], reference_signs.iloc[1:])
+    assert thresholds[0] == thresholds[1]
+    assert costs[0] < thresholds[0] < costs[1:].min()
+
+
+def test_the_calibration_needs_two_references_of_a_sign():
+    reference_signs = reference_sign_models(n_references=1)
+
+    with pytest.raises(ValueError):
+        calibrate_continuous_thresholds(reference_signs, reference_signs)
+
+
+def test_the_thresholds_are_only_calibrated_again_with_the_store(videos, monkeypatch):
+    calibrations = []
+    calibrate = sign_recorder.calibrate_continuous_thresholds
+    monkeypatch.setattr(sign_recorder, "calibrate_continuous_thresholds",
+                        lambda *args: calibrations.append(args) or calibrate(*args))
+
+    thresholds = load_continuous_thresholds("A", *load_reference_signs("A", videos))
+    assert load_continuous_thresholds("A", *load_reference_signs("A", videos)) == thresholds
+    assert len(calibrations) == 1
+
+    # Other parameters
+    load_continuous_thresholds("A", *load_reference_signs("A", videos), percentile=50)
+    assert len(calibrations) == 2
+
+    # The store is rebuilt once a video changes
+    path = os.path.join("data", "ultraleapdataset", "A", "yes", "yes-1", "rh_yes-1.pickle")
+    save_array(sign_landmarks("yes", 10).tolist(), path)
+    assert load_continuous_thresholds("A", *load_reference_signs("A", videos)) != thresholds
+    assert len(calibrations) == 3
+
+
+def test_the_continuous_mode_emits_the_streamed_sign():
+    reference_signs = reference_sign_models()
+    ul_reference_signs = reference_sign_models()
+    thresholds = calibrate_continuous_thresholds(reference_signs, ul_reference_signs)
+    recorder = SignRecorder(reference_signs, ul_reference_signs, continuous=True, continuous_thresholds=thresholds)
+
+    # Some other movement, then the sign
+    rng = np.random.default_rng(10)
+    frames = [*rng.normal(size=(N_FRAMES, 63)), *sign_landmarks("thanks", 20)]
+    predicted_signs = []
+    for right_hand in frames:
+        predicted_sign, is_recording = recorder.process_mp_results(mediapipe_results(right_hand),
+                                                                   np.zeros(63).tolist(), right_hand.tolist())
+        predicted_signs.append(predicted_sign)
+        assert not is_recording
+
+    assert set(predicted_signs[:N_FRAMES]) == {""}
+    assert predicted_signs[-1] == "thanks"
+
+
+def record(recorder, frames):
+    """
+    Records the frames on both sensors
+    :return: the (predicted sign, recording state) of each frame
+    """
+    recorder.record()
+    outputs = []
+    for right_hand in frames:
+        outputs.append(recorder.process_mp_results(mediapipe_results(right_hand), np.zeros(63).tolist(),
+                                                   right_hand.tolist()))
+    return outputs
+
+
+def test_the_early_decision_stops_on_a_clear_sign():
+    recorder = SignRecorder(reference_sign_models(), reference_sign_models(), seq_len=40, early_decision=True,
+                            early_min_frames=4)
+
+    outputs = record(recorder, sign_landmarks("thanks", 20))
+
+    assert outputs[2] == ("", True)
+    assert ("thanks", False) in outputs
+    assert outputs[-1] == ("thanks", False)
+    # The partial costs don't end up in the distances of the recordings
+    assert not recorder.reference_signs["distance"].any()
+    assert not recorder.ul_reference_signs["distance"].any()
+
+
+def test_the_early_decision_waits_for_early_min_frames():
+    recorder = SignRecorder(reference_sign_models(), reference_sign_models(), seq_len=40, early_decision=True,
+                            early_min_frames=N_FRAMES + 1)
+
+    outputs = record(recorder, sign_landmarks("thanks", 20))
+
+    assert set(outputs) == {("", True)}
+
+
+@pytest.mark.parametrize("sign", SIGNS)
+def test_the_pruning_keeps_the_references_of_the_sign(sign):
+    reference_signs = reference_sign_models(n_references=3)
+    recorder = SignRecorder(reference_signs, reference_sign_models(n_references=3), seq_len=40,
+                            early_decision=True, early_margin=np.inf, early_min_frames=1)
+
+    outputs = record(recorder, sign_landmarks(sign, 20))
+
+    assert set(outputs) == {("", True)}
+    for progress in (recorder.mp_progress, recorder.ul_progress):
+        assert progress.is_active[progress.names == sign].all()
+        assert not progress.is_active[progress.names != sign].any()
+
+
+def test_the_pre_roll_starts_the_recording():
+    recorder = SignRecorder(reference_sign_models(), reference_sign_models(), seq_len=N_FRAMES, pre_roll=3)
+    frames = sign_landmarks("yes", 30, n_frames=N_FRAMES + 5)
+
+    # Before the click
+    for right_hand in frames[:5]:
+        assert recorder.process_mp_results(mediapipe_results(right_hand), np.zeros(63).tolist(),
+                                           right_hand.tolist()) == ("", False)
+    outputs = record(recorder, frames[5:])
+
+    assert outputs[N_FRAMES - 3 - 1] == ("", True)
+    assert outputs[N_FRAMES - 3] == ("yes", False)
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from utils.sync_utils import ClockSync, resample_hands
+
+
+def hand_samples(values):
+    """
+    Samples of both hands, each hand filled with its value
+    """
+    return np.repeat(np.asarray(values, dtype=float), 63, axis=1)
+
+
+def test_the_offset_is_the_least_delayed_sample():
+    clock_sync = ClockSync()
+    rng = np.random.default_rng(0)
+    device_times = np.arange(100) / 30
+    # The host clock is 5 s ahead, the captures arrive with a latency of at least 2 ms
+    latencies = 0.002 + rng.exponential(0.01, size=100)
+    latencies[[10, 50]] = 0.002
+
+    for device_time, latency in zip(device_times, latencies):
+        host_time = clock_sync.update(device_time * 1e6, 5 + device_time + latency)
+
+    assert host_time == pytest.approx(5.002 + device_times[-1])
+    assert clock_sync.to_host(0) == pytest.approx(5.002)
+
+
+def test_the_offset_follows_the_drift():
+    clock_sync = ClockSync(window=10)
+
+    # The device clock gets 1 ms slower per sample
+    for idx in range(50):
+        clock_sync.update(idx * 1e6, idx * 1.001)
+
+    assert clock_sync.to_host(49e6) == pytest.approx(49 * 1.001, abs=0.01)
+
+
+def test_there_is_no_host_time_before_the_first_sample():
+    assert ClockSync().to_host(10) is None
+
+
+def test_the_hands_are_interpolated_between_the_samples():
+    samples = hand_samples([[1, 10], [2, 20], [4, 40]])
+
+    resampled = resample_hands(np.array([0.0, 1.0, 2.0]), samples, [0.25, 1.5, 2.0])
+
+    np.testing.assert_allclose(resampled[:, 0], [1.25, 3, 4])
+    np.testing.assert_allclose(resampled[:, 63], [12.5, 30, 40])
+    np.testing.assert_allclose(resample_hands(np.array([0.0, 1.0, 2.0]), samples, [0.25, 1.5], False)[:, 0], [1, 4])
+
+
+def test_a_missing_hand_is_taken_from_the_nearest_sample():
+    # The left hand is lost at the second sample
+    samples = hand_samples([[1, 10], [0, 20]])
+
+    resampled = resample_hands(np.array([0.0, 1.0]), samples, [0.25, 0.75])
+
+    np.testing.assert_allclose(resampled[:, 0], [1, 0])
+    np.testing.assert_allclose(resampled[:, 63], [12.5, 17.5])
+
+
+def test_the_nearest_sample_is_used_outside_of_the_samples():
+    samples = hand_samples([[1, 10], [2, 20]])
+
+    resampled = resample_hands(np.array([1.0, 2.0]), samples, [0, 5])
+
+    np.testing.assert_allclose(resampled[:, [0, 63]], [[1, 10], [2, 20]])
+
+
+@pytest.mark.parametrize("n_samples", [0, 1])
+def test_few_samples(n_samples):
+    samples = hand_samples([[1, 10]])[:n_samples]
+
+    resampled = resample_hands(np.arange(n_samples, dtype=float), samples, [0.5, 3])
+
+    assert resampled.shape == (2, 126)
+    np.testing.assert_allclose(resampled[:, 0], [n_samples] * 2)
@@ -0,0 +1,125 @@
+import os
+import queue
+import re
+import threading
+
+import cv2
+
+# Suffix of the videos being written, renamed to .mp4 once complete
+TMP_VIDEO_SUFFIX = ".tmp.mp4"
+
+
+def get_last_video_index(video_folder_path, sign_type):
+    """
+    Index of the last finished video of a sign, the videos are named {sign_type}-{index}.mp4.
+    The videos left unfinished by an interrupted recording are removed.
+
+    :return: the highest index, 0 if there's no video yet
+    """
+    last_index = 0
+    for file_name in os.listdir(video_folder_path):
+        if file_name.endswith(TMP_VIDEO_SUFFIX):
+            os.remove(os.path.join(video_folder_path, file_name))
+            continue
+        match = re.fullmatch(re.escape(sign_type) + r"-(\d+)\.mp4", file_name)
+        if match:
+            last_index = max(last_index, int(match.group(1)))
+    return last_index
+
+
+class AsyncWriter(object):
+    """
+    Writes the recordings on a dedicated thread, so the encoding & the disk never stall the capture loop.
+    The tasks run one after the other in the order they were submitted: the frames of a video, then its
+    landmarks, etc. cv2.VideoWriter.write releases the GIL, the encoding runs in parallel with the capture.
+
+    A video is written to a .tmp.mp4 file & renamed when it's closed, the landmarks are saved with
+    utils.landmark_utils.save_array which also renames them once written: an interrupted recording never
+    leaves a partial file in the dataset.
+
+    Params
+        max_pending: maximum number of tasks waiting to be written (a 720p frame is 2.7 MB), when the queue
+                     is full the capture loop waits instead of dropping frames
+    Args
+        n_stalls: number of times the capture loop had to wait for the writer
+    """
+
+    def __init__(self, max_pending=90):
+        self.tasks = queue.Queue(max_pending)
+        self.n_stalls = 0
+        self.error = None
+        self.video = None
+        self.video_path = None
+        self.thread = threading.Thread(target=self._run, name="writer", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, function, *args):
+        """
+        Runs function(*args) on the writer thread, the arguments mustn't be modified afterwards
+        """
+        if self.error is not None:
+            raise RuntimeError("The writer failed") from self.error
+        try:
+            self.tasks.put_nowait((function, args))
+        except queue.Full:
+            self.n_stalls += 1
+            self.tasks.put((function, args))
+
+    def open_video(self, video_path, fps=30, size=(1280, 720), fourcc="mp4v"):
+        self.submit(self._open_video, video_path, fps, size, fourcc)
+
+    def write_frame(self, frame):
+        """
+        :param frame: BGR image, it mustn't be drawn on afterwards
+        """
+        self.submit(self._write_frame, frame)
+
+    def close_video(self):
+        self.submit(self._close_video)
+
+    def pending(self):
+        return self.tasks.qsize()
+
+    def close(self):
+        """
+        Writes the pending tasks, closes the current video & stops the thread
+        """
+        if self.thread.is_alive():
+            self.tasks.put(None)
+            self.thread.join()
+        self._close_video()
+
+    def _run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            function, args = task
+            try:
+                function(*args)
+            except Exception as e:
+                # Reported to the capture loop on its next submit
+                self.error = e
+
+    def _open_video(self, video_path, fps, size, fourcc):
+        self._close_video()
+        self.video_path = video_path
+        self.video = cv2.VideoWriter(video_path.replace(".mp4", TMP_VIDEO_SUFFIX),
+                                     cv2.VideoWriter_fourcc(*fourcc), fps, size)
+
+    def _write_frame(self, frame):
+        self.video.write(frame)
+
+    def _close_video(self):
+        if self.video is None:
+            return
+        self.video.release()
+        os.replace(self.video_path.replace(".mp4", TMP_VIDEO_SUFFIX), self.video_path)
+        self.video = None
+        self.video_path = None
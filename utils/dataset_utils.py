@@ -1,21 +1,32 @@
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
 import pandas as pd
 from tqdm import tqdm
 
 from models.sign_model import SignModel
-from utils.landmark_utils import save_landmarks_from_video, load_array
+from utils.landmark_utils import save_landmarks_from_video
+from utils.reference_store import load_reference_store, get_sign_models
+from utils.async_writer import TMP_VIDEO_SUFFIX
 
+# MediaPipe backend of an extraction worker process, see _init_extraction_worker
+worker_detector_backend = None
 
-def load_dataset(category):
+
+def load_dataset(category, n_workers=1, detector_backend="holistic"):
     """
     Loads and then makes a dataset from the non-present videos.
+
+    :param n_workers: number of processes extracting the landmarks of the new videos
+    :param detector_backend: MediaPipe backend extracting the landmarks, see utils.mediapipe_utils.create_detector
+    :return: the names of the videos which have their landmarks extracted
     """
     videos = [
         file_name.replace(".mp4", "")
         for _, _, files in os.walk(os.path.join("data", "videos", category))
         for file_name in files
-        if file_name.endswith(".mp4")
+        if file_name.endswith(".mp4") and not file_name.endswith(TMP_VIDEO_SUFFIX)
     ]
 
     dataset = [
@@ -31,34 +42,113 @@ def load_dataset(category):
     if n > 0:
         print(f"\nExtracting landmarks from new videos: {n} videos detected\n")
 
-        for idx in tqdm(range(n)):
-            save_landmarks_from_video(videos_not_in_dataset[idx], category)
+        if n_workers > 1:
+            failed_videos = _extract_videos_in_parallel(videos_not_in_dataset, category, n_workers,
+                                                        detector_backend)
+        else:
+            failed_videos = _extract_videos(videos_not_in_dataset, category, detector_backend)
+
+        if failed_videos:
+            print(f"\nSkipping {len(failed_videos)} videos that failed: {failed_videos}\n")
+            videos = [video for video in videos if video not in failed_videos]
 
     return videos
 
 
-def load_reference_signs(category, videos):
-    video_reference_signs = {"name": [], "sign_model": [], "distance": []}
-    ul_reference_signs = {"name": [], "sign_model": [], "distance": []}
+def _extract_videos(videos, category, detector_backend):
+    """
+    Extracts the landmarks of the videos one after the other.
+
+    :return: the videos which failed
+    """
+    failed_videos = []
+    for video_name in tqdm(videos):
+        try:
+            save_landmarks_from_video(video_name, category, detector_backend=detector_backend)
+        except Exception as e:
+            print(f"Failed to extract {video_name}: {e}")
+            failed_videos.append(video_name)
+    return failed_videos
+
+
+def _extract_videos_in_parallel(videos, category, n_workers, detector_backend):
+    """
+    Extracts the landmarks of the videos in a pool of processes, each one with its own MediaPipe model.
+
+    :return: the videos which failed
+    """
+    failed_videos = []
+    with tqdm(total=len(videos)) as progress_bar:
+        interrupted_videos = _run_extraction_pool(videos, category, n_workers, detector_backend, progress_bar,
+                                                  failed_videos)
+
+        # A dying worker breaks the whole pool, retry each interrupted video in its own process
+        for video_name in interrupted_videos:
+            if _run_extraction_pool([video_name], category, 1, detector_backend, progress_bar, failed_videos):
+                print(f"Failed to extract {video_name}: the worker process died")
+                failed_videos.append(video_name)
+                progress_bar.update()
+    return failed_videos
 
-    for i, video_name in enumerate(videos):
-        sign_name = video_name.split("-")[0]
-        path_ds_videos = os.path.join("data", "dataset", category, sign_name, video_name)
-        path_ds_ul = os.path.join("data", "ultraleapdataset", category, sign_name, video_name)
 
-        left_hand_list = load_array(os.path.join(path_ds_videos, f"lh_{video_name}.pickle"))
-        right_hand_list = load_array(os.path.join(path_ds_videos, f"rh_{video_name}.pickle"))
-        left_hand_list_ul = load_array(os.path.join(path_ds_ul, f"lh_{video_name}.pickle"))
-        right_hand_list_ul = load_array(os.path.join(path_ds_ul, f"rh_{video_name}.pickle"))
+def _run_extraction_pool(videos, category, n_workers, detector_backend, progress_bar, failed_videos):
+    """
+    :return: the videos which were interrupted because a worker process died
+    """
+    interrupted_videos = []
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_extraction_worker,
+                             initargs=(detector_backend,)) as executor:
+        futures = {
+            executor.submit(_extract_video_in_worker, video_name, category): video_name
+            for video_name in videos
+        }
+        for future in as_completed(futures):
+            video_name = futures[future]
+            try:
+                future.result()
+            except BrokenProcessPool:
+                interrupted_videos.append(video_name)
+                continue
+            except Exception as e:
+                print(f"Failed to extract {video_name}: {e}")
+                failed_videos.append(video_name)
+            progress_bar.update()
+    return interrupted_videos
+
+
+def _init_extraction_worker(detector_backend):
+    global worker_detector_backend
+    worker_detector_backend = detector_backend
+
+
+def _extract_video_in_worker(video_name, category):
+    # A new model for each video: the tracking state of a video mustn't leak into the first frames of the next,
+    # the landmarks don't depend on which worker extracts which videos
+    save_landmarks_from_video(video_name, category, detector_backend=worker_detector_backend)
+    return video_name
+
+
+def load_reference_signs(category, videos, embedding_mode="full"):
+    """
+    Loads the embeddings of the videos of a category from the reference store (see utils/reference_store.py)
+    and builds their SignModel for both cameras.
+
+    :param embedding_mode: "full" or "triu", see HandModel.EMBEDDING_WEIGHTS
+    """
+    store = load_reference_store(category, videos, embedding_mode)
+    names = store["names"].tolist()
 
-        video_reference_signs["name"].append(sign_name)
-        video_reference_signs["sign_model"].append(SignModel(left_hand_list, right_hand_list))
-        video_reference_signs["distance"].append(0)
+    video_reference_signs = {
+        "name": names,
+        "sign_model": get_sign_models(store, "mp", embedding_mode),
+        "distance": [0] * len(names),
+    }
+    ul_reference_signs = {
+        "name": names,
+        "sign_model": get_sign_models(store, "ul", embedding_mode),
+        "distance": [0] * len(names),
+    }
 
-        ul_reference_signs["name"].append(sign_name)
-        ul_reference_signs["sign_model"].append(SignModel(left_hand_list_ul, right_hand_list_ul))
-        ul_reference_signs["distance"].append(0)
-    
     video_reference_signs = pd.DataFrame(video_reference_signs, dtype=object)
     ul_reference_signs = pd.DataFrame(ul_reference_signs, dtype=object)
     print(f'Dictionary count: {video_reference_signs[["name", "sign_model"]].groupby(["name"]).count()}')
@@ -1,43 +1,414 @@
-import sys
 import pandas as pd
-from fastdtw import fastdtw
 import numpy as np
+from typing import List, Tuple
 from models.sign_model import SignModel
 
+# Number of values in the work buffer used to compute the frame-to-frame costs
+COST_BUFFER_SIZE = 2 ** 18
 
-def dtw_distances(recorded_sign: SignModel, reference_signs: pd.DataFrame):
+
+def dtw_distances(recorded_sign: SignModel, reference_signs: pd.DataFrame, k: int = None):
     """
     Use DTW to compute similarity between the recorded sign & the reference signs
 
-    :param recorded_sign: a SignModel object containing the data gathered during record
+    :param recorded_sign: a SignModel object containing the data gathered during record,
+                          with the same embedding_mode as the reference signs
     :param reference_signs: pd.DataFrame
                             columns : name, dtype: str
                                       sign_model, dtype: SignModel
                                       distance, dtype: float64
+    :param k: if given, only the k closest reference signs get their exact distance,
+              the others are pruned with lower bounds and get a distance of infinity
     :return: Return a sign dictionary sorted by the distances from the recorded sign
     """
-    # Embeddings of the recorded sign
-    rec_left_hand = recorded_sign.lh_embedding
-    rec_right_hand = recorded_sign.rh_embedding
-
-    for idx, row in reference_signs.iterrows():
-        # Initialize the row variables
-        ref_sign_name, ref_sign_model, _ = row
-
-        # If the reference sign has the same number of hands compute fastdtw
-        if (recorded_sign.has_left_hand == ref_sign_model.has_left_hand) and (
-            recorded_sign.has_right_hand == ref_sign_model.has_right_hand
-        ):
-            # Maybe important: the reference data-set is longer than the recorded one.
-            ref_left_hand = ref_sign_model.lh_embedding
-            ref_right_hand = ref_sign_model.rh_embedding
+    distances = np.full(len(reference_signs), np.inf)
 
-            if recorded_sign.has_left_hand:
-                row["distance"] += list(fastdtw(rec_left_hand, ref_left_hand))[0]
-            if recorded_sign.has_right_hand:
-                row["distance"] += list(fastdtw(rec_right_hand, ref_right_hand))[0]
+    # Only the reference signs with the same number of hands get a distance, the others stay at infinity
+    matching = np.array([
+        (recorded_sign.has_left_hand == ref_sign_model.has_left_hand)
+        and (recorded_sign.has_right_hand == ref_sign_model.has_right_hand)
+        for ref_sign_model in reference_signs["sign_model"]
+    ], dtype=bool)
+    matching_models = reference_signs["sign_model"].values[matching]
 
-        # If not, distance equals infinity
+    if len(matching_models) > 0:
+        if k is None:
+            distances[matching] = _hands_dtw(recorded_sign, matching_models)
         else:
-            row["distance"] = np.inf
+            distances[matching] = _cascading_dtw(recorded_sign, matching_models, k)
+
+    # Scale the distances back to the full angle matrix when only its upper triangle is stored
+    reference_signs["distance"] = distances * recorded_sign.embedding_weight
     return reference_signs.sort_values(by=["distance"])
+
+
+def _hands_dtw(recorded_sign: SignModel, ref_sign_models, max_distances=np.inf) -> np.ndarray:
+    """
+    Sums the DTW distances of both hands between the recorded sign & the reference signs.
+    A reference sign is abandoned (infinite distance) as soon as it exceeds its max_distance.
+    """
+    distances = np.zeros(len(ref_sign_models))
+    max_distances = np.broadcast_to(max_distances, distances.shape)
+
+    # Maybe important: the reference data-set is longer than the recorded one.
+    if recorded_sign.has_left_hand:
+        # The right hand distance is at least its lower bound, which leaves less room for the left hand
+        rh_bounds = np.zeros(len(ref_sign_models))
+        if recorded_sign.has_right_hand and np.isfinite(max_distances).any():
+            rh_bounds = _hand_lower_bounds(recorded_sign.rh_embedding, recorded_sign.rh_envelope,
+                                           [(model.rh_embedding, model.rh_envelope) for model in ref_sign_models])
+        ref_left_hands, ref_lengths = stack_hand(ref_sign_models, "lh")
+        distances += batch_dtw(recorded_sign.lh_embedding, ref_left_hands, ref_lengths, max_distances - rh_bounds)
+    if recorded_sign.has_right_hand:
+        remaining = np.isfinite(distances)
+        right_hand_distances = np.full(len(ref_sign_models), np.inf)
+        ref_right_hands, ref_lengths = stack_hand(ref_sign_models[remaining], "rh")
+        right_hand_distances[remaining] = batch_dtw(recorded_sign.rh_embedding, ref_right_hands, ref_lengths,
+                                                    max_distances[remaining] - distances[remaining])
+        distances += right_hand_distances
+    return distances
+
+
+def _cascading_dtw(recorded_sign: SignModel, ref_sign_models, k: int) -> np.ndarray:
+    """
+    Computes the exact distances of the k reference signs closest to the recorded sign.
+    The reference signs are visited by increasing lower bound, the search stops as soon as
+    the next lower bound can't beat the current k-th best distance.
+    """
+    lower_bounds = np.zeros(len(ref_sign_models))
+    if recorded_sign.has_left_hand:
+        lower_bounds += _hand_lower_bounds(recorded_sign.lh_embedding, recorded_sign.lh_envelope,
+                                           [(model.lh_embedding, model.lh_envelope) for model in ref_sign_models])
+    if recorded_sign.has_right_hand:
+        lower_bounds += _hand_lower_bounds(recorded_sign.rh_embedding, recorded_sign.rh_envelope,
+                                           [(model.rh_embedding, model.rh_envelope) for model in ref_sign_models])
+
+    distances = np.full(len(ref_sign_models), np.inf)
+    order = np.argsort(lower_bounds, kind="stable")
+    batch_size = max(k, 1)
+    k_best = np.inf
+    for start in range(0, len(order), batch_size):
+        candidates = order[start:start + batch_size]
+        candidates = candidates[lower_bounds[candidates] <= k_best]
+        if len(candidates) == 0:
+            break
+        distances[candidates] = _hands_dtw(recorded_sign, ref_sign_models[candidates], k_best)
+        if np.isfinite(distances).sum() >= batch_size:
+            k_best = np.partition(distances, batch_size - 1)[batch_size - 1]
+    return distances
+
+
+def _hand_lower_bounds(rec_embedding, rec_envelope, references) -> np.ndarray:
+    """
+    :param references: list of (embedding, envelope) tuples of the reference hands
+    :return: Array containing the lower bound of the DTW distance to each reference hand
+    """
+    return np.array([
+        dtw_lower_bound(rec_embedding, rec_envelope, ref_embedding, ref_envelope)
+        for ref_embedding, ref_envelope in references
+    ], dtype=float)
+
+
+def dtw_lower_bound(query, query_envelope, reference, reference_envelope) -> float:
+    """
+    Cheap lower bound of the DTW distance between two embeddings,
+    the maximum of LB_Kim and of LB_Keogh computed in both directions.
+
+    :param query, reference: arrays of shape (n_frames, n_features)
+    :param query_envelope, reference_envelope: arrays of shape (2, n_features), see SignModel
+    :return: a value lower or equal to the DTW distance
+    """
+    if len(query) == 0 or len(reference) == 0:
+        return np.inf
+    return max(lb_kim(query, reference),
+               lb_keogh(query, reference_envelope),
+               lb_keogh(reference, query_envelope))
+
+
+def lb_kim(query, reference) -> float:
+    """
+    The first and the last frames of both sequences are always matched together by DTW.
+    """
+    query = np.asarray(query)
+    reference = np.asarray(reference)
+    bound = np.abs(query[0] - reference[0]).sum()
+    if len(query) > 1 and len(reference) > 1:
+        bound += np.abs(query[-1] - reference[-1]).sum()
+    return bound
+
+
+def lb_keogh(query, envelope) -> float:
+    """
+    Every frame of the query is matched to at least one frame of the reference, which can't be
+    closer than the envelope (minimum & maximum over all frames) of the reference.
+    As the DTW isn't constrained to a window, the envelope spans the whole reference.
+    """
+    query = np.asarray(query)
+    lower, upper = envelope
+    return (np.maximum(query - upper, 0) + np.maximum(lower - query, 0)).sum()
+
+
+def stack_hand(ref_sign_models, hand: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Padded embeddings of one hand of the reference signs, see stack_embeddings.
+    The embeddings of the reference store are already padded in a memory-mapped stack (see
+    SignModel.from_embeddings), they're read from it in their float32 dtype: without any copy if the reference
+    signs are the whole stack in order, else only their rows are gathered.
+
+    :param hand: "lh" or "rh"
+    """
+    stacks = [getattr(model, f"{hand}_stack") for model in ref_sign_models]
+    if len(stacks) == 0 or any(stack is None or stack[0] is not stacks[0][0] for stack in stacks):
+        return stack_embeddings([getattr(model, f"{hand}_embedding") for model in ref_sign_models])
+
+    padded = stacks[0][0]
+    rows = np.array([row for _, row in stacks], dtype=int)
+    lengths = np.array([len(getattr(model, f"{hand}_embedding")) for model in ref_sign_models], dtype=int)
+    if np.array_equal(rows, np.arange(len(padded))):
+        return padded, lengths
+    return padded[rows, :lengths.max()], lengths
+
+
+def stack_embeddings(embeddings: List, dtype=None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pads a list of embeddings of different lengths into a single array
+
+    :param embeddings: list of arrays of shape (n_frames, n_features)
+    :param dtype: dtype of the stacked array, the common dtype of the embeddings by default
+    :return: Array of shape (n_embeddings, max_n_frames, n_features) padded with zeros
+             & array of shape (n_embeddings,) containing the number of frames of each embedding
+    """
+    embeddings = [np.asarray(embedding, dtype=dtype) for embedding in embeddings]
+    if dtype is None:
+        dtype = np.result_type(*embeddings) if embeddings else float
+    lengths = np.array([len(embedding) for embedding in embeddings], dtype=int)
+    n_features = max((embedding.shape[1] for embedding in embeddings if embedding.ndim == 2), default=0)
+
+    stack = np.zeros((len(embeddings), lengths.max(initial=0), n_features), dtype=dtype)
+    for idx, embedding in enumerate(embeddings):
+        stack[idx, :lengths[idx]] = embedding
+    return stack, lengths
+
+
+def batch_dtw(query, references: np.ndarray, lengths: np.ndarray, max_distances=np.inf) -> np.ndarray:
+    """
+    Computes the DTW distance between one sequence and a padded stack of sequences.
+    The frames are compared with the L1 distance (same cost as fastdtw's default) and the
+    cumulative-cost matrices of a few references are filled together, one query frame at a time.
+    The frame costs are computed in the dtype of the references (float32 for the reference store),
+    the cumulative costs in float64.
+
+    :param query: array of shape (n_frames, n_features)
+    :param references: array of shape (n_references, max_n_frames, n_features), see stack_embeddings
+    :param lengths: array of shape (n_references,) containing the true number of frames of each reference
+    :param max_distances: scalar or array of shape (n_references,), a reference is abandoned as soon as
+                          its partial cost is higher than its max_distance
+    :return: Array of shape (n_references,) containing the DTW distances
+             (infinity for empty or abandoned sequences)
+    """
+    query = np.asarray(query, dtype=references.dtype)
+    n_references, max_len = references.shape[:2]
+    n_frames = len(query)
+    distances = np.full(n_references, np.inf)
+    max_distances = np.broadcast_to(max_distances, distances.shape)
+    if n_references == 0 or n_frames == 0 or max_len == 0:
+        return distances
+
+    # A few references at a time so the work buffer stays in cache
+    chunk_size = max(1, COST_BUFFER_SIZE // (max_len * references.shape[2] or 1))
+    buffer = np.empty((chunk_size,) + references.shape[1:], dtype=references.dtype)
+    for start in range(0, n_references, chunk_size):
+        chunk = references[start:start + chunk_size]
+        chunk_lengths = lengths[start:start + chunk_size]
+        chunk_max_distances = max_distances[start:start + chunk_size]
+        chunk_buffer = buffer[:len(chunk)]
+        is_padding = np.arange(max_len) >= chunk_lengths[:, None]
+        alive = (chunk_lengths > 0) & (chunk_max_distances >= 0)
+        if not alive.any():
+            continue
+
+        # Previous row of the cumulative-cost matrices, with a column of infinity in front
+        previous = np.full((len(chunk), max_len + 1), np.inf)
+        previous[:, 0] = 0
+        for i in range(n_frames):
+            np.subtract(chunk, query[i], out=chunk_buffer)
+            np.abs(chunk_buffer, out=chunk_buffer)
+            cost = chunk_buffer.sum(axis=2, dtype=float)
+
+            # D[i, j] = cost[j] + min(D[i-1, j-1], D[i-1, j], D[i, j-1]) is a running minimum once unrolled:
+            # D[i, j] = S[j] + min_{l <= j}(cost[l] + min(D[i-1, l-1], D[i-1, l]) - S[l]) with S the cumsum of cost
+            from_previous = cost + np.minimum(previous[:, :-1], previous[:, 1:])
+            cumulative_cost = np.cumsum(cost, axis=1)
+            previous[:, 1:] = cumulative_cost + np.minimum.accumulate(from_previous - cumulative_cost, axis=1)
+            previous[:, 0] = np.inf
+
+            # Every warping path goes through every row, abandon the references that already cost too much
+            row_minimum = np.where(is_padding, np.inf, previous[:, 1:]).min(axis=1)
+            alive &= row_minimum <= chunk_max_distances
+            if not alive.any():
+                break
+
+        chunk_distances = previous[np.arange(len(chunk)), chunk_lengths]
+        distances[start:start + chunk_size] = np.where(alive, chunk_distances, np.inf)
+    return distances
+
+
+class StreamingDTW(object):
+    """
+    Incremental DTW of the reference signs against a stream of frames: the last column of the cumulative-cost
+    matrix of each reference is updated with each new frame, which costs O(reference length) per frame instead
+    of a full DTW.
+
+    With subsequence, a reference can start at any frame of an endless stream (continuous recognition).
+    Without, the stream is a recording that starts at the first frame and the costs are the partial DTW
+    distances of the recording so far (early decision).
+
+    Params
+        reference_signs: pd.DataFrame with the columns name & sign_model
+        window: maximum number of stream frames a match can span, None for no limit
+        subsequence: bool; True if a match can start at any frame
+    """
+
+    def __init__(self, reference_signs: pd.DataFrame, window: int = 90, subsequence: bool = True):
+        ref_sign_models = reference_signs["sign_model"].values
+        self.index = reference_signs.index
+        self.names = reference_signs["name"].values
+        self.window = window
+        self.subsequence = subsequence
+        self.embedding_weight = ref_sign_models[0].embedding_weight if len(ref_sign_models) > 0 else 1
+        self.n_frames = 0
+
+        # For each hand: the references that use it & their stacked embeddings (kept in the store's dtype)
+        self.hands = {}
+        for hand, has_hand in (("lh", "has_left_hand"), ("rh", "has_right_hand")):
+            references, lengths = stack_hand(ref_sign_models, hand)
+            self.hands[hand] = {
+                "needed": np.array([bool(getattr(model, has_hand)) for model in ref_sign_models], dtype=bool),
+                "references": references,
+                "lengths": lengths,
+                "is_padding": np.arange(references.shape[1]) >= lengths[:, None],
+                # Work buffer of the frame costs, see batch_dtw
+                "buffer": np.empty(references.shape, dtype=references.dtype),
+            }
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the stream, the next matches can only start from the next frame
+        """
+        # References which are still updated, see prune
+        self.is_active = np.ones(len(self.names), dtype=bool)
+        for state in self.hands.values():
+            n_references, max_len = state["references"].shape[:2]
+            # Last column of the cumulative-cost matrices & first stream frame of the best path to each cell.
+            # The cell 0 is where the matches start.
+            state["column"] = np.full((n_references, max_len + 1), np.inf)
+            state["column"][:, 0] = 0
+            state["starts"] = np.zeros((n_references, max_len + 1), dtype=int)
+            state["is_seen"] = False
+
+    def update(self, lh_feature_vector, rh_feature_vector) -> np.ndarray:
+        """
+        Params
+            xh_feature_vector: feature vector of the new frame, None if the hand isn't detected
+        Return
+            Array of shape (n_references,) containing the cost of the best match of each reference ending
+            at this frame, averaged over the frames & hands of the reference (infinity if there's no match)
+        """
+        self.n_frames += 1
+        for hand, feature_vector in (("lh", lh_feature_vector), ("rh", rh_feature_vector)):
+            # Frames without the hand are skipped, the same way SignModel skips them
+            if feature_vector is not None and self.hands[hand]["references"].size > 0:
+                self._update_hand(self.hands[hand], np.asarray(feature_vector))
+        return self.get_costs()
+
+    def prune(self, is_pruned: np.ndarray):
+        """
+        Stops updating the references that can't be matched anymore, their cost becomes infinity
+        """
+        self.is_active &= ~is_pruned
+        for state in self.hands.values():
+            state["column"][~self.is_active] = np.inf
+
+    def get_costs(self, average: bool = True) -> np.ndarray:
+        """
+        Params
+            average: True to average the costs over the frames & hands of the references,
+                     False to sum the hands like dtw_distances does
+        Return
+            Array of shape (n_references,) containing the cost of the best match of each reference ending
+            at the last frame
+        """
+        rows = np.arange(len(self.names))
+        return self._sum_hands(lambda state: state["column"][rows, state["lengths"]], average)
+
+    def get_lower_bounds(self) -> np.ndarray:
+        """
+        Without subsequence, every warping path goes through the last row: whatever the next frames are,
+        the final distance of a reference can't be lower than the minimum of its last column
+        :return: Array of shape (n_references,) containing the lower bound of the final distance of each reference
+        """
+        return self._sum_hands(lambda state: np.where(state["is_padding"], np.inf, state["column"][:, 1:]).min(axis=1),
+                               average=False)
+
+    def _sum_hands(self, get_hand_costs, average) -> np.ndarray:
+        total_costs = np.zeros(len(self.names))
+        n_hands = np.zeros(len(self.names))
+        for state in self.hands.values():
+            if state["references"].size == 0:
+                continue
+            hand_costs = get_hand_costs(state)
+            if average:
+                hand_costs = hand_costs / np.maximum(state["lengths"], 1)
+            total_costs += np.where(state["needed"], hand_costs, 0)
+            n_hands += state["needed"]
+
+            # A recording which shows a hand doesn't match the references without it, as in dtw_distances
+            if not self.subsequence and state["is_seen"]:
+                total_costs[~state["needed"]] = np.inf
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            costs = (total_costs / n_hands if average else total_costs) * self.embedding_weight
+        return np.where((n_hands > 0) & self.is_active, costs, np.inf)
+
+    def _update_hand(self, state, feature_vector):
+        state["is_seen"] = True
+        active = np.flatnonzero(self.is_active)
+        # The references are only gathered once some are pruned
+        references = state["references"] if len(active) == len(self.is_active) else state["references"][active]
+        buffer = np.subtract(references, feature_vector.astype(references.dtype), out=state["buffer"][:len(active)])
+        cost = np.abs(buffer, out=buffer).sum(axis=2, dtype=float)
+        previous = state["column"][active]
+        previous_starts = state["starts"][active]
+
+        # Going diagonally from the cell 0 starts a match at this frame
+        previous_starts[:, 0] = self.n_frames
+
+        # Matches can't span more than the window: the paths starting too early are removed before choosing
+        # the predecessor of each cell, so a path within the window is kept even if a cheaper one isn't
+        if self.window is not None:
+            previous = np.where(self.n_frames - previous_starts >= self.window, np.inf, previous)
+
+        # Same running minimum as batch_dtw for the horizontal moves, keeping track of where each path starts
+        is_diagonal = previous[:, :-1] <= previous[:, 1:]
+        from_previous = cost + np.where(is_diagonal, previous[:, :-1], previous[:, 1:])
+        from_previous_starts = np.where(is_diagonal, previous_starts[:, :-1], previous_starts[:, 1:])
+
+        cumulative_cost = np.cumsum(cost, axis=1)
+        candidates = from_previous - cumulative_cost
+        running_minimum = np.minimum.accumulate(candidates, axis=1)
+        running_argmin = np.maximum.accumulate(
+            np.where(candidates == running_minimum, np.arange(candidates.shape[1]), 0), axis=1
+        )
+
+        column = cumulative_cost + running_minimum
+        starts = np.take_along_axis(from_previous_starts, running_argmin, axis=1)
+
+        column[state["is_padding"][active]] = np.inf
+
+        state["column"][active, 1:] = column
+        state["starts"][active, 1:] = starts
+
+        # Without subsequence, only the first frame can start from the cell 0
+        if not self.subsequence:
+            state["column"][:, 0] = np.inf
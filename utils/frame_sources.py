@@ -0,0 +1,166 @@
+import threading
+import time
+
+import cv2
+import pykinect_azure as pyk
+
+from utils.sync_utils import ClockSync
+
+# "kinect" is the live Azure Kinect, "playback" a k4a .mkv recording, "video" an mp4 file & "webcam" an OpenCV
+# camera. The recordings are read as fast as the pipeline consumes them, without skipping frames, and their
+# frames are stamped with the time of the recording instead of the time they're read.
+FRAME_SOURCES = ("kinect", "playback", "video", "webcam")
+
+
+def create_frame_source(source="kinect", path=None, decode_workers=2, decode_scale=1):
+    """
+    Creates the source of the frames of main.py, whatever the backend read() returns the next item of the
+    pipeline: a dict with the "frame" (or its "decoding" Future of (ret, frame)) & the "frame_time". The live
+    sources (is_live) stamp the frames in the time.perf_counter() clock of the Leap samples, the recordings in
+    seconds from their first frame
+
+    :param source: one of FRAME_SOURCES
+    :param path: file of the "playback" & "video" sources, camera index of the "webcam" source
+    :param decode_workers: threads decoding the MJPG frames of the Kinect sources
+    :param decode_scale: 1, 2, 4 or 8 to decode the Kinect frames at 1/scale of their resolution
+    """
+    if source == "kinect":
+        return KinectFrameSource(decode_workers, decode_scale)
+    if source == "playback":
+        return PlaybackFrameSource(path, decode_workers, decode_scale)
+    if source == "video":
+        return VideoFrameSource(path)
+    if source == "webcam":
+        return WebcamFrameSource(int(path or 0))
+    raise ValueError(f"Unknown frame source {source}, expected one of {FRAME_SOURCES}")
+
+
+class KinectFrameSource(object):
+    """
+    Live Azure Kinect at 720p & 30 fps: a background thread keeps pulling its captures, so a slow frame never
+    stalls the USB stream, and the MJPG frames are decoded by a pool of threads.
+    The device timestamps are mapped to the clock of the Leap samples.
+    """
+    is_live = True
+
+    def __init__(self, decode_workers=2, decode_scale=1):
+        pyk.initialize_libraries()
+        config = pyk.default_configuration
+        config.color_resolution = pyk.K4A_COLOR_RESOLUTION_720P
+        config.depth_mode = pyk.K4A_DEPTH_MODE_OFF
+        config.camera_fps = pyk.K4A_FRAMES_PER_SECOND_30
+
+        self.device = pyk.start_device(config=config)
+        self.device.start_capture_thread()
+        self.decoder = pyk.ImageDecoder(decode_workers, decode_scale)
+        self.clock_sync = ClockSync()
+
+    def read(self):
+        capture = self.device.get_latest_capture(timeout=1)
+        if capture is None:
+            return None
+        frame_time = capture.reception_time
+        if capture.device_timestamp_usec is not None:
+            frame_time = self.clock_sync.update(capture.device_timestamp_usec, capture.reception_time)
+        return {"decoding": self.decoder.submit(capture.get_color_image_object()), "frame_time": frame_time}
+
+    def get_stats(self):
+        return self.device.get_capture_stats()
+
+    def close(self):
+        self.device.stop_capture_thread()
+        self.decoder.shutdown()
+
+
+class PlaybackFrameSource(object):
+    """
+    Azure Kinect recording (.mkv), e.g. recorded with pyk.start_device(record=True). The captures are read
+    ahead & their color images decoded in the background, see Playback.iter_captures
+    """
+    is_live = False
+
+    def __init__(self, path, decode_workers=2, decode_scale=1, prefetch=8):
+        pyk.initialize_libraries()
+        self.playback = pyk.start_playback(path)
+        self.stop_event = threading.Event()
+        self.captures = self.playback.iter_captures(prefetch, decode_workers, scale=decode_scale,
+                                                    stop_event=self.stop_event)
+        self.n_frames = 0
+        self.start_timestamp_usec = None
+
+    def read(self):
+        # StopIteration at the end of the recording
+        capture = next(self.captures)
+        self.n_frames += 1
+        ret, frame = capture.color_image
+        if not ret or capture.device_timestamp_usec is None:
+            return None
+        if self.start_timestamp_usec is None:
+            self.start_timestamp_usec = capture.device_timestamp_usec
+        return {"frame": frame, "frame_time": (capture.device_timestamp_usec - self.start_timestamp_usec) / 1e6}
+
+    def get_stats(self):
+        return {"read": self.n_frames}
+
+    def close(self):
+        # Ends a read() still running on the capture thread, the generator can only be closed once it's out of it
+        self.stop_event.set()
+        try:
+            while True:
+                try:
+                    # Joins the reader thread before the playback is closed
+                    self.captures.close()
+                    break
+                except ValueError:
+                    # Generator already executing
+                    time.sleep(0.01)
+        finally:
+            self.playback.close()
+
+
+class VideoFrameSource(object):
+    """
+    Video file read with OpenCV, e.g. the mp4 files of data/videos
+    """
+    is_live = False
+
+    def __init__(self, path):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise FileNotFoundError(f"Can't open the video {path}")
+        self.n_frames = 0
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if not ret:
+            raise StopIteration
+        self.n_frames += 1
+        # Position of the frame just read
+        return {"frame": frame, "frame_time": self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000}
+
+    def get_stats(self):
+        return {"read": self.n_frames}
+
+    def close(self):
+        self.capture.release()
+
+
+class WebcamFrameSource(VideoFrameSource):
+    """
+    Camera read with OpenCV, at its own pace: the frames are dropped when the pipeline falls behind
+    """
+    is_live = True
+
+    def __init__(self, index=0):
+        self.capture = cv2.VideoCapture(index)
+        if not self.capture.isOpened():
+            raise IOError(f"Can't open the camera {index}")
+        self.n_frames = 0
+
+    def read(self):
+        ret, frame = self.capture.read()
+        if not ret:
+            return None
+        self.n_frames += 1
+        # Live, stamped on reception like the Leap samples
+        return {"frame": frame, "frame_time": time.perf_counter()}
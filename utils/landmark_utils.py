@@ -1,9 +1,10 @@
 import cv2
 import os
+import queue
+import threading
 import numpy as np
 import pickle as pkl
-import mediapipe as mp
-from utils.mediapipe_utils import mediapipe_detection
+from utils.mediapipe_utils import mediapipe_detection, create_detector
 
 
 def landmark_to_array(mp_landmark_list):
@@ -43,46 +44,180 @@ def save_landmarks_from_leapdata(leap_dicts, sign_name):
         )
 
 
-def save_landmarks_from_video(video_name, category):
-    landmark_list = {"left_hand": [], "right_hand": []}
+def save_landmarks_from_video(video_name, category, detector=None, detector_backend="holistic"):
+    """
+    Extracts the hand landmarks of a video of data/videos and saves them in data/dataset.
+
+    :param detector: MediaPipe model to reuse, a new one is created for the video if None. A reused model
+                     tracks the hands from its previous frames, it should be reset between videos
+    :param detector_backend: backend of the new model, see utils.mediapipe_utils.create_detector
+    """
+    if detector is None:
+        with create_detector(detector_backend) as detector:
+            landmark_list = extract_landmarks_from_video(video_name, category, detector)
+    else:
+        landmark_list = extract_landmarks_from_video(video_name, category, detector)
+    save_landmarks(landmark_list, video_name, category)
+
+
+def save_landmarks(landmark_list, video_name, category):
+    """
+    Saves the hand landmarks of a video in data/dataset, where load_dataset finds them.
+
+    :param landmark_list: dict of the "left_hand" & "right_hand" landmarks of each frame
+    """
     sign_name = video_name.split("-")[0]
-    # Set the Video stream
-    cap = cv2.VideoCapture(
-        os.path.join("data", "videos", category, sign_name, video_name + ".mp4")
-    )
-    with mp.solutions.holistic.Holistic(
-        min_detection_confidence=0.8, min_tracking_confidence=0.8
-    ) as holistic:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if ret:
-                # Make detections
-                image, results = mediapipe_detection(frame, holistic)
-                # Store results
-                left_hand, right_hand = extract_landmarks(results)
-                landmark_list["left_hand"].append(left_hand)
-                landmark_list["right_hand"].append(right_hand)
-            else:
-                break
-        cap.release()
+
     # Create the folder of the sign if it doesn't exists
     path = os.path.join("data", "dataset", category, sign_name, video_name)
     if not os.path.exists(path):
         os.makedirs(path, exist_ok=True)
 
-    # Saving the landmark_list in the correct folder
+    # Saving the landmark_list in the correct folder, the left hand last as
+    # load_dataset considers a video extracted once its lh file exists
     save_array(
-        landmark_list["left_hand"], os.path.join(path, f"lh_{video_name}.pickle")
+        landmark_list["right_hand"], os.path.join(path, f"rh_{video_name}.pickle")
     )
     save_array(
-        landmark_list["right_hand"], os.path.join(path, f"rh_{video_name}.pickle")
+        landmark_list["left_hand"], os.path.join(path, f"lh_{video_name}.pickle")
+    )
+
+
+def extract_landmarks_from_video(video_name, category, detector):
+    landmark_list = {"left_hand": [], "right_hand": []}
+    sign_name = video_name.split("-")[0]
+    # Set the Video stream
+    cap = cv2.VideoCapture(
+        os.path.join("data", "videos", category, sign_name, video_name + ".mp4")
     )
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if ret:
+            # Make detections
+            image, results = mediapipe_detection(frame, detector)
+            # Store results
+            left_hand, right_hand = extract_landmarks(results)
+            landmark_list["left_hand"].append(left_hand)
+            landmark_list["right_hand"].append(right_hand)
+        else:
+            break
+    cap.release()
+    return landmark_list
+
+
+class LiveLandmarkExtractor(object):
+    """
+    Extracts the hand landmarks of the frames being recorded on a worker thread, so the capture loop isn't
+    blocked by MediaPipe, and saves them in data/dataset as soon as the recording ends: load_dataset then
+    finds the video already extracted instead of decoding it & running MediaPipe on it again.
+    Every frame is processed in order, one landmark row per frame of the video.
+
+    Params
+        detector_backend: MediaPipe backend, see utils.mediapipe_utils.create_detector
+        max_pending: maximum number of frames waiting for MediaPipe, when it's full the capture loop waits
+    Args
+        n_stalls: number of times the capture loop had to wait for MediaPipe
+    """
+
+    def __init__(self, detector_backend="holistic", max_pending=90):
+        self.detector_backend = detector_backend
+        self.tasks = queue.Queue(max_pending)
+        self.n_stalls = 0
+        self.error = None
+        self.landmark_list = None
+        self.thread = threading.Thread(target=self._run, name="landmark_extractor", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        """
+        Starts the landmarks of a new video
+        """
+        self._submit(None)
+
+    def add_frame(self, frame):
+        """
+        :param frame: BGR image of the video, it mustn't be drawn on afterwards
+        """
+        self._submit(frame)
+
+    def save(self, video_name, category):
+        """
+        Saves the landmarks of the frames added since start(), once they are all extracted
+        """
+        self._submit((video_name, category))
+
+    def pending(self):
+        return self.tasks.qsize()
+
+    def close(self):
+        """
+        Extracts & saves the pending frames and stops the thread
+        """
+        if self.thread.is_alive():
+            self.tasks.put(StopIteration)
+            self.thread.join()
+
+    def _submit(self, task):
+        if self.error is not None:
+            raise RuntimeError("The landmark extraction failed") from self.error
+        try:
+            self.tasks.put_nowait(task)
+        except queue.Full:
+            self.n_stalls += 1
+            while self.error is None:
+                try:
+                    self.tasks.put(task, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            raise RuntimeError("The landmark extraction failed") from self.error
+
+    def _run(self):
+        # The models are created & used on this thread only, a new one for each video: the tracking models
+        # would otherwise start a video from the hands of the last frame of the previous one
+        detector = None
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is StopIteration:
+                    return
+                if task is None:
+                    if detector is not None:
+                        detector.close()
+                    detector = create_detector(self.detector_backend)
+                self._process(task, detector)
+        except Exception as e:
+            # Reported to the capture loop on its next call
+            self.error = e
+        finally:
+            if detector is not None:
+                detector.close()
+
+    def _process(self, task, detector):
+        if task is None:
+            self.landmark_list = {"left_hand": [], "right_hand": []}
+        elif isinstance(task, tuple):
+            save_landmarks(self.landmark_list, *task)
+        else:
+            _, results = mediapipe_detection(task, detector)
+            left_hand, right_hand = extract_landmarks(results)
+            self.landmark_list["left_hand"].append(left_hand)
+            self.landmark_list["right_hand"].append(right_hand)
 
 
 def save_array(arr, path):
-    file = open(path, "wb")
+    # Written next to the destination and then renamed, so an interrupted save never leaves a partial file
+    tmp_path = path + ".tmp"
+    file = open(tmp_path, "wb")
     pkl.dump(arr, file)
     file.close()
+    os.replace(tmp_path, path)
 
 
 def load_array(path):
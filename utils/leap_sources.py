@@ -0,0 +1,167 @@
+import ctypes
+import time
+from glob import glob
+from os import path
+
+import numpy as np
+
+from utils.landmark_utils import load_array
+
+# "dll" reads the Ultraleap through PollingSample.dll (Windows only), "replay" streams the recorded
+# data/ultraleapdataset sequences & "synthetic" generates moving hands, both without any hardware
+LEAP_SOURCES = ("dll", "replay", "synthetic")
+
+# Floats of a Leap sample: 21 landmarks * 3 coordinates of the left then the right hand
+N_LANDMARKS = 126
+# Samples per second of the Leap
+LEAP_RATE = 120
+
+
+def create_leap_source(source="dll", rate=LEAP_RATE, category=None, dll_path="PollingSample.dll", paced=True):
+    """
+    Creates the source of the Leap samples read by the LeapListener, whatever the backend it has
+    get_frame() & get_landmarks(out)
+
+    :param source: one of LEAP_SOURCES
+    :param rate: samples per second of the "replay" & "synthetic" sources, above LEAP_RATE they run
+                 faster than real time
+    :param category: category of data/ultraleapdataset replayed, all of them by default
+    :param dll_path: library of the "dll" source
+    :param paced: False to step the "replay" & "synthetic" sources on every get_frame call, e.g. to read them on
+                  the timeline of a recording with LeapListener.read_until
+    """
+    if source == "dll":
+        return DllLeapSource(dll_path)
+    if source == "replay":
+        return ReplayLeapSource(category, rate, paced=paced)
+    if source == "synthetic":
+        return SyntheticLeapSource(rate, paced=paced)
+    raise ValueError(f"Unknown Leap source {source}, expected one of {LEAP_SOURCES}")
+
+
+class DllLeapSource(object):
+    """
+    Ultraleap read through PollingSample.dll, the library is only loaded when the source is created
+    """
+
+    def __init__(self, dll_path="PollingSample.dll"):
+        self.lib = ctypes.CDLL(dll_path)
+        # Typed once here instead of on every call
+        self.lib.getFrame.restype = ctypes.c_int64
+        self.lib.getLandmarks.restype = ctypes.POINTER(ctypes.c_float)
+        self.lib.loadLandmarks()
+
+    def get_frame(self):
+        """
+        :return: id of the last Leap frame, it changes when there's a new sample
+        """
+        return self.lib.getFrame()
+
+    def get_landmarks(self, out):
+        """
+        Copies the landmarks of the last Leap frame straight from the DLL buffer,
+        without building a list of Python floats
+
+        :param out: float32 array of shape (126,) to copy into
+        :return: out
+        """
+        np.copyto(out, np.ctypeslib.as_array(self.lib.getLandmarks(), shape=(N_LANDMARKS,)))
+        return out
+
+
+class ClockedLeapSource(object):
+    """
+    Source without hardware stepping through a loop of samples: each new frame id is the next sample, so the
+    samples come in the same order on every run. The steps are paced at rate per second like a Leap, or taken
+    on every get_frame call
+
+    Params
+        samples: array of shape (n_samples, 126)
+        rate: samples per second
+        paced: False to step on every get_frame call, as fast as it's read
+    """
+
+    def __init__(self, samples, rate=LEAP_RATE, paced=True):
+        self.samples = np.asarray(samples, dtype=np.float32)
+        self.rate = rate
+        self.paced = paced
+        self.frame = -1
+        self.start_time = None
+
+    def get_frame(self):
+        """
+        :return: id of the current sample, advanced by one when the next sample is due
+        """
+        if self.paced:
+            now = time.perf_counter()
+            if self.start_time is None:
+                self.start_time = now
+            if now - self.start_time < (self.frame + 1) / self.rate:
+                return self.frame
+        self.frame += 1
+        return self.frame
+
+    def get_landmarks(self, out):
+        """
+        Copies the sample of the frame id last returned by get_frame
+        """
+        np.copyto(out, self.samples[max(self.frame, 0) % len(self.samples)])
+        return out
+
+
+class ReplayLeapSource(ClockedLeapSource):
+    """
+    Streams the sequences recorded in data/ultraleapdataset one after the other, in a loop
+
+    Params
+        category: category of the sequences, all of them by default
+        rate: samples per second
+        paced: False to step on every get_frame call
+    """
+
+    def __init__(self, category=None, rate=LEAP_RATE, dataset_path="data/ultraleapdataset", paced=True):
+        self.sequence_names = []
+        sequences = []
+        for lh_path in sorted(glob(path.join(dataset_path, category or "*", "*", "*", "lh_*.pickle"))):
+            folder, lh_file = path.split(lh_path)
+            lh_landmarks = load_array(lh_path).reshape(-1, 63)
+            rh_landmarks = load_array(path.join(folder, "r" + lh_file[1:])).reshape(-1, 63)
+            if len(lh_landmarks) == 0 or len(lh_landmarks) != len(rh_landmarks):
+                continue
+            self.sequence_names.append(path.basename(folder))
+            sequences.append(np.hstack([lh_landmarks, rh_landmarks]))
+
+        if not sequences:
+            raise FileNotFoundError(f"No Ultraleap sequence to replay in {path.join(dataset_path, category or '')}")
+        super().__init__(np.vstack(sequences), rate, paced)
+
+
+class SyntheticLeapSource(ClockedLeapSource):
+    """
+    Generates two hands moving back & forth with bending fingers, the same samples for the same seed
+
+    Params
+        rate: samples per second
+        period: seconds of a movement
+        paced: False to step on every get_frame call
+    """
+
+    def __init__(self, rate=LEAP_RATE, period=2.0, seed=0, paced=True):
+        rng = np.random.default_rng(seed)
+        n_samples = max(int(period * rate), 1)
+        phases = 2 * np.pi * np.arange(n_samples) / n_samples
+
+        # Rest pose: wrist, then the 4 joints of each finger spread in front of it (millimeters, Leap axes)
+        rest_pose = np.zeros((21, 3))
+        for finger in range(5):
+            direction = np.array([np.cos(0.5 + finger * 0.5), np.sin(0.5 + finger * 0.5), 0])
+            rest_pose[1 + 4 * finger:5 + 4 * finger] = np.outer(np.arange(1, 5) * 20, direction)
+
+        hands = []
+        for center in ([-100, 200, 0], [100, 200, 0]):
+            hand = np.repeat(rest_pose[np.newaxis], n_samples, axis=0) + rng.normal(0, 2, (1, 21, 3))
+            # Fingers bend towards the palm & the hand moves sideways
+            hand[:, 1:, 2] += 15 * np.sin(phases)[:, np.newaxis] * np.tile(np.arange(1, 5), 5)
+            hand += np.array(center) + np.outer(50 * np.sin(phases + rng.uniform(0, np.pi)), [1, 0, 0])[:, np.newaxis]
+            hands.append(hand.reshape(n_samples, 63))
+        super().__init__(np.hstack(hands), rate, paced)
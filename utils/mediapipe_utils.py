@@ -1,13 +1,196 @@
+from collections import namedtuple
+
 import cv2
+import numpy as np
 import mediapipe as mp
 
+# "holistic" runs the pose, face mesh & hand models, "holistic_lite" the same with the lightest pose model
+# and "hands" only the hand models
+DETECTOR_BACKENDS = ("holistic", "holistic_lite", "hands")
+
+# Output of HandsDetector, with the hand attributes of the Holistic results
+HandResults = namedtuple("HandResults", ["left_hand_landmarks", "right_hand_landmarks"])
+
+
+def create_detector(backend="holistic", min_detection_confidence=0.8, min_tracking_confidence=0.8, mirrored=False,
+                    static_image_mode=False):
+    """
+    Creates the MediaPipe model used by mediapipe_detection, whatever the backend its results have
+    left_hand_landmarks & right_hand_landmarks
+
+    :param backend: one of DETECTOR_BACKENDS
+    :param mirrored: True if the images are mirrored (selfie view), only used by the "hands" backend
+    :param static_image_mode: True to detect the landmarks on each image instead of tracking them from the
+                              previous one, for unrelated images such as the crops of HandRoiDetector
+    :return: MediaPipe model, to be used as a context manager
+    """
+    if backend == "holistic":
+        return mp.solutions.holistic.Holistic(
+            static_image_mode=static_image_mode,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+        )
+    if backend == "holistic_lite":
+        return mp.solutions.holistic.Holistic(
+            static_image_mode=static_image_mode,
+            model_complexity=0,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+        )
+    if backend == "hands":
+        return HandsDetector(
+            mirrored,
+            static_image_mode=static_image_mode,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+        )
+    raise ValueError(f"Unknown detector backend {backend}, expected one of {DETECTOR_BACKENDS}")
+
+
+class HandsDetector(object):
+    """
+    MediaPipe Hands in place of Holistic: only the hand models run, without the pose & face mesh.
+
+    Hands labels the handedness as if the image was mirrored, on the unmirrored camera frames and videos its
+    "Right" hand is the left hand of the signer. The labels are mapped to the left & right hands of Holistic,
+    if both hands get the same label the most confident one is kept.
+
+    Params
+        mirrored: True if the images are mirrored (selfie view)
+    """
+
+    def __init__(self, mirrored=False, **kwargs):
+        self.hands = mp.solutions.hands.Hands(max_num_hands=2, **kwargs)
+        self.left_label = "Left" if mirrored else "Right"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.hands.close()
+
+    def process(self, image) -> HandResults:
+        results = self.hands.process(image)
+
+        hands = {}
+        for landmarks, handedness in zip(results.multi_hand_landmarks or [], results.multi_handedness or []):
+            classification = handedness.classification[0]
+            is_left = classification.label == self.left_label
+            if is_left not in hands or classification.score > hands[is_left][1]:
+                hands[is_left] = (landmarks, classification.score)
+
+        return HandResults(
+            left_hand_landmarks=hands[True][0] if True in hands else None,
+            right_hand_landmarks=hands[False][0] if False in hands else None,
+        )
+
+
+class HandRoiDetector(object):
+    """
+    Runs a detector on a crop around the hands of the previous frame instead of the full frame, downsized to
+    max_size, so the inference cost scales with the size of the hands rather than the frame. The hand landmarks
+    are mapped back to the full frame. The full frame is processed when no hand was found in the previous frame,
+    when the crop finds fewer hands than the previous frame and every full_frame_interval frames to catch a hand
+    entering outside the crop.
+
+    The crops & the full frames go to two models: a tracking model would carry its hand ROIs from one kind of
+    image to the other, where they're wrong. The crop moves with the hands, its model should run in static
+    image mode.
+
+    Meant for the "hands" backend: Holistic finds the hands from the pose, which needs the body in the image.
+    Only the hand landmarks of the results are mapped back to the full frame.
+
+    Params
+        detector: MediaPipe model of the full frames, see create_detector
+        crop_detector: MediaPipe model of the crops, see create_detector(static_image_mode=True)
+        padding: margin added on each side of the bounding box of the hands, relative to its size
+        min_size: minimum side of the crop in pixels
+        max_size: the crop is downsized if its side is larger, in pixels
+        full_frame_interval: number of frames between two full frame passes
+    """
+
+    def __init__(self, detector, crop_detector, padding=0.5, min_size=192, max_size=320, full_frame_interval=30):
+        self.detector = detector
+        self.crop_detector = crop_detector
+        self.padding = padding
+        self.min_size = min_size
+        self.max_size = max_size
+        self.full_frame_interval = full_frame_interval
+
+        # Crop (x_min, y_min, x_max, y_max) in pixels, None to process the full frame
+        self.roi = None
+        # Hands found in the previous frame, a crop finding fewer lost one of them
+        self.n_hands = 0
+        self.n_cropped_frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.detector.close()
+        self.crop_detector.close()
+
+    def process(self, image):
+        height, width = image.shape[:2]
+
+        if self.roi is not None and self.n_cropped_frames < self.full_frame_interval:
+            x_min, y_min, x_max, y_max = self.roi
+            crop = image[y_min:y_max, x_min:x_max]
+            scale = min(1, self.max_size / max(crop.shape[:2]))
+            if scale < 1:
+                crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+            results = self.crop_detector.process(np.ascontiguousarray(crop))
+            hands = self._get_hands(results)
+            if hands and len(hands) >= self.n_hands:
+                for landmarks in hands:
+                    for landmark in landmarks.landmark:
+                        landmark.x = (x_min + landmark.x * (x_max - x_min)) / width
+                        landmark.y = (y_min + landmark.y * (y_max - y_min)) / height
+                        landmark.z = landmark.z * (x_max - x_min) / width
+                self.n_cropped_frames += 1
+                self._update_roi(hands, width, height)
+                return results
+
+        # Tracking lost, full frame pass
+        results = self.detector.process(image)
+        self.n_cropped_frames = 0
+        self._update_roi(self._get_hands(results), width, height)
+        return results
+
+    @staticmethod
+    def _get_hands(results):
+        return [landmarks for landmarks in (results.left_hand_landmarks, results.right_hand_landmarks) if landmarks]
+
+    def _update_roi(self, hands, width, height):
+        self.n_hands = len(hands)
+        if not hands:
+            self.roi = None
+            return
+
+        points = np.array([[landmark.x * width, landmark.y * height]
+                           for landmarks in hands for landmark in landmarks.landmark])
+        center = (points.min(axis=0) + points.max(axis=0)) / 2
+        size = max((points.max(axis=0) - points.min(axis=0)).max() * (1 + 2 * self.padding), self.min_size)
+
+        x_min, y_min = np.clip(np.round(center - size / 2), 0, [width, height]).astype(int)
+        x_max, y_max = np.clip(np.round(center + size / 2), 0, [width, height]).astype(int)
+        self.roi = (int(x_min), int(y_min), int(x_max), int(y_max)) if x_max > x_min and y_max > y_min else None
+
 
 def mediapipe_detection(image, model):
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    image.flags.writeable = False
-    results = model.process(image)
-    image.flags.writeable = True
-    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    """
+    :return: the image, unchanged, & the MediaPipe results
+    """
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    rgb_image.flags.writeable = False
+    results = model.process(rgb_image)
     return image, results
 
 
@@ -0,0 +1,251 @@
+import collections
+import threading
+import time
+
+
+class FrameQueue(object):
+    """
+    Bounded queue between two pipeline stages. When the consumer is slower than the producer,
+    the oldest item is dropped instead of blocking the producer, so the stages keep working on
+    the most recent frames.
+
+    Params
+        maxsize: maximum number of items waiting in the queue
+        drop: False to block the producer instead of dropping items, e.g. to process every frame of a file,
+              see set_drop
+    Args
+        dropped: number of items dropped so far
+    """
+
+    def __init__(self, maxsize=2, drop=True):
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.drop = drop
+        self.dropped = 0
+        self.is_closed = False
+        self.condition = threading.Condition()
+
+    def put(self, item):
+        with self.condition:
+            self.condition.wait_for(lambda: self.drop or len(self.items) < self.maxsize or self.is_closed)
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        :return: the oldest item, None if the queue is still empty after timeout seconds
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: len(self.items) > 0, timeout):
+                return None
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def set_drop(self, drop):
+        """
+        Switches between dropping the oldest item & blocking the producer, a blocked producer resumes
+        """
+        with self.condition:
+            self.drop = drop
+            self.condition.notify_all()
+
+    def depth(self):
+        with self.condition:
+            return len(self.items)
+
+    def close(self):
+        """
+        Unblocks the producer waiting for room in the queue
+        """
+        with self.condition:
+            self.is_closed = True
+            self.condition.notify_all()
+
+
+class StageStats(object):
+    """
+    Latency & throughput of a pipeline stage, the latencies are exponential moving averages
+    """
+
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing
+        self.count = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+
+    def add(self, latency):
+        with self.lock:
+            self.count += 1
+            self.latency = latency if self.count == 1 else \
+                self.smoothing * latency + (1 - self.smoothing) * self.latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def reset(self):
+        """
+        :return: (items per second, average latency, maximum latency) since the last reset
+        """
+        with self.lock:
+            now = time.perf_counter()
+            rate = self.count / max(now - self.start_time, 1e-9)
+            result = rate, self.latency, self.max_latency
+            self.count = 0
+            self.max_latency = 0.0
+            self.start_time = now
+            return result
+
+
+class PipelineStage(threading.Thread):
+    """
+    Thread running one step of the pipeline: it takes the items of its input queue, processes them
+    and puts the results in its output queue.
+
+    Params
+        name: name of the stage in the stats
+        function: called on each input item, or without argument in a source stage (input_queue is None).
+                  Returning None drops the item, a source raises StopIteration when it has no more items.
+        input_queue: FrameQueue, None for a source stage (e.g. the camera capture)
+        output_queue: FrameQueue, None for a sink stage
+        previous_stage: stage feeding the input queue, this stage finishes after it
+    Args
+        finished: set once the stage has processed all its items
+    """
+
+    def __init__(self, name, function, input_queue=None, output_queue=None, previous_stage=None):
+        super().__init__(name=name, daemon=True)
+        self.function = function
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.previous_stage = previous_stage
+        self.stats = StageStats()
+        self.error = None
+        self.stop_event = threading.Event()
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.input_queue is None:
+                    start = time.perf_counter()
+                    try:
+                        item = self.function()
+                    except StopIteration:
+                        break
+                else:
+                    item = self.input_queue.get(timeout=0.1)
+                    if item is None:
+                        # Checked in this order, an item put before the previous stage finished is still read
+                        if self.previous_stage.finished.is_set() and self.input_queue.depth() == 0:
+                            break
+                        continue
+                    start = time.perf_counter()
+                    item = self.function(item)
+                self.stats.add(time.perf_counter() - start)
+
+                if item is not None and self.output_queue is not None:
+                    self.output_queue.put(item)
+            self.finished.set()
+        except Exception as e:
+            # The main thread checks the stages & raises the error, a dead stage would stall the pipeline
+            self.error = e
+            raise
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class Pipeline(object):
+    """
+    Chain of stages, each running on its own thread & connected by dropping FrameQueues:
+    a slow stage lowers its own frame rate without blocking the stages before it.
+
+    The items coming out of the last stage are read with get(), typically by the main thread
+    which owns the display (OpenCV windows have to be handled by a single thread).
+
+    Params
+        stages: list of (name, function), the first function is the source & takes no argument
+        queue_size: maximum number of items waiting between two stages
+        sink_name: name of the stats of the thread reading the outputs, see sink_stats
+        drop_frames: False to process every item of the source, a slow stage then slows down the stages
+                     before it (e.g. to replay a file as fast as possible without skipping frames),
+                     see set_drop_frames
+    Args
+        sink_stats: StageStats that the reading thread feeds with its own latency
+    """
+
+    def __init__(self, stages, queue_size=2, sink_name="display", drop_frames=True):
+        self.queues = [FrameQueue(queue_size, drop_frames) for _ in stages]
+        self.stages = []
+        for idx, (name, function) in enumerate(stages):
+            previous_stage = self.stages[-1] if self.stages else None
+            self.stages.append(PipelineStage(name, function, self.queues[idx - 1] if idx > 0 else None,
+                                             self.queues[idx], previous_stage))
+        self.sink_name = sink_name
+        self.sink_stats = StageStats()
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+        for queue in self.queues:
+            queue.close()
+        for stage in self.stages:
+            stage.join(timeout=1)
+
+    def set_drop_frames(self, drop_frames):
+        """
+        Switches all the queues between dropping & blocking, e.g. to keep every frame of a recording
+        """
+        for queue in self.queues:
+            if queue.drop != drop_frames:
+                queue.set_drop(drop_frames)
+
+    def is_finished(self):
+        """
+        :return: True once the source has no more items & all of them went through the pipeline
+        """
+        return self.stages[-1].finished.is_set() and self.queues[-1].depth() == 0
+
+    def get(self, timeout=None):
+        """
+        :return: the next output of the last stage, None if there's none after timeout seconds
+        """
+        for stage in self.stages:
+            if stage.error is not None:
+                raise RuntimeError(f"Pipeline stage {stage.name} failed") from stage.error
+        return self.queues[-1].get(timeout)
+
+    def get_stats(self):
+        """
+        Stats since the last call, per stage
+        :return: dict of {stage name: {"fps", "latency", "max_latency", "queue_depth", "dropped"}}
+                 where the queue is the output queue of the stage & the latencies are in seconds
+        """
+        stats = {}
+        for stage, queue in zip(self.stages, self.queues):
+            fps, latency, max_latency = stage.stats.reset()
+            stats[stage.name] = {
+                "fps": fps, "latency": latency, "max_latency": max_latency,
+                "queue_depth": queue.depth(), "dropped": queue.dropped,
+            }
+        fps, latency, max_latency = self.sink_stats.reset()
+        stats[self.sink_name] = {
+            "fps": fps, "latency": latency, "max_latency": max_latency, "queue_depth": 0, "dropped": 0,
+        }
+        return stats
+
+    def format_stats(self):
+        return " | ".join(
+            f"{name}: {stage['fps']:.1f} fps, {stage['latency'] * 1000:.1f} ms "
+            f"(max {stage['max_latency'] * 1000:.1f}), queue {stage['queue_depth']}, dropped {stage['dropped']}"
+            for name, stage in self.get_stats().items()
+        )
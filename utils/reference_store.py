@@ -0,0 +1,213 @@
+import os
+import time
+
+import numpy as np
+
+from models.sign_model import SignModel
+from utils.landmark_utils import load_array
+
+# Folder of the landmark pickles of each sensor: MediaPipe & Ultraleap
+SENSOR_FOLDERS = {"mp": "dataset", "ul": "ultraleapdataset"}
+HANDS = ("lh", "rh")
+
+# The embeddings are stored as float32, half the size of the float64 angles
+EMBEDDING_DTYPE = np.float32
+# Stacks of padded embeddings, one file per sensor & hand
+STACKS = [(sensor, hand) for sensor in SENSOR_FOLDERS for hand in HANDS]
+# Layout of the store, a store written with another one is rebuilt
+STORE_VERSION = 3
+
+
+def get_store_path(category, embedding_mode):
+    return os.path.join("data", "reference_store", f"{category}-{embedding_mode}")
+
+
+def load_reference_store(category, videos, embedding_mode="full"):
+    """
+    Loads the compiled reference store of a category. The store holds the embeddings of both sensors
+    for all the videos, the videos whose landmark pickles changed since the last build are recomputed
+    and the store is written again.
+
+    The store is a folder with a small index.npz and a float32 embeddings-*.npy file per sensor & hand which is
+    memory-mapped: every process opening the store (see open_reference_store) shares the same physical pages.
+    The embeddings are stored already padded to the longest one of their sensor & hand, so the DTW reads them
+    as they are (see utils.dtw.stack_hand) instead of copying & padding them for every query.
+
+    :param videos: names of the videos of the category
+    :return: dict of arrays
+             videos: (n_videos,) video names
+             names: (n_videos,) sign names
+             sources: (n_videos, 8) size & modification time of the 4 pickles of each video
+             build: id of the build of the store, which names its embeddings files
+             {sensor}_{hand}_embeddings: (n_videos, max_n_frames, n_features) memory-mapped embeddings of
+                                         all the videos, padded with zeros
+             {sensor}_{hand}_lengths: (n_videos,) number of frames of each embedding
+             {sensor}_{hand}_envelopes: (n_videos, 2, n_features) minimum & maximum of each embedding
+             {sensor}_has_{hand}: (n_videos,) True if the hand is detected in the video
+    """
+    path = get_store_path(category, embedding_mode)
+    store = open_reference_store(category, embedding_mode)
+
+    sources = np.array([_get_sources(category, video_name) for video_name in videos], dtype=np.int64)
+    stored_videos = {} if store is None else {video_name: idx for idx, video_name in enumerate(store["videos"])}
+    is_changed = store is None or store["videos"].tolist() != list(videos)
+
+    entries = []
+    for video_name, video_sources in zip(videos, sources):
+        idx = stored_videos.get(video_name)
+        if idx is not None and np.array_equal(store["sources"][idx], video_sources):
+            entries.append(_get_entry(store, idx))
+        else:
+            entries.append(_compute_entry(category, video_name, embedding_mode))
+            is_changed = True
+
+    if is_changed:
+        print(f"Updating the reference store {path}")
+        _write_store(path, videos, sources, entries)
+        store = open_reference_store(category, embedding_mode)
+    return store
+
+
+def open_reference_store(category, embedding_mode="full"):
+    """
+    Maps the reference store of a category as it is, without checking the landmark pickles.
+    Meant for processes that only read the store, e.g. DTW workers.
+
+    :return: dict of arrays (see load_reference_store), None if there is no readable store
+    """
+    path = get_store_path(category, embedding_mode)
+    index_path = os.path.join(path, "index.npz")
+    if not os.path.isfile(index_path):
+        return None
+    try:
+        with np.load(index_path) as index:
+            store = {key: index[key] for key in index.files}
+        if store.get("version") != STORE_VERSION:
+            print(f"Rebuilding the reference store {path} written with another layout")
+            return None
+        for sensor, hand in STACKS:
+            store[f"{sensor}_{hand}_embeddings"] = np.load(
+                os.path.join(path, _get_embeddings_file(store["build"], sensor, hand)), mmap_mode="r"
+            )
+        return store
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring the unreadable reference store {path}: {e}")
+        return None
+
+
+def get_sign_models(store, sensor, embedding_mode="full"):
+    """
+    :param sensor: "mp" or "ul"
+    :return: the SignModel of each video of the store for the sensor,
+             their embeddings are read-only views on the memory-mapped store
+    """
+    # The padded stacks are shared by all the models
+    stacks = {hand: store[f"{sensor}_{hand}_embeddings"] for hand in HANDS}
+    sign_models = []
+    for idx in range(len(store["videos"])):
+        entry = _get_entry(store, idx, [sensor])
+        sign_models.append(SignModel.from_embeddings(
+            entry[f"{sensor}_lh_embedding"], entry[f"{sensor}_rh_embedding"],
+            entry[f"{sensor}_has_lh"], entry[f"{sensor}_has_rh"], embedding_mode,
+            entry[f"{sensor}_lh_envelope"], entry[f"{sensor}_rh_envelope"],
+            (stacks["lh"], idx), (stacks["rh"], idx),
+        ))
+    return sign_models
+
+
+def _get_embeddings_file(build, sensor, hand):
+    return f"embeddings-{build}-{sensor}_{hand}.npy"
+
+
+def _get_sources(category, video_name):
+    """
+    Size & modification time of the landmark pickles of a video, a changed value triggers a rebuild
+    """
+    sign_name = video_name.split("-")[0]
+    sources = []
+    for folder in SENSOR_FOLDERS.values():
+        for hand in HANDS:
+            stat = os.stat(os.path.join("data", folder, category, sign_name, video_name, f"{hand}_{video_name}.pickle"))
+            sources += [stat.st_size, stat.st_mtime_ns]
+    return sources
+
+
+def _compute_entry(category, video_name, embedding_mode):
+    sign_name = video_name.split("-")[0]
+    entry = {}
+    for sensor, folder in SENSOR_FOLDERS.items():
+        path = os.path.join("data", folder, category, sign_name, video_name)
+        sign_model = SignModel(
+            load_array(os.path.join(path, f"lh_{video_name}.pickle")),
+            load_array(os.path.join(path, f"rh_{video_name}.pickle")),
+            embedding_mode,
+        )
+        for hand, has_hand in zip(HANDS, (sign_model.has_left_hand, sign_model.has_right_hand)):
+            embedding = getattr(sign_model, f"{hand}_embedding").astype(EMBEDDING_DTYPE)
+            entry[f"{sensor}_{hand}_embedding"] = embedding
+            entry[f"{sensor}_{hand}_envelope"] = SignModel._get_envelope(embedding)
+            entry[f"{sensor}_has_{hand}"] = has_hand
+    return entry
+
+
+def _get_entry(store, idx, sensors=tuple(SENSOR_FOLDERS)):
+    entry = {}
+    for sensor in sensors:
+        for hand in HANDS:
+            length = store[f"{sensor}_{hand}_lengths"][idx]
+            entry[f"{sensor}_{hand}_embedding"] = store[f"{sensor}_{hand}_embeddings"][idx, :length]
+            entry[f"{sensor}_{hand}_envelope"] = store[f"{sensor}_{hand}_envelopes"][idx] if length > 0 else None
+            entry[f"{sensor}_has_{hand}"] = store[f"{sensor}_has_{hand}"][idx]
+    return entry
+
+
+def _write_store(path, videos, sources, entries):
+    os.makedirs(path, exist_ok=True)
+    n_features = max((entry[f"{sensor}_{hand}_embedding"].shape[1]
+                      for entry in entries for sensor in SENSOR_FOLDERS for hand in HANDS), default=0)
+
+    index = {
+        "version": np.array(STORE_VERSION),
+        "videos": np.array(videos, dtype=str),
+        "names": np.array([video_name.split("-")[0] for video_name in videos], dtype=str),
+        "sources": sources.reshape((len(videos), 2 * len(SENSOR_FOLDERS) * len(HANDS))),
+    }
+    for sensor, hand in STACKS:
+        index[f"{sensor}_{hand}_lengths"] = np.array([len(entry[f"{sensor}_{hand}_embedding"]) for entry in entries],
+                                                     dtype=np.int64)
+        index[f"{sensor}_{hand}_envelopes"] = np.array([
+            np.zeros((2, n_features)) if entry[f"{sensor}_{hand}_envelope"] is None
+            else entry[f"{sensor}_{hand}_envelope"]
+            for entry in entries
+        ], dtype=EMBEDDING_DTYPE).reshape((len(entries), 2, n_features))
+        index[f"{sensor}_has_{hand}"] = np.array([entry[f"{sensor}_has_{hand}"] for entry in entries], dtype=bool)
+
+    # Processes which still map the old embeddings keep reading them, the new ones get new files.
+    # The index is written next to the destination and then renamed, so an interrupted write never
+    # leaves a partial store.
+    build = str(time.time_ns())
+    for sensor, hand in STACKS:
+        lengths = index[f"{sensor}_{hand}_lengths"]
+        mapped_embeddings = np.lib.format.open_memmap(
+            os.path.join(path, _get_embeddings_file(build, sensor, hand)), mode="w+", dtype=EMBEDDING_DTYPE,
+            shape=(len(entries), int(lengths.max(initial=0)), int(n_features))
+        )
+        for idx, entry in enumerate(entries):
+            mapped_embeddings[idx, :lengths[idx]] = entry[f"{sensor}_{hand}_embedding"]
+            mapped_embeddings[idx, lengths[idx]:] = 0
+        mapped_embeddings.flush()
+        del mapped_embeddings
+
+    index["build"] = np.array(build)
+    tmp_path = os.path.join(path, "index.npz.tmp")
+    with open(tmp_path, "wb") as file:
+        np.savez(file, **index)
+    os.replace(tmp_path, os.path.join(path, "index.npz"))
+
+    # Old embeddings can't be removed while another process maps them (on Windows), they go at the next build
+    for file_name in os.listdir(path):
+        if file_name.startswith("embeddings-") and not file_name.startswith(f"embeddings-{build}-"):
+            try:
+                os.remove(os.path.join(path, file_name))
+            except OSError:
+                pass
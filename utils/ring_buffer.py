@@ -0,0 +1,42 @@
+import numpy as np
+
+
+class RingBuffer(object):
+    """
+    Preallocated buffer of the last capacity items, e.g. the frames before the start of a recording.
+    The items are copied into the buffer, which is allocated with the shape of the first one.
+
+    Params
+        capacity: number of items kept
+        dtype: type of the items, the one of the first item by default
+    """
+
+    def __init__(self, capacity, dtype=None):
+        self.capacity = capacity
+        self.dtype = dtype
+        self.items = None
+        self.n_items = 0
+
+    def __len__(self):
+        return min(self.n_items, self.capacity)
+
+    def append(self, item):
+        if self.capacity == 0:
+            return
+        if self.items is None:
+            item = np.asarray(item, dtype=self.dtype)
+            self.items = np.empty((self.capacity, *item.shape), dtype=item.dtype)
+        self.items[self.n_items % self.capacity] = item
+        self.n_items += 1
+
+    def get(self):
+        """
+        :return: copy of the buffered items in chronological order, array of shape (n_items, *item shape)
+        """
+        if self.items is None:
+            return np.empty((0,), dtype=self.dtype)
+        indices = (self.n_items - len(self) + np.arange(len(self))) % self.capacity
+        return self.items[indices]
+
+    def clear(self):
+        self.n_items = 0
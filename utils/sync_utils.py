@@ -0,0 +1,70 @@
+from collections import deque
+
+import numpy as np
+
+
+class ClockSync(object):
+    """
+    Maps the timestamps of a device clock, e.g. the device_timestamp_usec of the Kinect captures, to the
+    time.perf_counter() clock of the Leap samples.
+
+    The offset between both clocks is the minimum of (reception time - device timestamp) over the last
+    window samples: every sample is received late by its transfer latency, the least delayed one gives the
+    best estimate. The window lets the offset follow the drift between both clocks.
+
+    Params
+        device_unit: duration of a device clock tick in seconds
+        window: number of samples of the offset estimation
+    """
+
+    def __init__(self, device_unit=1e-6, window=300):
+        self.device_unit = device_unit
+        self.offsets = deque(maxlen=window)
+
+    def update(self, device_timestamp, reception_time):
+        """
+        :param reception_time: time.perf_counter() when the sample was received
+        :return: the device timestamp in the time.perf_counter() clock
+        """
+        self.offsets.append(reception_time - device_timestamp * self.device_unit)
+        return self.to_host(device_timestamp)
+
+    def to_host(self, device_timestamp):
+        if not self.offsets:
+            return None
+        return device_timestamp * self.device_unit + min(self.offsets)
+
+
+def resample_hands(timestamps: np.ndarray, samples: np.ndarray, targets, interpolate: bool = True) -> np.ndarray:
+    """
+    Resamples the hand landmarks of a sensor on another timeline, e.g. the Leap samples on the Kinect frames.
+    Linearly interpolated between the two samples around each target, a hand missing (all zeros) from one of
+    them is taken from the nearest sample. Outside of the samples, the nearest sample is used.
+
+    :param timestamps: Array of shape (n_samples,) in increasing order
+    :param samples: Array of shape (n_samples, n_hands * 63)
+    :param targets: Array of shape (n_targets,) of timestamps in the same clock
+    :param interpolate: False to take the nearest sample
+    :return: Array of shape (n_targets, n_hands * 63), zeros if there are no samples
+    """
+    targets = np.atleast_1d(np.asarray(targets, dtype=float))
+    if len(timestamps) == 0:
+        return np.zeros((len(targets), samples.shape[1]), dtype=samples.dtype)
+    if len(timestamps) == 1:
+        return np.repeat(samples, len(targets), axis=0)
+
+    after = np.clip(np.searchsorted(timestamps, targets), 1, len(timestamps) - 1)
+    before = after - 1
+    durations = np.maximum(timestamps[after] - timestamps[before], np.finfo(float).tiny)
+    weights = np.clip((targets - timestamps[before]) / durations, 0, 1)[:, np.newaxis]
+
+    resampled = samples[np.where(weights[:, 0] >= 0.5, after, before)]
+    if not interpolate:
+        return resampled
+
+    interpolated = (1 - weights) * samples[before] + weights * samples[after]
+    for hand in range(samples.shape[1] // 63):
+        columns = slice(63 * hand, 63 * (hand + 1))
+        is_detected = samples[before, columns].any(axis=1) & samples[after, columns].any(axis=1)
+        resampled[is_detected, columns] = interpolated[is_detected, columns]
+    return resampled
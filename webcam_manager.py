@@ -24,6 +24,10 @@ class WebcamManager(object):
     ):
         self.sign_detected = sign_detected
 
+        # The frames of the Kinect may be read-only views on its buffers (see Image.to_numpy), drawn on a copy
+        if not frame.flags.writeable:
+            frame = frame.copy()
+
         # Draw landmarks
         self.draw_landmarks(frame, results)
 